@@ -3,4 +3,17 @@ from enum import Enum
 class LogType(Enum):
     INFO = "INFO"
     DEBUG = "DEBUG"
-    ERROR = "ERROR"
\ No newline at end of file
+    ERROR = "ERROR"
+
+class SettleType(Enum):
+    COMPLETE = "complete"
+    ABANDON = "abandon"
+    DEAD_LETTER = "dead letter"
+    DEFER = "defer"
+
+class ItemState(Enum):
+    PENDING = "pending"
+    IN_PROGRESS = "in_progress"
+    RETRY = "retry"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
@@ -5,9 +5,11 @@ class Business:
         pass
 
     @staticmethod
-    def program(in_config: dict) -> None:
+    def program(in_config: dict, in_transaction_item = None) -> None:
         """
             Run main business process
+            -in_config: configuration object retrieves from config file
+            -in_transaction_item: transaction item retrieves from Transaction step
             Return: None
         """
         try:
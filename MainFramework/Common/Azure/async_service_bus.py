@@ -0,0 +1,366 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple, Union
+from azure.servicebus import (
+    ServiceBusMessage,
+    ServiceBusReceivedMessage,
+    ServiceBusReceiveMode)
+from azure.servicebus.aio import (
+    ServiceBusClient,
+    ServiceBusReceiver,
+    ServiceBusSender)
+from azure.servicebus.exceptions import MessageSizeExceededError
+from Data.constant import SettleType
+from MainFramework.Common.Azure.service_bus_batch import BatchSendError, MessageBatchSender
+from MainFramework.Common.idempotency_store import IdempotencyStore
+from MainFramework.Common.metrics import Metrics
+from MainFramework.Common.retry import RetryPolicy
+
+class AsyncAzureServiceBus:
+    '''
+        Asyncio Azure Service Bus's actions, same surface as AzureServiceBus:
+        - Provide connection string in order to authenticate
+        - Send, receive and settle queue messages without blocking the event loop
+        - Run many message handlers concurrently on one event loop with ProcessQueueMessages
+        - One sender is kept per queue and client, and closed by close()
+        - client_factory: optional callable returning an aio ServiceBusClient, e.g. an in-process fake bus in tests
+        - idempotency_store: optional store of processed message ids, duplicates are completed without running the handler
+    '''
+    def __init__(
+                    self,
+                    connection_string: Optional[str] = None,
+                    client_factory: Optional[Callable[[], ServiceBusClient]] = None,
+                    idempotency_store: Optional[IdempotencyStore] = None
+                    ):
+        if not connection_string and not client_factory:
+            raise ValueError("Either connection_string or client_factory must be provided")
+        self.connection_string = connection_string
+        self.client_factory = client_factory
+        self.idempotency_store = idempotency_store
+        self.__client : Optional[ServiceBusClient] = None
+        self.__senders : dict = {}
+
+    def __auth(self) -> ServiceBusClient:
+        '''
+            Create the aio service bus client once and keep it for the lifetime of this object
+        '''
+        if self.__client:
+            return self.__client
+        try:
+            if self.client_factory:
+                self.__client = self.client_factory()
+            else:
+                self.__client = ServiceBusClient.from_connection_string(conn_str=self.connection_string)
+            return self.__client
+        except Exception as e:
+            error_message = f"Couldn't connect to service bus"
+            raise Exception(error_message)
+
+    def __get_sender(self, queue_name: str, client: ServiceBusClient) -> ServiceBusSender:
+        '''
+            Return the sender of a queue, created once per queue and client so the link is reused across calls
+        '''
+        key = (id(client), queue_name)
+        sender = self.__senders.get(key)
+        if sender is None:
+            sender = self.__senders[key] = client.get_queue_sender(queue_name)
+        return sender
+
+    async def close(self):
+        '''
+            Close the cached senders, the underlying client and every link opened from it
+        '''
+        senders, self.__senders = list(self.__senders.values()), {}
+        for sender in senders:
+            try:
+                await sender.close()
+            except Exception as e:
+                print(f"Couldn't close service bus sender, due to:\n {e}")
+        if self.__client:
+            await self.__client.close()
+            self.__client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @Metrics.integration("service_bus")
+    @RetryPolicy.integration("service_bus", retry=False)
+    async def SendMessageToQueue(
+                                    self,
+                                    queue_name: str,
+                                    queue_messages: list,
+                                    client: Optional[ServiceBusClient] = None,
+                                    sender: Optional[ServiceBusSender] = None
+                                    ) -> ServiceBusSender:
+        '''
+            Send messages to a specific queue
+
+            queue_name: name of target queue to send message to
+            queue_messages: list of messages to send to queue
+            client: Authenticated aio client
+            sender: aio ServiceBusSender to send message to queue, the cached sender of the queue if not provided
+
+            Return: ServiceBusSender client, a cached sender stays open until close()
+        '''
+        try:
+            if not client:
+                client = self.__auth()
+            if not sender:
+                sender = self.__get_sender(queue_name, client)
+            list_message = [ServiceBusMessage(queue_message) for queue_message in queue_messages]
+            await sender.send_messages(list_message)
+
+            print(f"Sent message to queue {queue_name} successfully!")
+            return sender
+        except ValueError as val_err:
+            raise ValueError(val_err)
+        except Exception as e:
+            error_message = f"Couldn't send message to queue {queue_name}. due to:\n {e}"
+            raise Exception(error_message)
+
+    @Metrics.integration("service_bus")
+    @RetryPolicy.integration("service_bus", retry=False)
+    async def SendMessageBatches(
+                                    self,
+                                    queue_name: str,
+                                    queue_messages: Iterable,
+                                    max_size_in_bytes: Optional[int] = None,
+                                    client: Optional[ServiceBusClient] = None,
+                                    sender: Optional[ServiceBusSender] = None,
+                                    on_batch_sent: Optional[Callable[[dict], None]] = None
+                                    ) -> List[dict]:
+        '''
+            Stream messages to a specific queue in size-aware batches, each batch is sent as soon as it is full.
+            Same behaviour as MessageBatchSender.Send
+
+            queue_name: name of target queue to send message to
+            queue_messages: iterable or generator of message bodies or ServiceBusMessage
+            max_size_in_bytes: optional batch size limit lower than the link's limit
+            sender: aio ServiceBusSender to send message to queue, the cached sender of the queue if not provided
+            on_batch_sent: optional callback receiving each batch result, e.g. for progress reporting
+
+            Return: list of per-batch results {batch, message_count, size_in_bytes, elapsed, success, error}
+        '''
+        if not client:
+            client = self.__auth()
+        if not sender:
+            sender = self.__get_sender(queue_name, client)
+        results = []
+
+        async def _flush(batch):
+            index = len(results)
+            result = {
+                "batch": index,
+                "message_count": len(batch),
+                "size_in_bytes": batch.size_in_bytes,
+                "elapsed": 0.0,
+                "success": True,
+                "error": None
+            }
+            start = time.perf_counter()
+            try:
+                await sender.send_messages(batch)
+            except Exception as e:
+                result["success"] = False
+                result["error"] = str(e)
+                result["elapsed"] = time.perf_counter() - start
+                results.append(result)
+                raise BatchSendError(f"Couldn't send batch {index} ({len(batch)} message(s)), due to:\n {e}", results) from e
+            result["elapsed"] = time.perf_counter() - start
+            results.append(result)
+            if on_batch_sent:
+                on_batch_sent(result)
+
+        batch = await sender.create_message_batch(max_size_in_bytes=max_size_in_bytes)
+        for queue_message in queue_messages:
+            message = MessageBatchSender.ToMessage(queue_message)
+            try:
+                batch.add_message(message)
+            except MessageSizeExceededError:
+                if len(batch) == 0:
+                    raise ValueError(f"A single message exceeds the batch size limit of {batch.max_size_in_bytes} bytes")
+                await _flush(batch)
+                batch = await sender.create_message_batch(max_size_in_bytes=max_size_in_bytes)
+                try:
+                    batch.add_message(message)
+                except MessageSizeExceededError:
+                    raise ValueError(f"A single message exceeds the batch size limit of {batch.max_size_in_bytes} bytes")
+        if len(batch) > 0:
+            await _flush(batch)
+        return results
+
+    @Metrics.integration("service_bus")
+    @RetryPolicy.integration("service_bus")
+    async def ReceiveQueueMessages(
+                                    self,
+                                    queue_name: str,
+                                    number_of_messages: int = 1,
+                                    timeout: float = 60,
+                                    receive_mode: str = ServiceBusReceiveMode.PEEK_LOCK.value,
+                                    client: Optional[ServiceBusClient] = None,
+                                    receiver: Optional[ServiceBusReceiver] = None
+                                    ) -> Tuple[List[ServiceBusReceivedMessage], ServiceBusReceiver]:
+        '''
+            Receive batch of messages from a specific queue
+
+            queue_name: name of target queue to send message to
+            number_of_messages: max number of messages to be retrieved in a batch
+            timeout: maximum amount of time to wait for success retrieval of batch
+            receive_mode: PEEK_LOCK or RECEIVE_AND_DELETE
+
+            Return: List of messages and aio ServiceBusReceiver to later settle queue message
+        '''
+        try:
+            if not client:
+                client = self.__auth()
+            if not receiver:
+                receiver = client.get_queue_receiver(queue_name, receive_mode=receive_mode)
+            receive_messages = await receiver.receive_messages(max_message_count=number_of_messages, max_wait_time=timeout)
+            if receive_messages != None and len(receive_messages) > 0:
+                return receive_messages, receiver
+            else:
+                return [], receiver
+        except Exception as e:
+            error_message = f"Couldn't receive message from queue {queue_name}. due to:\n {e}"
+            raise Exception(error_message)
+
+    @Metrics.integration("service_bus")
+    @RetryPolicy.integration("service_bus")
+    async def SettleQueueMessage(
+                                    self,
+                                    receiver: ServiceBusReceiver,
+                                    queue_message: ServiceBusReceivedMessage,
+                                    settle_mode: str,
+                                    dead_letter_reason: Optional[str] = None,
+                                    dead_letter_desc: Optional[str] = None
+                                    ):
+        '''
+            Settle a queue message from a specific aio ServiceBusReceiver, the receiver stays open
+
+            receiver: aio ServiceBusReceiver to settle a queue message
+            queue_message: queue message to settle
+            settle_mode: settle mode in SettleType
+        '''
+        try:
+            match settle_mode.lower():
+                case SettleType.COMPLETE.value:
+                    if self.idempotency_store:
+                        # The store is SQLite, its calls run on a worker thread so the event loop never waits on disk
+                        await asyncio.to_thread(self.idempotency_store.mark_processed, queue_message.message_id)
+                    await receiver.complete_message(queue_message)
+                case SettleType.ABANDON.value:
+                    await receiver.abandon_message(queue_message)
+                case SettleType.DEAD_LETTER.value:
+                    await receiver.dead_letter_message(
+                        message = queue_message,
+                        reason = dead_letter_reason,
+                        error_description = dead_letter_desc)
+                case SettleType.DEFER.value:
+                    await receiver.defer_message(queue_message)
+        except Exception as e:
+            error_message = f"Couldn't settele queue message\nMode: {settle_mode}\nDue to:\n {e}"
+            raise Exception(error_message)
+
+    async def ProcessQueueMessages(
+                                    self,
+                                    queue_name: str,
+                                    handler: Callable[[ServiceBusReceivedMessage], Awaitable[Optional[Union[str, SettleType]]]],
+                                    max_concurrency: int = 100,
+                                    receiver_count: int = 1,
+                                    number_of_messages: int = 50,
+                                    timeout: float = 5,
+                                    stop_when_empty: bool = True
+                                    ) -> dict:
+        '''
+            Receive messages and run an async handler for each of them concurrently on the current event loop
+
+            queue_name: name of target queue to receive messages from
+            handler: coroutine function taking a message, returns a settle mode (default complete). A raised exception abandons the message
+            max_concurrency: max number of handlers in flight at the same time
+            receiver_count: number of receivers pulling from the queue at the same time
+            number_of_messages: max number of messages to be retrieved in a batch
+            timeout: maximum amount of time to wait for a batch
+            stop_when_empty: stop a receiver when a batch comes back empty
+
+            Return: summary dict with completed/abandoned/dead-lettered/deferred/failed counts
+        '''
+        client = self.__auth()
+        semaphore = asyncio.Semaphore(max_concurrency)
+        summary = {"received": 0, "failed": 0, "duplicates": 0}
+        summary.update({settle_type.value: 0 for settle_type in SettleType})
+
+        async def _handle(receiver: ServiceBusReceiver, queue_message: ServiceBusReceivedMessage):
+            try:
+                if self.idempotency_store and await asyncio.to_thread(self.idempotency_store.is_processed, queue_message.message_id):
+                    await self.SettleQueueMessage(receiver, queue_message, SettleType.COMPLETE.value)
+                    summary["duplicates"] += 1
+                    return
+                try:
+                    outcome = await handler(queue_message)
+                    settle_mode = outcome.value if isinstance(outcome, SettleType) else (outcome or SettleType.COMPLETE.value)
+                except Exception as e:
+                    print(f"Handler failed for message {queue_message.message_id}, due to:\n {e}")
+                    settle_mode = SettleType.ABANDON.value
+                await self.SettleQueueMessage(receiver, queue_message, settle_mode)
+                summary[settle_mode.lower()] += 1
+            except Exception as e:
+                summary["failed"] += 1
+                print(e)
+            finally:
+                semaphore.release()
+
+        async def _receive_loop():
+            receiver = client.get_queue_receiver(queue_name, receive_mode=ServiceBusReceiveMode.PEEK_LOCK)
+            tasks : set = set()
+            async with receiver:
+                try:
+                    while True:
+                        # Only ask the broker for as many messages as there are free handler slots
+                        await semaphore.acquire()
+                        free_slots = 1
+                        try:
+                            while free_slots < number_of_messages and not semaphore.locked():
+                                await semaphore.acquire()
+                                free_slots += 1
+                            queue_messages, _ = await self.ReceiveQueueMessages(
+                                queue_name,
+                                number_of_messages = free_slots,
+                                timeout = timeout,
+                                client = client,
+                                receiver = receiver)
+                        except BaseException:
+                            for _ in range(free_slots):
+                                semaphore.release()
+                            raise
+                        for _ in range(free_slots - len(queue_messages)):
+                            semaphore.release()
+                        summary["received"] += len(queue_messages)
+                        for queue_message in queue_messages:
+                            task = asyncio.ensure_future(_handle(receiver, queue_message))
+                            tasks.add(task)
+                            task.add_done_callback(tasks.discard)
+                        if not queue_messages and stop_when_empty:
+                            break
+                except BaseException:
+                    # Unsettled messages are redelivered once their lock expires
+                    for task in tasks:
+                        task.cancel()
+                    raise
+                finally:
+                    # Settlement goes through this receiver's link, so its handlers end before it closes
+                    if tasks:
+                        await asyncio.gather(*list(tasks), return_exceptions=True)
+
+        receive_loops = [asyncio.ensure_future(_receive_loop()) for _ in range(receiver_count)]
+        try:
+            await asyncio.gather(*receive_loops)
+        except BaseException:
+            for receive_loop in receive_loops:
+                receive_loop.cancel()
+            await asyncio.gather(*receive_loops, return_exceptions=True)
+            raise
+        print(f"Processed {summary['received']} message(s) from queue {queue_name}: {summary}")
+        return summary
@@ -0,0 +1,340 @@
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from typing import List, Optional
+from azure.servicebus import (
+    AutoLockRenewer,
+    ServiceBusMessage,
+    ServiceBusReceivedMessage,
+    ServiceBusReceiveMode,
+    ServiceBusReceiver,
+    ServiceBusSubQueue)
+from azure.servicebus.amqp import AmqpMessageBodyType
+from dotenv import load_dotenv
+from MainFramework.Common.Azure.service_bus_pool import ServiceBusClientPool
+from MainFramework.Common.Azure.service_bus_batch import BatchSendError, MessageBatchSender
+
+class DeadLetterReplayError(Exception):
+    '''
+        Raised by replay when a worker stopped on an error, stats holds the counters of the run and errors the worker errors
+    '''
+    def __init__(self, message: str, stats: dict, errors: List[Exception]):
+        super().__init__(message)
+        self.stats = stats
+        self.errors = errors
+
+class DeadLetterReplayer:
+    '''
+        Drain the dead-letter sub-queue of a queue and resubmit matching messages to the queue:
+        - Several receivers read the dead-letter queue concurrently, each on its own thread
+        - reason_filter/description_filter are regular expressions matched against the dead letter reason/description.
+          Messages that don't match stay locked (renewed up to skipped_lock_duration seconds) until the worker is done,
+          so they are not received again ahead of the messages behind them, and are then abandoned to the dead-letter queue.
+          A worker holds at most max_held messages, it abandons what goes over and stops receiving, since the abandoned
+          messages would be the next ones it receives
+        - max_messages of replay counts matching messages only, held messages don't use up the quota
+        - Resubmitted messages are packed in size-aware batches, a dead-lettered message is completed only after its copy was sent
+        - AMQP value and sequence bodies are resubmitted as JSON, ServiceBusMessage only takes str or bytes
+        - Replayed copies get a new message id, a queue with duplicate detection would otherwise drop the copy while its
+          original is completed. keep_message_id keeps the original id, only for queues without duplicate detection
+        - dry_run browses the dead-letter queue with peek_messages, nothing is locked and delivery counts don't change
+        - Progress and throughput are printed every progress_interval seconds
+        - A worker stopped by an error makes replay raise DeadLetterReplayError once the other workers are done
+    '''
+    def __init__(
+                    self,
+                    connection_string: str,
+                    queue_name: str,
+                    receiver_count: int = 4,
+                    batch_size: int = 100,
+                    max_wait_time: float = 5,
+                    reason_filter: Optional[str] = None,
+                    description_filter: Optional[str] = None,
+                    dry_run: bool = False,
+                    progress_interval: float = 5,
+                    keep_message_id: bool = False,
+                    skipped_lock_duration: float = 3600,
+                    max_held: int = 1000
+                    ):
+        self.queue_name = queue_name
+        self.receiver_count = receiver_count
+        self.batch_size = batch_size
+        self.max_wait_time = max_wait_time
+        self.reason_filter = re.compile(reason_filter) if reason_filter else None
+        self.description_filter = re.compile(description_filter) if description_filter else None
+        self.dry_run = dry_run
+        self.progress_interval = progress_interval
+        self.keep_message_id = keep_message_id
+        self.skipped_lock_duration = skipped_lock_duration
+        self.max_held = max_held
+        self.pool = ServiceBusClientPool.get_pool(connection_string)
+        self.__lock = threading.Lock()
+        self.__done = threading.Event()
+        self.__stats = {"received": 0, "matched": 0, "replayed": 0, "skipped": 0, "failed": 0}
+        self.__remaining : Optional[int] = None
+        self.__errors : List[Exception] = []
+        self.__started_at = 0.0
+
+    def __matches(self, queue_message: ServiceBusReceivedMessage) -> bool:
+        if self.reason_filter and not self.reason_filter.search(queue_message.dead_letter_reason or ""):
+            return False
+        if self.description_filter and not self.description_filter.search(queue_message.dead_letter_error_description or ""):
+            return False
+        return True
+
+    @staticmethod
+    def ToReplayMessage(queue_message: ServiceBusReceivedMessage, keep_message_id: bool = False) -> ServiceBusMessage:
+        '''
+            Copy a dead-lettered message into a new message for the main queue, keeping its properties.
+            The copy gets a new message id and the original one in the replayed_message_id property, unless keep_message_id is set.
+            A value body that is not str or bytes and a sequence body are encoded as JSON, the original body type is kept
+            in the replayed_body_type property
+        '''
+        application_properties = dict(queue_message.application_properties or {})
+        if queue_message.body_type == AmqpMessageBodyType.DATA:
+            body = b"".join(queue_message.body)
+        elif queue_message.body_type == AmqpMessageBodyType.SEQUENCE:
+            body = json.dumps([list(section) for section in queue_message.body], default=DeadLetterReplayer.__json_default)
+            application_properties["replayed_body_type"] = "sequence"
+        elif isinstance(queue_message.body, (str, bytes)):
+            body = queue_message.body
+        else:
+            body = json.dumps(queue_message.body, default=DeadLetterReplayer.__json_default)
+            application_properties["replayed_body_type"] = "value"
+        application_properties["replayed_dead_letter_reason"] = queue_message.dead_letter_reason or ""
+        application_properties["replayed_message_id"] = queue_message.message_id or ""
+        return ServiceBusMessage(
+            body,
+            application_properties = application_properties,
+            session_id = queue_message.session_id,
+            message_id = queue_message.message_id if keep_message_id else str(uuid.uuid4()),
+            content_type = queue_message.content_type,
+            correlation_id = queue_message.correlation_id,
+            subject = queue_message.subject,
+            to = queue_message.to,
+            reply_to = queue_message.reply_to)
+
+    @staticmethod
+    def __json_default(value):
+        if isinstance(value, bytes):
+            return value.decode("utf-8", errors="backslashreplace")
+        return str(value)
+
+    def __count(self, key: str, value: int = 1):
+        with self.__lock:
+            self.__stats[key] += value
+
+    def __take_quota(self, wanted: int) -> int:
+        '''
+            Reserve part of max_messages for a receive, 0 means the quota is used up
+        '''
+        with self.__lock:
+            if self.__remaining is None:
+                return wanted
+            granted = min(wanted, self.__remaining)
+            self.__remaining -= granted
+            return granted
+
+    def __return_quota(self, unused: int):
+        '''
+            Give back the part of a reservation that didn't go to a matching message
+        '''
+        with self.__lock:
+            if self.__remaining is not None:
+                self.__remaining += unused
+
+    def __abandon(self, receiver: ServiceBusReceiver, queue_messages: List[ServiceBusReceivedMessage]):
+        for queue_message in queue_messages:
+            try:
+                receiver.abandon_message(queue_message)
+            except Exception as e:
+                print(f"Couldn't abandon dead-lettered message {queue_message.message_id}, due to:\n {e}")
+
+    def __replay_batch(self, receiver: ServiceBusReceiver, sender, queue_messages: List[ServiceBusReceivedMessage]):
+        sent = 0
+        try:
+            results = MessageBatchSender.Send(sender, (self.ToReplayMessage(queue_message, self.keep_message_id) for queue_message in queue_messages))
+            sent = sum(result["message_count"] for result in results)
+        except BatchSendError as e:
+            sent = sum(result["message_count"] for result in e.results if result["success"])
+            print(f"Couldn't resubmit {len(queue_messages) - sent} message(s) to {self.queue_name}, due to:\n {e}")
+        except Exception as e:
+            print(f"Couldn't resubmit {len(queue_messages)} message(s) to {self.queue_name}, due to:\n {e}")
+
+        # Messages are sent in order, so the first `sent` copies reached the queue and their originals can be completed
+        for queue_message in queue_messages[:sent]:
+            try:
+                receiver.complete_message(queue_message)
+                self.__count("replayed")
+            except Exception as e:
+                print(f"Resubmitted but couldn't complete dead-lettered message {queue_message.message_id}, due to:\n {e}")
+                self.__count("failed")
+        self.__abandon(receiver, queue_messages[sent:])
+        self.__count("failed", len(queue_messages) - sent)
+
+    def __split(self, queue_messages: List[ServiceBusReceivedMessage]) -> tuple:
+        matched = [queue_message for queue_message in queue_messages if self.__matches(queue_message)]
+        skipped = [queue_message for queue_message in queue_messages if not self.__matches(queue_message)]
+        self.__count("received", len(queue_messages))
+        self.__count("matched", len(matched))
+        self.__count("skipped", len(skipped))
+        return matched, skipped
+
+    def __worker(self):
+        client = self.pool.get_client()
+        receiver = client.get_queue_receiver(
+            self.queue_name,
+            sub_queue = ServiceBusSubQueue.DEAD_LETTER,
+            receive_mode = ServiceBusReceiveMode.PEEK_LOCK)
+        sender = client.get_queue_sender(self.queue_name)
+        lock_renewer = AutoLockRenewer()
+        held : List[ServiceBusReceivedMessage] = []
+        with receiver, sender:
+            try:
+                while True:
+                    wanted = self.__take_quota(self.batch_size)
+                    if wanted == 0:
+                        break
+                    # Held messages are not delivered again, an empty receive means the dead-letter queue has nothing left for this worker
+                    try:
+                        queue_messages = receiver.receive_messages(max_message_count=wanted, max_wait_time=self.max_wait_time)
+                    except BaseException:
+                        self.__return_quota(wanted)
+                        raise
+                    matched, skipped = self.__split(queue_messages)
+                    # Only matching messages count toward max_messages
+                    self.__return_quota(wanted - len(matched))
+                    if not queue_messages:
+                        break
+                    room = max(0, self.max_held - len(held))
+                    for queue_message in skipped[:room]:
+                        lock_renewer.register(receiver, queue_message, max_lock_renewal_duration=self.skipped_lock_duration)
+                    held.extend(skipped[:room])
+                    if matched:
+                        self.__replay_batch(receiver, sender, matched)
+                    if len(skipped) > room:
+                        print(f"Dead-letter replay worker for {self.queue_name} holds {len(held)} skipped message(s), "
+                              f"abandoning {len(skipped) - room} over the limit and stopping")
+                        self.__abandon(receiver, skipped[room:])
+                        break
+            finally:
+                lock_renewer.close()
+                self.__abandon(receiver, held)
+
+    def __browse(self):
+        '''
+            Dry run: count what a replay would do by peeking at the dead-letter queue, without locking any message
+        '''
+        client = self.pool.get_client()
+        receiver = client.get_queue_receiver(self.queue_name, sub_queue = ServiceBusSubQueue.DEAD_LETTER)
+        with receiver:
+            from_sequence_number = 0
+            while True:
+                wanted = self.__take_quota(self.batch_size)
+                if wanted == 0:
+                    break
+                queue_messages = receiver.peek_messages(max_message_count=wanted, sequence_number=from_sequence_number)
+                matched, _ = self.__split(queue_messages)
+                self.__return_quota(wanted - len(matched))
+                if not queue_messages:
+                    break
+                from_sequence_number = queue_messages[-1].sequence_number + 1
+
+    def __report_progress(self):
+        while not self.__done.wait(self.progress_interval):
+            print(self.__progress_message())
+
+    def __progress_message(self) -> str:
+        stats = self.stats()
+        return (f"Dead-letter replay {self.queue_name}: received {stats['received']}, matched {stats['matched']}, replayed {stats['replayed']}, "
+                f"skipped {stats['skipped']}, failed {stats['failed']}, {stats['throughput']:.1f} msg/s")
+
+    def stats(self) -> dict:
+        '''
+            Return progress counters, elapsed seconds and replayed messages per second
+        '''
+        with self.__lock:
+            stats = dict(self.__stats)
+        elapsed = time.perf_counter() - self.__started_at if self.__started_at else 0.0
+        stats["elapsed"] = elapsed
+        stats["throughput"] = stats["replayed"] / elapsed if elapsed > 0 else 0.0
+        return stats
+
+    def replay(self, max_messages: Optional[int] = None) -> dict:
+        '''
+            Replay the dead-letter queue until it is drained or max_messages matching messages were received
+            Return: dict with received/matched/replayed/skipped/failed counts, elapsed seconds and throughput
+            Raise: DeadLetterReplayError when a worker stopped on an error
+        '''
+        self.__remaining = max_messages
+        self.__errors = []
+        self.__done.clear()
+        self.__started_at = time.perf_counter()
+        reporter = threading.Thread(target=self.__report_progress, name="dead-letter-progress", daemon=True)
+        reporter.start()
+        # Browsing is done by one thread, concurrent peeks would read the same messages
+        worker_count = 1 if self.dry_run else self.receiver_count
+        workers = [threading.Thread(target=self.__run_worker, name=f"dead-letter-replay-{index}") for index in range(worker_count)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.__done.set()
+        reporter.join()
+        print(self.__progress_message())
+        if self.__errors:
+            message = "\n ".join(str(error) for error in self.__errors)
+            raise DeadLetterReplayError(
+                f"{len(self.__errors)} dead-letter replay worker(s) for {self.queue_name} stopped, due to:\n {message}",
+                self.stats(), list(self.__errors)) from self.__errors[0]
+        return self.stats()
+
+    def __run_worker(self):
+        try:
+            self.__browse() if self.dry_run else self.__worker()
+        except Exception as e:
+            print(f"Dead-letter replay worker for {self.queue_name} stopped, due to:\n {e}")
+            with self.__lock:
+                self.__errors.append(e)
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Replay messages from the dead-letter queue of a Service Bus queue")
+    parser.add_argument("--queue", required=True, help="Name of the queue whose dead-letter queue is replayed")
+    parser.add_argument("--connection-string", default=os.getenv("SERVICEBUS_CONN_STRING"), help="Defaults to SERVICEBUS_CONN_STRING")
+    parser.add_argument("--receivers", type=int, default=4, help="Number of concurrent dead-letter receivers")
+    parser.add_argument("--batch-size", type=int, default=100, help="Max messages received per round trip")
+    parser.add_argument("--reason", help="Regular expression matched against the dead letter reason")
+    parser.add_argument("--description", help="Regular expression matched against the dead letter description")
+    parser.add_argument("--max-messages", type=int, help="Stop after receiving this number of matching messages")
+    parser.add_argument("--max-held", type=int, default=1000, help="Max skipped messages a receiver keeps locked")
+    parser.add_argument("--dry-run", action="store_true", help="Peek at and count messages without locking or resubmitting them")
+    parser.add_argument("--keep-message-id", action="store_true", help="Keep the original message id, only for queues without duplicate detection")
+    args = parser.parse_args()
+    if not args.connection_string:
+        parser.error("--connection-string or SERVICEBUS_CONN_STRING is required")
+
+    replayer = DeadLetterReplayer(
+        connection_string = args.connection_string,
+        queue_name = args.queue,
+        receiver_count = args.receivers,
+        batch_size = args.batch_size,
+        reason_filter = args.reason,
+        description_filter = args.description,
+        dry_run = args.dry_run,
+        keep_message_id = args.keep_message_id,
+        max_held = args.max_held)
+    try:
+        stats = replayer.replay(max_messages = args.max_messages)
+    except DeadLetterReplayError as e:
+        print(e)
+        sys.exit(1)
+    finally:
+        replayer.pool.close()
+    # Messages that couldn't be resubmitted stay in the dead-letter queue, the run did not do all of its work
+    sys.exit(1 if stats["failed"] else 0)
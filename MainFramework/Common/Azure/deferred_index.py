@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional, Union
+
+class DeferredMessageIndex:
+    '''
+        Persistent local index of deferred Service Bus messages, kept in a SQLite file:
+        - A deferred message can only be received again by its sequence number, so every deferral is recorded here
+        - Each entry keeps the reason and the time the message is due for processing
+        - db_path: SQLite file, defaults to DEFERRED_INDEX_PATH or Data/deferred_messages.db under the working directory
+    '''
+    def __init__(self, db_path: Optional[str] = None):
+        if not db_path:
+            db_path = os.getenv("DEFERRED_INDEX_PATH") or os.path.join(os.getcwd(), "Data", "deferred_messages.db")
+        self.db_path = db_path
+        self.__lock = threading.Lock()
+        try:
+            self.__connection = sqlite3.connect(db_path, check_same_thread=False)
+            self.__connection.execute(
+                """CREATE TABLE IF NOT EXISTS deferred_messages (
+                    queue_name TEXT NOT NULL,
+                    sequence_number INTEGER NOT NULL,
+                    message_id TEXT,
+                    reason TEXT,
+                    due_at REAL NOT NULL,
+                    deferred_at REAL NOT NULL,
+                    PRIMARY KEY (queue_name, sequence_number))""")
+            self.__connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_deferred_messages_due ON deferred_messages (queue_name, due_at)")
+            self.__connection.commit()
+        except Exception as e:
+            error_message = f"Couldn't open deferred message index {db_path}, due to:\n {e}"
+            raise Exception(error_message)
+
+    @staticmethod
+    def __to_timestamp(value: Optional[Union[datetime, float]]) -> float:
+        if value is None:
+            return time.time()
+        if isinstance(value, datetime):
+            return value.timestamp()
+        return float(value)
+
+    def add(
+            self,
+            queue_name: str,
+            sequence_number: int,
+            message_id: Optional[str] = None,
+            reason: Optional[str] = None,
+            due_at: Optional[Union[datetime, float]] = None
+            ):
+        '''
+            Record a deferred message, deferring it again replaces the reason and due time
+            - due_at: datetime or epoch seconds the message is due, now if not provided
+        '''
+        with self.__lock:
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO deferred_messages VALUES (?, ?, ?, ?, ?, ?)",
+                (queue_name, sequence_number, message_id, reason, self.__to_timestamp(due_at), time.time()))
+            self.__connection.commit()
+
+    def due(
+            self,
+            queue_name: str,
+            limit: Optional[int] = None,
+            now: Optional[Union[datetime, float]] = None
+            ) -> List[int]:
+        '''
+            Return sequence numbers of deferred messages that are due, oldest due time first
+        '''
+        query = "SELECT sequence_number FROM deferred_messages WHERE queue_name = ? AND due_at <= ? ORDER BY due_at, sequence_number"
+        parameters : tuple = (queue_name, self.__to_timestamp(now))
+        if limit:
+            query += " LIMIT ?"
+            parameters += (limit,)
+        with self.__lock:
+            return [row[0] for row in self.__connection.execute(query, parameters)]
+
+    def get(self, queue_name: str, sequence_number: int) -> Optional[dict]:
+        '''
+            Return the index entry of a deferred message, None if it is not indexed
+        '''
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT message_id, reason, due_at, deferred_at FROM deferred_messages WHERE queue_name = ? AND sequence_number = ?",
+                (queue_name, sequence_number)).fetchone()
+        if not row:
+            return None
+        return {"sequence_number": sequence_number, "message_id": row[0], "reason": row[1], "due_at": row[2], "deferred_at": row[3]}
+
+    def remove(self, queue_name: str, sequence_numbers: List[int]):
+        '''
+            Remove messages that were settled or no longer exist on the broker
+        '''
+        with self.__lock:
+            self.__connection.executemany(
+                "DELETE FROM deferred_messages WHERE queue_name = ? AND sequence_number = ?",
+                [(queue_name, sequence_number) for sequence_number in sequence_numbers])
+            self.__connection.commit()
+
+    def count(self, queue_name: Optional[str] = None) -> int:
+        '''
+            Number of indexed deferred messages, for one queue or all of them
+        '''
+        with self.__lock:
+            if queue_name:
+                return self.__connection.execute(
+                    "SELECT COUNT(*) FROM deferred_messages WHERE queue_name = ?", (queue_name,)).fetchone()[0]
+            return self.__connection.execute("SELECT COUNT(*) FROM deferred_messages").fetchone()[0]
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
@@ -1,8 +1,17 @@
 from azure.identity import ClientSecretCredential
 from azure.keyvault.secrets import SecretClient
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import builtins
+import importlib.util
 import os
-from typing import Optional
+import threading
+from typing import Dict, List, Optional
+from MainFramework.Common.cache import TTLCache
+from MainFramework.Common.metrics import Metrics
+from MainFramework.Common.rate_limiter import RateLimiter
+from MainFramework.Common.retry import RetryPolicy
 
 load_dotenv()
 TENANT_ID = os.getenv("AZURE_TENANT_ID")
@@ -10,48 +19,96 @@ CLIENT_ID = os.getenv("AZURE_CLIENT_ID")
 CLIENT_SECRET = os.getenv("AZURE_CLIENT_SECRET")
 
 
+class SharedAsyncCredential:
+    '''
+        Async view of the process wide ClientSecretCredential for the aio SecretClient, tokens are fetched on a worker
+        thread by the shared credential, so its token cache is reused across calls and event loops
+    '''
+    def __init__(self, credential: ClientSecretCredential):
+        self.credential = credential
+
+    async def get_token(self, *scopes, **kwargs):
+        return await asyncio.to_thread(self.credential.get_token, *scopes, **kwargs)
+
+    async def close(self):
+        # The shared credential outlives the async client
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
 class AzureKeyVault:
     '''
         Azure Key vault actions
         - Provide vault name for authentication
         - Set up your tenant id, client id/secret either on local machine or .env
+        - One credential is shared by the process and one SecretClient is kept per vault, so tokens and connections are reused.
+          The async prefetch client authenticates through the same credential
+        - Secret values are cached per vault with TTL and LRU eviction (cache_ttl seconds, cache_size entries),
+          SetSecret and DeleteSecret invalidate the cached entries of the secret
     '''
-    def __init__(self, vault_name: str):
+    __credential : Optional[ClientSecretCredential] = None
+    __clients : dict = {}
+    __caches : dict = {}
+    __lock = threading.Lock()
+
+    def __init__(self, vault_name: str, cache_ttl: float = 300, cache_size: int = 256):
         self.vault_url = f"https://{vault_name}.vault.azure.net/"
+        with AzureKeyVault.__lock:
+            if self.vault_url not in AzureKeyVault.__caches:
+                AzureKeyVault.__caches[self.vault_url] = TTLCache(max_size=cache_size, ttl=cache_ttl)
+            self.cache : TTLCache = AzureKeyVault.__caches[self.vault_url]
+
+    @classmethod
+    def __get_credential(cls) -> ClientSecretCredential:
+        '''
+            Return the process wide credential, created on first use
+        '''
+        with cls.__lock:
+            if not cls.__credential:
+                cls.__credential = ClientSecretCredential(
+                    tenant_id = TENANT_ID,
+                    client_id = CLIENT_ID,
+                    client_secret = CLIENT_SECRET,
+                    connection_verify=False # Only in dev, investigating for furthere stable solution
+                )
+            return cls.__credential
 
     def __auth(self):
         try:
-            credential = ClientSecretCredential(
-                tenant_id = TENANT_ID,
-                client_id = CLIENT_ID,
-                client_secret = CLIENT_SECRET,
-                connection_verify=False # Only in dev, investigating for furthere stable solution
-            )
-            client = SecretClient(vault_url=self.vault_url, credential=credential)
+            credential = self.__get_credential()
+            with AzureKeyVault.__lock:
+                client = AzureKeyVault.__clients.get(self.vault_url)
+                if not client:
+                    client = SecretClient(vault_url=self.vault_url, credential=credential)
+                    AzureKeyVault.__clients[self.vault_url] = client
             return client
         except Exception as e:
             error_message = f"Couldn't authenticate key vault {self.vault_url}, due to:\n {e}"
-            raise Exception(error_message)
+            raise Exception(error_message) from e
 
+    @Metrics.integration("key_vault")
+    @RetryPolicy.integration("key_vault")
     def GetSecret(
                     self, 
                     secret_name: str, 
                     secret_version: Optional[str] = None, 
+                    use_cache: bool = True,
                     **kwargs
                     ) -> str:
         '''
             Get secret value from Azure key vault
             - secret_name: name of target secret to retrieve value
             - secret_version: version of target secret
+            - use_cache: return the cached value if it is still valid, False always reads from the vault
         '''
-        try:
-            client = self.__auth()
-            secret = client.get_secret(secret_name, secret_version, **kwargs).value
-            return secret
-        except Exception as e:
-            error_message = f"Couldn't retrieve secret {secret_name} from {self.vault_url}, due to:\n {e}"
-            raise Exception(error_message)
+        return self.__get_secret(secret_name, secret_version, use_cache, **kwargs)
 
+    @Metrics.integration("key_vault")
+    @RetryPolicy.integration("key_vault")
     def SetSecret(
                     self, 
                     secret_name: str, 
@@ -66,12 +123,16 @@ class AzureKeyVault:
         try:
             client = self.__auth()
             secret = client.set_secret(secret_name, secret_value, **kwargs)
+            self.cache.invalidate_where(lambda key: key[0] == secret_name)
             if secret != None:
+                self.cache.set((secret_name, None), secret.value)
                 return secret
         except Exception as e:
             error_message = f"Couldn't retrieve secret {secret_name} from {self.vault_url}, due to:\n {e}"
-            raise Exception(error_message)
+            raise Exception(error_message) from e
         
+    @Metrics.integration("key_vault")
+    @RetryPolicy.integration("key_vault", retry=False)
     def DeleteSecret(
                         self, 
                         secret_name: str, 
@@ -83,8 +144,120 @@ class AzureKeyVault:
         '''
         try:
             client = self.__auth()
+            self.cache.invalidate_where(lambda key: key[0] == secret_name)
             poller = client.begin_delete_secret(secret_name, **kwargs)
             deleted_secret = poller.result()
         except Exception as e:
             error_message = f"Couldn't delete secret {secret_name} from {self.vault_url}, due to:\n {e}"
-            raise Exception(error_message)
\ No newline at end of file
+            raise Exception(error_message) from e
+
+    def __get_secret(self, secret_name: str, secret_version: Optional[str] = None, use_cache: bool = True, **kwargs) -> str:
+        '''
+            GetSecret without the integration guard, for calls made inside a guarded method
+        '''
+        try:
+            cache_key = (secret_name, secret_version)
+            if use_cache:
+                secret = self.cache.get(cache_key)
+                if secret is not None:
+                    return secret
+            client = self.__auth()
+            secret = client.get_secret(secret_name, secret_version, **kwargs).value
+            self.cache.set(cache_key, secret)
+            return secret
+        except Exception as e:
+            error_message = f"Couldn't retrieve secret {secret_name} from {self.vault_url}, due to:\n {e}"
+            raise Exception(error_message) from e
+
+    async def __fetch_secrets_async(self, secret_names: List[str], max_concurrency: int) -> Dict[str, str]:
+        from azure.keyvault.secrets.aio import SecretClient as AsyncSecretClient
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+        credential = SharedAsyncCredential(self.__get_credential())
+        async with AsyncSecretClient(vault_url=self.vault_url, credential=credential) as client:
+            async def _fetch(secret_name: str):
+                async with semaphore:
+                    await RateLimiter.get("key_vault").acquire_async()
+                    return secret_name, (await client.get_secret(secret_name)).value
+            results = await asyncio.gather(*[_fetch(secret_name) for secret_name in secret_names], return_exceptions=True)
+
+        secrets = {}
+        errors = {}
+        for secret_name, result in zip(secret_names, results):
+            if isinstance(result, Exception):
+                errors[secret_name] = result
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                secrets[result[0]] = result[1]
+        if errors:
+            # The original errors are kept, so the retry policy tells a missing secret from a throttled or failed request
+            message = "\n ".join(f"{secret_name}: {error}" for secret_name, error in errors.items())
+            error_message = f"Couldn't fetch {len(errors)} secret(s):\n {message}"
+            exception_group = getattr(builtins, "ExceptionGroup", None)
+            if exception_group is None:
+                # Python < 3.11, the first error is kept as the cause
+                raise Exception(error_message) from next(iter(errors.values()))
+            raise exception_group(error_message, list(errors.values()))
+        return secrets
+
+    def __fetch_secrets_threaded(self, secret_names: List[str], max_concurrency: int) -> Dict[str, str]:
+        def _fetch(secret_name: str) -> str:
+            RateLimiter.get("key_vault").acquire()
+            return self.__get_secret(secret_name, use_cache=False)
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            values = list(executor.map(_fetch, secret_names))
+        return dict(zip(secret_names, values))
+
+    @Metrics.integration("key_vault")
+    @RetryPolicy.integration("key_vault")
+    def PrefetchSecrets(self, secret_names: List[str], max_concurrency: int = 10) -> Dict[str, str]:
+        '''
+            Fetch many secrets concurrently and load them into the secret cache
+            - secret_names: names of the secrets to fetch, already cached values are not fetched again
+            - max_concurrency: max number of requests in flight
+
+            Return: dict of secret name to value for every requested secret
+        '''
+        secret_names = list(dict.fromkeys(secret_names))
+        secrets = {}
+        missing = []
+        for secret_name in secret_names:
+            value = self.cache.get((secret_name, None))
+            if value is None:
+                missing.append(secret_name)
+            else:
+                secrets[secret_name] = value
+        if not missing:
+            return secrets
+        try:
+            try:
+                asyncio.get_running_loop()
+                in_event_loop = True
+            except RuntimeError:
+                in_event_loop = False
+            if in_event_loop or importlib.util.find_spec("aiohttp") is None:
+                # asyncio.run can't be nested and the async clients need aiohttp, fall back to the shared sync client on a thread pool
+                fetched = self.__fetch_secrets_threaded(missing, max_concurrency)
+            else:
+                fetched = asyncio.run(self.__fetch_secrets_async(missing, max_concurrency))
+        except Exception as e:
+            error_message = f"Couldn't prefetch secrets from {self.vault_url}, due to:\n {e}"
+            raise Exception(error_message) from e
+        for secret_name, value in fetched.items():
+            self.cache.set((secret_name, None), value)
+        secrets.update(fetched)
+        return secrets
+
+    def GetCacheStats(self) -> dict:
+        '''
+            Return hit/miss/eviction counts of this vault's secret cache
+        '''
+        return self.cache.stats()
+
+    def ClearCache(self):
+        '''
+            Drop every cached secret of this vault
+        '''
+        self.cache.clear()
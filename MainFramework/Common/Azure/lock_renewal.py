@@ -0,0 +1,54 @@
+import threading
+import time
+from contextlib import contextmanager
+
+class LockRenewalPolicy:
+    '''
+        Decide how long the locks of received messages are renewed, based on how long items actually take to process:
+        - The processing time of each item is smoothed into a moving average
+        - A message at position i of a batch waits for the i items before it, so its lock is renewed for (i + 1) items
+        - safety_factor leaves room for slow items, min/max_duration bound the result in seconds
+    '''
+    def __init__(
+                    self,
+                    min_duration: float = 60,
+                    max_duration: float = 3600,
+                    safety_factor: float = 3.0,
+                    smoothing: float = 0.2,
+                    initial_estimate: float = 60
+                    ):
+        self.min_duration = min_duration
+        self.max_duration = max_duration
+        self.safety_factor = safety_factor
+        self.smoothing = smoothing
+        self.__average = initial_estimate
+        self.__lock = threading.Lock()
+
+    @property
+    def average_processing_time(self) -> float:
+        return self.__average
+
+    def record(self, elapsed_seconds: float):
+        '''
+            Add the processing time of one item to the moving average
+        '''
+        with self.__lock:
+            self.__average = (1 - self.smoothing) * self.__average + self.smoothing * elapsed_seconds
+
+    @contextmanager
+    def track(self):
+        '''
+            Time the with block and record it as the processing time of one item
+        '''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(time.perf_counter() - start)
+
+    def duration_for(self, position: int = 0) -> float:
+        '''
+            Lock renewal duration in seconds for the message at a position of its batch
+        '''
+        duration = self.__average * self.safety_factor * (position + 1)
+        return max(self.min_duration, min(self.max_duration, duration))
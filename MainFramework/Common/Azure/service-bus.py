@@ -1,76 +1,167 @@
 import os
-from enum import Enum
-from typing import List, Optional, Tuple
+from datetime import datetime
+from typing import Any, Callable, Iterable, List, Optional, Tuple, Union
 from azure.servicebus import (
+    AutoLockRenewer,
     ServiceBusClient, 
     ServiceBusMessage, 
     ServiceBusReceivedMessage, 
     ServiceBusReceiveMode, 
     ServiceBusReceiver,
     ServiceBusSender)
-
-class SettleType(Enum):
-    COMPLETE = "complete"
-    ABANDON = "abandon"
-    DEAD_LETTER = "dead letter"
-    DEFER = "defer"
+from azure.servicebus.exceptions import MessageNotFoundError, MessageSizeExceededError
+from Data.constant import SettleType
+from MainFramework.Common.Azure.service_bus_pool import ServiceBusClientPool
+from MainFramework.Common.Azure.service_bus_batch import BatchSendError, MessageBatchSender
+from MainFramework.Common.Azure.lock_renewal import LockRenewalPolicy
+from MainFramework.Common.Azure.deferred_index import DeferredMessageIndex
+from MainFramework.Common.idempotency_store import IdempotencyStore
+from MainFramework.Common.metrics import Metrics
+from MainFramework.Common.retry import RetryPolicy
 
 class AzureServiceBus:
     '''
         Azure Service Bus's actions:
         - Provide connection string in order to authenticate
         - Send, receive and settle queue messages
+        - The client, senders and receivers come from a process wide ServiceBusClientPool and stay open between calls
+        - PEEK_LOCK messages can be kept locked by an AutoLockRenewer sized by lock_renewal_policy
+        - Deferred messages are recorded in a DeferredMessageIndex and received back with ReceiveDeferredMessages
+        - With an IdempotencyStore, completed message ids are remembered and redelivered duplicates are completed on receive
+          without being returned to the caller
     '''
-    def __init__(self, connection_string: str) -> ServiceBusClient:
+    def __init__(
+                    self,
+                    connection_string: str,
+                    lock_renewal_policy: Optional[LockRenewalPolicy] = None,
+                    deferred_index: Optional[DeferredMessageIndex] = None,
+                    idempotency_store: Optional[IdempotencyStore] = None
+                    ) -> ServiceBusClient:
         self.connection_string = connection_string
+        self.pool = ServiceBusClientPool.get_pool(connection_string)
+        self.lock_renewal_policy = lock_renewal_policy if lock_renewal_policy else LockRenewalPolicy()
+        self.idempotency_store = idempotency_store
+        self.__lock_renewer : Optional[AutoLockRenewer] = None
+        self.__deferred_index = deferred_index
+
+    @property
+    def deferred_index(self) -> DeferredMessageIndex:
+        '''
+            Index of deferred messages, the default SQLite file is opened on first use
+        '''
+        if not self.__deferred_index:
+            self.__deferred_index = DeferredMessageIndex()
+        return self.__deferred_index
 
     def __auth(self) -> ServiceBusClient:
         '''
-            Create a service bus client, authenticated via a connection string to create ServiceBusSender and ServiceBusReceiver
+            Return the pooled service bus client, authenticated via a connection string to create ServiceBusSender and ServiceBusReceiver
         '''
+        return self.pool.get_client()
+
+    def __send_batches(
+                        self,
+                        queue_name: str,
+                        queue_messages: Iterable,
+                        client: Optional[ServiceBusClient] = None,
+                        sender: Optional[ServiceBusSender] = None,
+                        max_size_in_bytes: Optional[int] = None,
+                        on_batch_sent: Optional[Callable[[dict], None]] = None
+                        ) -> Tuple[List[dict], ServiceBusSender]:
+        if sender:
+            return MessageBatchSender.Send(sender, queue_messages, max_size_in_bytes, on_batch_sent), sender
+        if client:
+            # A sender made from the caller's client is not pooled, its link is closed once the batches are sent
+            with client.get_queue_sender(queue_name) as sender:
+                return MessageBatchSender.Send(sender, queue_messages, max_size_in_bytes, on_batch_sent), sender
         try:
-            return ServiceBusClient.from_connection_string(conn_str=self.connection_string)
-        except Exception as e:
-            error_message = f"Couldn't connect to service bus"
-            raise Exception(error_message)
-    
+            with self.pool.sender(queue_name) as sender:
+                return MessageBatchSender.Send(sender, queue_messages, max_size_in_bytes, on_batch_sent), sender
+        except (ValueError, MessageSizeExceededError):
+            raise
+        except BatchSendError as e:
+            # Only a sequence that failed before its first batch went out can be re-sent without duplicates
+            if len(e.results) > 1 or not isinstance(queue_messages, (list, tuple)):
+                raise
+            print(f"Pooled sender for queue {queue_name} failed, reconnecting. Due to:\n {e}")
+            with self.pool.sender(queue_name) as sender:
+                return MessageBatchSender.Send(sender, queue_messages, max_size_in_bytes, on_batch_sent), sender
+
+    @Metrics.integration("service_bus")
+    @RetryPolicy.integration("service_bus", retry=False)
     def SendMessageToQueue(
                             self, 
                             queue_name: str, 
-                            queue_messages: list,
+                            queue_messages: Iterable,
                             client: Optional[ServiceBusClient] = None,
                             sender: Optional[ServiceBusSender] = None
                             ) -> ServiceBusSender:
         '''
-            Send a message to a specific queue
+            Send a message to a specific queue. Messages are packed into size-aware batches, so large lists don't hit the broker size limit
 
             queue_name: name of target queue to send message to
-            queue_messages: list of messages to send to queue
-            client: Authenticated client
-            sender: ServiceBusSender client to send message to queue
+            queue_messages: list (or any iterable) of messages to send to queue
+            client: Authenticated client, the pooled client is used if not provided. A sender made from it is closed after the send
+            sender: ServiceBusSender client to send message to queue, the pooled sender is used if not provided.
+                    A pooled sender that fails before sending anything is reconnected and the send is tried once more
 
             Return: ServiceBusSender client
         '''
         try:
-            if not client:
-                client = self.__auth()
-            with client:
-                if not sender:
-                    sender = client.get_queue_sender(queue_name)
-                with sender:
-                    list_message = []
-                    for queue_message in queue_messages:
-                        list_message.append(ServiceBusMessage(queue_message))
-                    sender.send_messages(list_message)
-
-                    print(f"Sent message to queue {queue_name} successfully!")
-                    return sender
+            _, sender = self.__send_batches(queue_name, queue_messages, client = client, sender = sender)
+
+            print(f"Sent message to queue {queue_name} successfully!")
+            return sender
         except ValueError as val_err:
             raise ValueError(val_err)
         except Exception as e:
             error_message = f"Couldn't send message to queue {queue_name}. due to:\n {e}"
             raise Exception(error_message)
+
+    @Metrics.integration("service_bus")
+    @RetryPolicy.integration("service_bus", retry=False)
+    def SendMessageBatches(
+                            self,
+                            queue_name: str,
+                            queue_messages: Iterable,
+                            max_size_in_bytes: Optional[int] = None,
+                            on_batch_sent: Optional[Callable[[dict], None]] = None,
+                            client: Optional[ServiceBusClient] = None,
+                            sender: Optional[ServiceBusSender] = None
+                            ) -> List[dict]:
+        '''
+            Stream messages to a specific queue. Messages are pulled from the iterable and packed into ServiceBusMessageBatch
+            objects up to the size limit, each batch is sent as soon as it is full, so only one batch is held in memory
+
+            queue_name: name of target queue to send message to
+            queue_messages: iterable or generator of message bodies or ServiceBusMessage
+            max_size_in_bytes: optional batch size limit lower than the link's limit
+            on_batch_sent: optional callback receiving each batch result, e.g. for progress reporting
+
+            Return: list of per-batch results {batch, message_count, size_in_bytes, elapsed, success, error}
+        '''
+        try:
+            results, _ = self.__send_batches(
+                queue_name,
+                queue_messages,
+                client = client,
+                sender = sender,
+                max_size_in_bytes = max_size_in_bytes,
+                on_batch_sent = on_batch_sent)
+            print(f"Sent {sum(result['message_count'] for result in results)} message(s) in {len(results)} batch(es) to queue {queue_name} successfully!")
+            return results
+        except ValueError as val_err:
+            raise ValueError(val_err)
+        except BatchSendError as e:
+            sent = sum(result["message_count"] for result in e.results if result["success"])
+            error_message = f"Couldn't send message batches to queue {queue_name} after {sent} message(s). due to:\n {e}"
+            raise BatchSendError(error_message, e.results)
+        except Exception as e:
+            error_message = f"Couldn't send message batches to queue {queue_name}. due to:\n {e}"
+            raise Exception(error_message)
     
+    @Metrics.integration("service_bus")
+    @RetryPolicy.integration("service_bus")
     def ReceiveQueueMessages(
                             self, 
                             queue_name: str, 
@@ -78,7 +169,8 @@ class AzureServiceBus:
                             timeout: float = 60,
                             receive_mode: str = ServiceBusReceiveMode.PEEK_LOCK.value,
                             client: Optional[ServiceBusClient] = None,
-                            receiver: Optional[ServiceBusReceiver] = None
+                            receiver: Optional[ServiceBusReceiver] = None,
+                            auto_lock_renew: bool = False
                             ) -> Tuple[List[ServiceBusReceivedMessage], ServiceBusReceiver]:
         '''
             Receive batch of messages from a specific queue
@@ -87,56 +179,338 @@ class AzureServiceBus:
             number_of_messages: max number of messages to be retrieved in a batch
             timeout: maximum amount of time to wait for success retrieval of batch
             receive_mode: PEEK_LOCK or RECEIVE_AND_DELETE
+            auto_lock_renew: keep the locks of PEEK_LOCK messages renewed until they are settled, see RegisterLockRenewal
 
             Return: List of messages and ServiceBusReceiver client to later settle queue message
         '''
         try:
-            if not client:
-                client = self.__auth()
             if not receiver:
-                receiver = client.get_queue_receiver(queue_name, receive_mode=receive_mode)
-            receive_messages = receiver.receive_messages(max_message_count=number_of_messages, max_wait_time=timeout)
+                if client:
+                    receiver = client.get_queue_receiver(queue_name, receive_mode=receive_mode)
+                else:
+                    receiver = self.pool.get_receiver(queue_name, receive_mode=receive_mode)
+            receive_messages = self.__receive_new_messages(receiver, receive_mode, number_of_messages, timeout)
             if receive_messages != None and len(receive_messages) > 0:
                 print(f"Recevied {len(receive_messages)} message(s)!")
+                self.pool.touch(receiver)
+                if auto_lock_renew and str(receive_mode) == str(ServiceBusReceiveMode.PEEK_LOCK.value):
+                    self.RegisterLockRenewal(receiver, receive_messages)
                 return receive_messages, receiver
             else:
                 print("Recevied no message!")
                 return [], receiver
         except Exception as e:
+            if receiver:
+                self.pool.invalidate_receiver(receiver)
             error_message = f"Couldn't receive message from queue {queue_name}. due to:\n {e}"
             raise Exception(error_message)
 
+    def __settle(
+                    self,
+                    receiver: ServiceBusReceiver,
+                    queue_message: ServiceBusReceivedMessage,
+                    settle_mode: str,
+                    dead_letter_reason: Optional[str] = None,
+                    dead_letter_desc: Optional[str] = None,
+                    defer_reason: Optional[str] = None,
+                    defer_until: Optional[Union[datetime, float]] = None,
+                    queue_name: Optional[str] = None
+                    ):
+        if not queue_name and self.__needs_index(settle_mode):
+            # Checked before settling, a deferral missing from the index could never be received back
+            raise ValueError("queue_name is required to index deferred messages")
+        match settle_mode.lower():
+            case SettleType.COMPLETE.value:
+                # Marked before completing, a completion lost with the lock must not lead to processing the redelivery again
+                self.MarkProcessed(queue_message)
+                receiver.complete_message(queue_message)
+            case SettleType.ABANDON.value:
+                receiver.abandon_message(queue_message)
+            case SettleType.DEAD_LETTER.value:
+                receiver.dead_letter_message(
+                    message = queue_message,
+                    reason = dead_letter_reason,
+                    error_description = dead_letter_desc)
+            case SettleType.DEFER.value:
+                receiver.defer_message(queue_message)
+            case _:
+                raise ValueError(f"Unknown settle mode {settle_mode}")
+        self.pool.touch(receiver)
+        self.__index_settlement(queue_message, settle_mode, defer_reason, defer_until, queue_name)
+
+    def __needs_index(self, settle_mode: str) -> bool:
+        '''
+            A deferral is always indexed, a final settlement only updates an index that is already in use
+        '''
+        if settle_mode.lower() == SettleType.ABANDON.value:
+            return False
+        return settle_mode.lower() == SettleType.DEFER.value or self.__deferred_index is not None
+
+    def __index_settlement(
+                            self,
+                            queue_message: ServiceBusReceivedMessage,
+                            settle_mode: str,
+                            defer_reason: Optional[str],
+                            defer_until: Optional[Union[datetime, float]],
+                            queue_name: Optional[str]
+                            ):
+        '''
+            Record a deferral in the deferred index, or drop a previously deferred message that is now settled for good
+        '''
+        if not self.__needs_index(settle_mode):
+            return
+        if settle_mode.lower() == SettleType.DEFER.value:
+            self.deferred_index.add(
+                queue_name,
+                queue_message.sequence_number,
+                message_id = queue_message.message_id,
+                reason = defer_reason,
+                due_at = defer_until)
+        elif queue_message.state is not None and str(getattr(queue_message.state, "name", queue_message.state)).upper() == "DEFERRED":
+            self.deferred_index.remove(queue_name, [queue_message.sequence_number])
+
+    def __receive_new_messages(
+                                self,
+                                receiver: ServiceBusReceiver,
+                                receive_mode: str,
+                                number_of_messages: int,
+                                timeout: float
+                                ) -> List[ServiceBusReceivedMessage]:
+        '''
+            Receive a batch and drop messages the idempotency store has already seen processed.
+            Duplicates are completed right away, a batch made only of duplicates is followed by another receive
+        '''
+        while True:
+            receive_messages = receiver.receive_messages(max_message_count=number_of_messages, max_wait_time=timeout)
+            if not self.idempotency_store or not receive_messages:
+                return receive_messages
+            new_messages = []
+            for queue_message in receive_messages:
+                if not self.idempotency_store.is_processed(queue_message.message_id):
+                    new_messages.append(queue_message)
+                    continue
+                print(f"Message {queue_message.message_id} was already processed, completing duplicate")
+                if str(receive_mode) == str(ServiceBusReceiveMode.PEEK_LOCK.value):
+                    try:
+                        receiver.complete_message(queue_message)
+                    except Exception as e:
+                        print(f"Couldn't complete duplicate message {queue_message.message_id}, due to:\n {e}")
+            if new_messages:
+                return new_messages
+
+    def MarkProcessed(self, queue_message: ServiceBusReceivedMessage):
+        '''
+            Record a message as processed in the idempotency store, call it as soon as the business step finished so a
+            redelivery after a crash or lock loss is completed without processing it again
+        '''
+        if self.idempotency_store:
+            self.idempotency_store.mark_processed(queue_message.message_id)
+
+    @Metrics.integration("service_bus")
+    @RetryPolicy.integration("service_bus")
     def SettleQueueMessage(
                             self,
                             receiver: ServiceBusReceiver, 
                             queue_message: ServiceBusReceivedMessage,
                             settle_mode: str,
                             dead_letter_reason: Optional[str] = None,
-                            dead_letter_desc: Optional[str] = None
+                            dead_letter_desc: Optional[str] = None,
+                            defer_reason: Optional[str] = None,
+                            defer_until: Optional[Union[datetime, float]] = None,
+                            queue_name: Optional[str] = None
                             ):
         '''
-            Settle a queue message from a specific ServiceBusReceiver client
+            Settle a queue message from a specific ServiceBusReceiver client, the receiver is left open for the next message
             
             receiver: ServiceBusReceiver client to settle a queue message
             queue_message: queue message to settle 
             settle_mode: settle mode in SettleType
+            defer_reason: reason recorded in the deferred index when deferring
+            defer_until: datetime or epoch seconds the deferred message is due, now if not provided
+            queue_name: queue the message was received from, required to defer and while a deferred index is in use
         '''
         try:
-            with receiver:
-                match settle_mode.lower():
-                    case SettleType.COMPLETE.value:
-                        receiver.complete_message(queue_message)
-                    case SettleType.ABANDON.value:
-                        receiver.abandon_message(queue_message)
-                    case SettleType.DEAD_LETTER.value:
-                        receiver.dead_letter_message(
-                            message = queue_message,
-                            reason = dead_letter_reason,
-                            error_description = dead_letter_desc)
-                    case SettleType.DEFER.value:
-                        receiver.defer_message(queue_message)
-                
-                print(f"Settled message successfully. Mode: {settle_mode}")
+            self.__settle(receiver, queue_message, settle_mode, dead_letter_reason, dead_letter_desc, defer_reason, defer_until, queue_name)
+            print(f"Settled message successfully. Mode: {settle_mode}")
         except Exception as e:
             error_message = f"Couldn't settele queue message\nMode: {settle_mode}\nDue to:\n {e}"
-            raise Exception(error_message)
\ No newline at end of file
+            raise Exception(error_message)
+
+    @Metrics.integration("service_bus")
+    @RetryPolicy.integration("service_bus", retry=False)
+    def SettleQueueMessages(
+                            self,
+                            receiver: ServiceBusReceiver,
+                            settlements: Iterable[tuple],
+                            queue_name: Optional[str] = None
+                            ) -> List[dict]:
+        '''
+            Settle many queue messages on one open ServiceBusReceiver. A failed settlement (e.g. lock lost) doesn't stop the others
+
+            receiver: ServiceBusReceiver client that received the messages
+            settlements: iterable of (queue_message, settle_mode) or (queue_message, settle_mode, reason, detail), where
+                         reason/detail are the dead letter reason/description, or the defer reason/due time when deferring
+            queue_name: queue the messages were received from, required to defer and while a deferred index is in use
+
+            Return: list of per-message results {message_id, settle_mode, success, error}
+        '''
+        results = []
+        for settlement in settlements:
+            queue_message, settle_mode = settlement[0], settlement[1]
+            reason = settlement[2] if len(settlement) > 2 else None
+            detail = settlement[3] if len(settlement) > 3 else None
+            result = {"message_id": queue_message.message_id, "settle_mode": settle_mode, "success": True, "error": None}
+            try:
+                if settle_mode.lower() == SettleType.DEFER.value:
+                    self.__settle(receiver, queue_message, settle_mode, defer_reason = reason, defer_until = detail, queue_name = queue_name)
+                else:
+                    self.__settle(receiver, queue_message, settle_mode, reason, detail, queue_name = queue_name)
+            except Exception as e:
+                result["success"] = False
+                result["error"] = str(e)
+            results.append(result)
+        failed = len([result for result in results if not result["success"]])
+        print(f"Settled {len(results) - failed} message(s) successfully, {failed} failed")
+        return results
+
+    @Metrics.integration("service_bus")
+    @RetryPolicy.integration("service_bus")
+    def ReceiveDeferredMessages(
+                                self,
+                                queue_name: str,
+                                batch_size: int = 100,
+                                max_messages: Optional[int] = None,
+                                client: Optional[ServiceBusClient] = None,
+                                receiver: Optional[ServiceBusReceiver] = None
+                                ) -> Tuple[List[ServiceBusReceivedMessage], ServiceBusReceiver]:
+        '''
+            Receive deferred messages that are due, by sequence number from the deferred index, in large batches
+
+            queue_name: name of queue the messages were deferred on
+            batch_size: number of sequence numbers requested per round trip
+            max_messages: max number of due messages to receive, None receives all of them
+
+            Return: List of messages and ServiceBusReceiver client to later settle them. Messages that no longer exist are dropped from the index
+        '''
+        try:
+            if not receiver:
+                if client:
+                    receiver = client.get_queue_receiver(queue_name)
+                else:
+                    receiver = self.pool.get_receiver(queue_name)
+            sequence_numbers = self.deferred_index.due(queue_name, limit = max_messages)
+            receive_messages = []
+            for start in range(0, len(sequence_numbers), batch_size):
+                chunk = sequence_numbers[start:start + batch_size]
+                try:
+                    receive_messages.extend(receiver.receive_deferred_messages(sequence_numbers = chunk))
+                except MessageNotFoundError:
+                    # One missing message fails the whole chunk, fall back to one by one to find and drop it
+                    for sequence_number in chunk:
+                        try:
+                            receive_messages.extend(receiver.receive_deferred_messages(sequence_numbers = [sequence_number]))
+                        except MessageNotFoundError:
+                            self.deferred_index.remove(queue_name, [sequence_number])
+            print(f"Recevied {len(receive_messages)} deferred message(s)!")
+            return receive_messages, receiver
+        except Exception as e:
+            error_message = f"Couldn't receive deferred messages from queue {queue_name}. due to:\n {e}"
+            raise Exception(error_message)
+
+    def RegisterLockRenewal(
+                            self,
+                            receiver: ServiceBusReceiver,
+                            queue_messages: List[ServiceBusReceivedMessage],
+                            max_lock_renewal_duration: Optional[float] = None
+                            ):
+        '''
+            Keep the locks of received messages renewed until they are settled
+
+            receiver: ServiceBusReceiver client that received the messages
+            queue_messages: messages to keep locked, in the order they will be processed
+            max_lock_renewal_duration: seconds to keep renewing, by default sized by lock_renewal_policy from the
+                                       measured processing time and the position of each message in the batch
+        '''
+        try:
+            if not self.__lock_renewer:
+                self.__lock_renewer = AutoLockRenewer()
+            for position, queue_message in enumerate(queue_messages):
+                duration = max_lock_renewal_duration if max_lock_renewal_duration else self.lock_renewal_policy.duration_for(position)
+                self.__lock_renewer.register(receiver, queue_message, max_lock_renewal_duration=duration)
+        except Exception as e:
+            error_message = f"Couldn't register lock renewal for {len(queue_messages)} message(s), due to:\n {e}"
+            raise Exception(error_message)
+
+    def ProcessQueueMessages(
+                            self,
+                            queue_name: str,
+                            handler: Callable[[ServiceBusReceivedMessage], Any],
+                            number_of_messages: int = 10,
+                            timeout: float = 60,
+                            max_batches: Optional[int] = None
+                            ) -> dict:
+        '''
+            Receive batches of messages with lock renewal, run a handler for each message and settle it on the same receiver.
+            Messages already processed according to the idempotency store are completed without running the handler.
+            The handler's processing time feeds lock_renewal_policy, so later batches get locks sized to the real workload
+
+            queue_name: name of target queue to receive messages from
+            handler: callable taking a message, returns a settle mode (default complete). A raised exception abandons the message
+            number_of_messages: max number of messages to be retrieved in a batch
+            timeout: maximum amount of time to wait for a batch
+            max_batches: stop after this number of batches, None runs until the queue is empty
+
+            Return: summary dict with received/failed counts per settle mode
+        '''
+        summary = {"received": 0, "failed": 0}
+        summary.update({settle_type.value: 0 for settle_type in SettleType})
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            queue_messages, receiver = self.ReceiveQueueMessages(
+                queue_name,
+                number_of_messages = number_of_messages,
+                timeout = timeout,
+                auto_lock_renew = True)
+            if not queue_messages:
+                break
+            batches += 1
+            summary["received"] += len(queue_messages)
+            for queue_message in queue_messages:
+                try:
+                    with self.lock_renewal_policy.track():
+                        outcome = handler(queue_message)
+                    settle_mode = outcome.value if isinstance(outcome, SettleType) else (outcome or SettleType.COMPLETE.value)
+                except Exception as e:
+                    print(f"Handler failed for message {queue_message.message_id}, due to:\n {e}")
+                    settle_mode = SettleType.ABANDON.value
+                try:
+                    self.__settle(receiver, queue_message, settle_mode, queue_name = queue_name)
+                    summary[settle_mode.lower()] += 1
+                except Exception as e:
+                    print(f"Couldn't settle message {queue_message.message_id}, due to:\n {e}")
+                    summary["failed"] += 1
+        print(f"Processed {summary['received']} message(s) from queue {queue_name}: {summary}")
+        return summary
+
+    def HealthCheck(self) -> dict:
+        '''
+            Drop failed or idle pooled links so they are recreated on next use
+
+            Return: dict with connection state and number of open links
+        '''
+        return self.pool.health_check()
+
+    def GetPoolStats(self) -> dict:
+        '''
+            Return connection and sender/receiver reuse counts of the pooled client
+        '''
+        return self.pool.stats()
+
+    def Close(self):
+        '''
+            Close the lock renewer, the pooled client and all of its senders and receivers
+        '''
+        if self.__lock_renewer:
+            self.__lock_renewer.close()
+            self.__lock_renewer = None
+        self.pool.close()
\ No newline at end of file
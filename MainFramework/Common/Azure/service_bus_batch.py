@@ -0,0 +1,98 @@
+import time
+from typing import Callable, Iterable, Iterator, List, Optional
+from azure.servicebus import ServiceBusMessage, ServiceBusMessageBatch, ServiceBusSender
+from azure.servicebus.exceptions import MessageSizeExceededError
+
+class BatchSendError(Exception):
+    '''
+        Raised when a batch couldn't be sent, results holds the per-batch results up to and including the failed batch
+    '''
+    def __init__(self, message: str, results: List[dict]):
+        super().__init__(message)
+        self.results = results
+
+class MessageBatchSender:
+    '''
+        Pack a stream of messages into ServiceBusMessageBatch objects up to the broker size limit and send each batch as it fills.
+        Only one batch is held in memory, so any iterable or generator can be enqueued
+    '''
+    @staticmethod
+    def ToMessage(queue_message) -> ServiceBusMessage:
+        '''
+            Wrap a raw body into a ServiceBusMessage, ServiceBusMessage objects are kept as they are
+        '''
+        if isinstance(queue_message, ServiceBusMessage):
+            return queue_message
+        return ServiceBusMessage(queue_message)
+
+    @staticmethod
+    def IterBatches(
+                    sender: ServiceBusSender,
+                    queue_messages: Iterable,
+                    max_size_in_bytes: Optional[int] = None
+                    ) -> Iterator[ServiceBusMessageBatch]:
+        '''
+            Yield full batches of messages, the last batch may be partially filled
+
+            sender: ServiceBusSender used to create batches with the link's size limit
+            queue_messages: iterable or generator of message bodies or ServiceBusMessage
+            max_size_in_bytes: optional size limit lower than the link's limit
+        '''
+        batch = sender.create_message_batch(max_size_in_bytes=max_size_in_bytes)
+        for queue_message in queue_messages:
+            message = MessageBatchSender.ToMessage(queue_message)
+            try:
+                batch.add_message(message)
+            except MessageSizeExceededError:
+                if len(batch) == 0:
+                    raise ValueError(f"A single message exceeds the batch size limit of {batch.max_size_in_bytes} bytes")
+                yield batch
+                batch = sender.create_message_batch(max_size_in_bytes=max_size_in_bytes)
+                try:
+                    batch.add_message(message)
+                except MessageSizeExceededError:
+                    raise ValueError(f"A single message exceeds the batch size limit of {batch.max_size_in_bytes} bytes")
+        if len(batch) > 0:
+            yield batch
+
+    @staticmethod
+    def Send(
+                sender: ServiceBusSender,
+                queue_messages: Iterable,
+                max_size_in_bytes: Optional[int] = None,
+                on_batch_sent: Optional[Callable[[dict], None]] = None
+                ) -> List[dict]:
+        '''
+            Send a stream of messages in size-aware batches, flushing each batch as soon as it is full
+
+            sender: ServiceBusSender client to send message to queue
+            queue_messages: iterable or generator of message bodies or ServiceBusMessage
+            max_size_in_bytes: optional size limit lower than the link's limit
+            on_batch_sent: optional callback receiving each batch result, e.g. for progress reporting
+
+            Return: list of per-batch results {batch, message_count, size_in_bytes, elapsed, success, error}
+        '''
+        results = []
+        for index, batch in enumerate(MessageBatchSender.IterBatches(sender, queue_messages, max_size_in_bytes)):
+            result = {
+                "batch": index,
+                "message_count": len(batch),
+                "size_in_bytes": batch.size_in_bytes,
+                "elapsed": 0.0,
+                "success": True,
+                "error": None
+            }
+            start = time.perf_counter()
+            try:
+                sender.send_messages(batch)
+            except Exception as e:
+                result["success"] = False
+                result["error"] = str(e)
+                result["elapsed"] = time.perf_counter() - start
+                results.append(result)
+                raise BatchSendError(f"Couldn't send batch {index} ({len(batch)} message(s)), due to:\n {e}", results)
+            result["elapsed"] = time.perf_counter() - start
+            results.append(result)
+            if on_batch_sent:
+                on_batch_sent(result)
+        return results
@@ -0,0 +1,249 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from azure.servicebus import (
+    ServiceBusClient,
+    ServiceBusReceiveMode,
+    ServiceBusReceiver)
+
+class _PooledLink:
+    '''
+        A cached sender or receiver with the bookkeeping needed for health checks
+    '''
+    def __init__(self, link):
+        self.link = link
+        self.lock = threading.Lock()
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.failed = False
+        # Borrowers holding or waiting for the link, a link in use is never closed under them
+        self.borrowers = 0
+        self.retired = False
+
+class ServiceBusClientPool:
+    '''
+        Process wide pool of Service Bus connections:
+        - One long-lived ServiceBusClient per connection string, so the AMQP connection is set up once
+        - Senders cached per queue and shared between threads (guarded by a lock, the SDK links are not thread-safe)
+        - Receivers cached per queue, receive mode, sub-queue and thread, so messages are settled on the link that received them
+        - Links idle longer than max_idle_seconds or marked failed are dropped and recreated on next use. A sender still
+          borrowed is closed only when its last borrower returns it, a receiver is idle from its last receive or settle
+        - Use ServiceBusClientPool.get_pool(connection_string) to share one pool per process
+    '''
+    __pools : dict = {}
+    __pools_lock = threading.Lock()
+
+    def __init__(self, connection_string: str, max_idle_seconds: float = 240):
+        self.connection_string = connection_string
+        self.max_idle_seconds = max_idle_seconds
+        self.__client : Optional[ServiceBusClient] = None
+        self.__senders : dict = {}
+        self.__receivers : dict = {}
+        self.__lock = threading.RLock()
+        self.__stats = {
+            "clients_created": 0,
+            "client_reuses": 0,
+            "senders_created": 0,
+            "sender_reuses": 0,
+            "receivers_created": 0,
+            "receiver_reuses": 0,
+            "reconnects": 0
+        }
+
+    @classmethod
+    def get_pool(cls, connection_string: str) -> "ServiceBusClientPool":
+        '''
+            Return the process wide pool for a connection string, created on first use
+        '''
+        with cls.__pools_lock:
+            pool = cls.__pools.get(connection_string)
+            if not pool:
+                pool = cls(connection_string)
+                cls.__pools[connection_string] = pool
+            return pool
+
+    @classmethod
+    def close_all(cls):
+        '''
+            Close every pool of the process, e.g. in the termination step
+        '''
+        with cls.__pools_lock:
+            for pool in cls.__pools.values():
+                pool.close()
+            cls.__pools.clear()
+
+    def get_client(self) -> ServiceBusClient:
+        '''
+            Return the pooled client, connecting on first use or after a reconnect
+        '''
+        with self.__lock:
+            if self.__client:
+                self.__stats["client_reuses"] += 1
+                return self.__client
+            try:
+                self.__client = ServiceBusClient.from_connection_string(conn_str=self.connection_string)
+                self.__stats["clients_created"] += 1
+                return self.__client
+            except Exception as e:
+                error_message = f"Couldn't connect to service bus"
+                raise Exception(error_message)
+
+    def __is_stale(self, pooled_link: _PooledLink) -> bool:
+        return pooled_link.failed or (time.monotonic() - pooled_link.last_used) > self.max_idle_seconds
+
+    @staticmethod
+    def __close_link(pooled_link: _PooledLink):
+        try:
+            pooled_link.link.close()
+        except Exception as e:
+            print(f"Couldn't close service bus link, due to:\n {e}")
+
+    def __get_sender_link(self, queue_name: str) -> _PooledLink:
+        with self.__lock:
+            pooled_sender = self.__senders.get(queue_name)
+            # A sender in use is only idle by its last_used stamp, e.g. during a long streaming send, it is kept
+            if pooled_sender and (not self.__is_stale(pooled_sender) or (pooled_sender.borrowers and not pooled_sender.failed)):
+                self.__stats["sender_reuses"] += 1
+            else:
+                if pooled_sender:
+                    self.__retire(pooled_sender)
+                pooled_sender = _PooledLink(self.get_client().get_queue_sender(queue_name))
+                self.__senders[queue_name] = pooled_sender
+                self.__stats["senders_created"] += 1
+            pooled_sender.borrowers += 1
+            pooled_sender.last_used = time.monotonic()
+            return pooled_sender
+
+    def __retire(self, pooled_link: _PooledLink):
+        '''
+            Close a replaced link now, or when its last borrower returns it
+        '''
+        pooled_link.retired = True
+        if not pooled_link.borrowers:
+            self.__close_link(pooled_link)
+
+    def __return_sender_link(self, pooled_sender: _PooledLink):
+        with self.__lock:
+            pooled_sender.borrowers -= 1
+            pooled_sender.last_used = time.monotonic()
+            if pooled_sender.retired and not pooled_sender.borrowers:
+                self.__close_link(pooled_sender)
+
+    @contextmanager
+    def sender(self, queue_name: str):
+        '''
+            Borrow the cached sender of a queue for the duration of the with block.
+            The sender is marked failed if the block raises, so the next borrower gets a fresh link
+        '''
+        pooled_sender = self.__get_sender_link(queue_name)
+        try:
+            with pooled_sender.lock:
+                try:
+                    yield pooled_sender.link
+                except Exception:
+                    pooled_sender.failed = True
+                    raise
+        finally:
+            self.__return_sender_link(pooled_sender)
+
+    def get_receiver(
+                        self,
+                        queue_name: str,
+                        receive_mode: str = ServiceBusReceiveMode.PEEK_LOCK.value,
+                        sub_queue: Optional[str] = None
+                        ) -> ServiceBusReceiver:
+        '''
+            Return the cached receiver of the calling thread for a queue, receive mode and sub-queue
+        '''
+        key = (queue_name, str(receive_mode), str(sub_queue), threading.get_ident())
+        with self.__lock:
+            pooled_receiver = self.__receivers.get(key)
+            if pooled_receiver and not self.__is_stale(pooled_receiver):
+                self.__stats["receiver_reuses"] += 1
+                return pooled_receiver.link
+            if pooled_receiver:
+                self.__close_link(pooled_receiver)
+            receiver = self.get_client().get_queue_receiver(queue_name, receive_mode=receive_mode, sub_queue=sub_queue)
+            self.__receivers[key] = _PooledLink(receiver)
+            self.__stats["receivers_created"] += 1
+            return receiver
+
+    def touch(self, link):
+        '''
+            Record activity on a pooled link, called after a receive that returned messages and after every settlement,
+            so a receiver holding unsettled messages isn't dropped as idle
+        '''
+        with self.__lock:
+            for pooled_link in list(self.__receivers.values()) + list(self.__senders.values()):
+                if pooled_link.link is link:
+                    pooled_link.last_used = time.monotonic()
+
+    def invalidate_receiver(self, receiver: ServiceBusReceiver):
+        '''
+            Drop a receiver that failed, the next get_receiver call creates a new one
+        '''
+        with self.__lock:
+            for key, pooled_receiver in list(self.__receivers.items()):
+                if pooled_receiver.link is receiver:
+                    self.__close_link(pooled_receiver)
+                    del self.__receivers[key]
+
+    def reconnect(self):
+        '''
+            Close the client and all cached links, the next call opens a new connection
+        '''
+        with self.__lock:
+            self.__close_links()
+            self.__stats["reconnects"] += 1
+
+    def health_check(self) -> dict:
+        '''
+            Drop failed and idle senders so they are recreated before the broker closes them under a caller.
+            Receivers are only dropped when failed, an idle receiver may still hold messages waiting to be settled
+            Return: dict with number of open senders/receivers and number of links dropped
+        '''
+        dropped = 0
+        with self.__lock:
+            for key, pooled_sender in list(self.__senders.items()):
+                if self.__is_stale(pooled_sender) and not pooled_sender.borrowers:
+                    self.__close_link(pooled_sender)
+                    del self.__senders[key]
+                    dropped += 1
+            for key, pooled_receiver in list(self.__receivers.items()):
+                if pooled_receiver.failed:
+                    self.__close_link(pooled_receiver)
+                    del self.__receivers[key]
+                    dropped += 1
+            return {
+                "connected": self.__client is not None,
+                "senders": len(self.__senders),
+                "receivers": len(self.__receivers),
+                "dropped": dropped
+            }
+
+    def stats(self) -> dict:
+        '''
+            Return connection and link reuse counts of this pool
+        '''
+        with self.__lock:
+            return dict(self.__stats)
+
+    def __close_links(self):
+        for links in (self.__senders, self.__receivers):
+            for pooled_link in links.values():
+                self.__close_link(pooled_link)
+            links.clear()
+        if self.__client:
+            try:
+                self.__client.close()
+            except Exception as e:
+                print(f"Couldn't close service bus client, due to:\n {e}")
+            self.__client = None
+
+    def close(self):
+        '''
+            Close the client and all cached links
+        '''
+        with self.__lock:
+            self.__close_links()
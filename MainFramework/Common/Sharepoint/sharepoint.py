@@ -1,27 +1,87 @@
 from office365.sharepoint.client_context import ClientContext
+from office365.runtime.http.request_options import RequestOptions
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import PurePath
+from typing import Callable, Iterator, List, Optional
+from urllib.parse import quote
+import json
 import os
+import queue
+import requests
+import threading
+import time
+import uuid
+from MainFramework.Common.metrics import Metrics
+from MainFramework.Common.rate_limiter import RateLimiter
+from MainFramework.Common.retry import RetryPolicy
 
 load_dotenv()
 SITE_URL = os.getenv("SITE_URL")
 SITE_NAME = os.getenv("SITE_NAME")
+CHUNK_SIZE = 10 * 1024 * 1024
+MANIFEST_NAME = ".sharepoint-manifest.json"
+LIST_FIELDS = ["Name", "ServerRelativeUrl", "Length", "TimeLastModified", "ETag"]
 DOC_NAME = os.getenv("DOC_NAME")
 CLIENT_ID = os.getenv("CLIENT_ID")
 CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 
 class Sharepoint:
+    '''
+        Sharepoint file actions
+        - The authenticated ClientContext is created once per thread and reused by every call on that thread
+        - max_workers: default number of parallel downloads in download_files
+        - The download thread pool lives as long as the instance, so its threads keep their authenticated ClientContext
+          across bulk calls. Call close() (or use the instance as a context manager) to shut it down
+    '''
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.__local = threading.local()
+        self.__executors : dict = {}
+        self.__executors_lock = threading.Lock()
+
+    def __get_executor(self, max_workers: int) -> ThreadPoolExecutor:
+        '''
+            Return the download pool with max_workers threads, created on first use and kept until close()
+        '''
+        with self.__executors_lock:
+            executor = self.__executors.get(max_workers)
+            if executor is None:
+                executor = self.__executors[max_workers] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sharepoint-download")
+            return executor
+
+    def close(self):
+        '''
+            Shut down the download thread pools
+        '''
+        with self.__executors_lock:
+            executors, self.__executors = list(self.__executors.values()), {}
+        for executor in executors:
+            executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
     def __auth(self):
         '''
-            Authenticate Sharepoint App-only with client id and client secret
+            Authenticate Sharepoint App-only with client id and client secret.
+            ClientContext queues pending queries and is not thread-safe, so each thread keeps its own
         '''
+        ctx = getattr(self.__local, "ctx", None)
+        if ctx:
+            return ctx
         try:
             ctx = ClientContext(SITE_URL).with_client_credentials(CLIENT_ID, CLIENT_SECRET)
+            self.__local.ctx = ctx
             print(f"Access to {SITE_URL} has been authenticated!")
             return ctx
         except Exception as e:
             error_message = f"Access to {SITE_URL} was decliend due to:\n {e}"
-            raise Exception(error_message)
+            raise Exception(error_message) from e
     
     def __get_file_list(self, folder_relative_url: str):
         '''
@@ -37,55 +97,351 @@ class Sharepoint:
             return folder.files
         except Exception as e:
             error_message = f"Couldn't get file list from folder {folder_relative_url} due to:\n {e}"
-            raise Exception(error_message)
+            raise Exception(error_message) from e
         
+    @staticmethod
+    def __odata_datetime(value: datetime) -> str:
+        if value.tzinfo:
+            value = value.astimezone(timezone.utc)
+        return f"datetime'{value.strftime('%Y-%m-%dT%H:%M:%SZ')}'"
+
+    @classmethod
+    def __build_filter(
+                        cls,
+                        name_contains: Optional[str],
+                        extensions: Optional[List[str]],
+                        modified_after: Optional[datetime],
+                        modified_before: Optional[datetime]
+                        ) -> Optional[str]:
+        '''
+            Build the OData $filter pushed to Sharepoint. Sharepoint has no endswith, extensions are narrowed
+            with substringof on the server and checked exactly on the client
+        '''
+        conditions = []
+        if name_contains:
+            conditions.append(f"substringof('{name_contains.replace(chr(39), chr(39) * 2)}', Name)")
+        if extensions:
+            conditions.append("(" + " or ".join(f"substringof('{extension.replace(chr(39), chr(39) * 2)}', Name)" for extension in extensions) + ")")
+        if modified_after:
+            conditions.append(f"TimeLastModified ge {cls.__odata_datetime(modified_after)}")
+        if modified_before:
+            conditions.append(f"TimeLastModified lt {cls.__odata_datetime(modified_before)}")
+        return " and ".join(conditions) if conditions else None
+
+    @staticmethod
+    def __iter_pages(collection, page_size: int):
+        '''
+            Iterate a paged collection, the next page is requested while iterating so its rate limiter token is taken first
+        '''
+        items = iter(collection)
+        count = 0
+        while True:
+            if count and count % page_size == 0:
+                RateLimiter.get("sharepoint").acquire()
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            count += 1
+            yield item
+
+    def __list_folder(self, server_relative_url: str, fields: List[str], filter_query: Optional[str], page_size: int):
+        '''
+            Yield the files of one folder page by page, then the server relative urls of its subfolders
+        '''
+        ctx = self.__auth()
+        folder = ctx.web.get_folder_by_server_relative_url(server_relative_url)
+        files = folder.files.get().select(fields)
+        if filter_query:
+            files = files.filter(filter_query)
+        files = files.paged(page_size)
+        RateLimiter.get("sharepoint").acquire()
+        ctx.execute_query()
+        for file in self.__iter_pages(files, page_size):
+            yield "file", dict(file.properties)
+
+        folders = folder.folders.get().select(["Name", "ServerRelativeUrl"]).paged(page_size)
+        RateLimiter.get("sharepoint").acquire()
+        ctx.execute_query()
+        for sub_folder in self.__iter_pages(folders, page_size):
+            if sub_folder.name != "Forms":
+                yield "folder", sub_folder.serverRelativeUrl
+
+    def iter_files(
+                    self,
+                    folder_relative_url: str,
+                    recursive: bool = True,
+                    name_contains: Optional[str] = None,
+                    extensions: Optional[List[str]] = None,
+                    modified_after: Optional[datetime] = None,
+                    modified_before: Optional[datetime] = None,
+                    select: Optional[List[str]] = None,
+                    page_size: int = 500,
+                    max_workers: Optional[int] = None
+                    ) -> Iterator[dict]:
+        '''
+            Yield the files of a Sharepoint folder tree as they are listed, subfolders are walked concurrently
+                - folder_relative_url: url of target folder (without DOC_NAME), e.g. Data/2024
+                - recursive: walk subfolders too
+                - name_contains, extensions, modified_after, modified_before: filters pushed to Sharepoint as $filter
+                - select: file properties to retrieve ($select), Name and ServerRelativeUrl are always included
+                - page_size: files requested per round trip
+                - max_workers: number of folders listed at the same time, self.max_workers if not provided
+            Return: generator of dicts of the selected file properties
+        '''
+        fields = list(dict.fromkeys(["Name", "ServerRelativeUrl"] + (select if select else LIST_FIELDS)))
+        filter_query = self.__build_filter(name_contains, extensions, modified_after, modified_before)
+        suffixes = tuple(extension.lower() for extension in extensions) if extensions else None
+        results : queue.Queue = queue.Queue(maxsize=page_size * 2)
+        stop = threading.Event()
+        lock = threading.Lock()
+        pending = [0]
+        end = object()
+        executor = ThreadPoolExecutor(max_workers=max_workers if max_workers else self.max_workers, thread_name_prefix="sharepoint-list")
+
+        def _put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    results.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def _submit(server_relative_url: str):
+            with lock:
+                pending[0] += 1
+            executor.submit(_walk, server_relative_url)
+
+        def _walk(server_relative_url: str):
+            try:
+                for kind, value in self.__list_folder(server_relative_url, fields, filter_query, page_size):
+                    if stop.is_set():
+                        return
+                    if kind == "folder":
+                        if recursive:
+                            _submit(value)
+                    elif not suffixes or str(value.get("Name", "")).lower().endswith(suffixes):
+                        if not _put(value):
+                            return
+            except Exception as e:
+                _put(Exception(f"Couldn't list folder {server_relative_url} due to:\n {e}"))
+            finally:
+                # Subfolders are submitted before this folder is counted as done, so pending only reaches 0 at the end
+                with lock:
+                    pending[0] -= 1
+                    finished = pending[0] == 0
+                if finished:
+                    _put(end)
+
+        try:
+            _submit(f"{DOC_NAME}/{folder_relative_url}")
+            while True:
+                item = results.get()
+                if item is end:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
     def __save_file(self, local_folder_dest: str, local_file_name: str, file_object):
         '''
-            Save file from Sharepoint by writing file oject to local file in binary mode
+            Save file from Sharepoint by downloading file oject to local file in binary mode.
+            The file is written to <name>.part and moved into place once complete, so a failed download never replaces a good copy
         '''
+        file_dir_path = PurePath(local_folder_dest, local_file_name)
+        part_path = f"{file_dir_path}.part"
         try:
-            file_dir_path = PurePath(local_folder_dest, local_file_name)
-            with open(file_dir_path, "wb") as f:
-                f.write(file_object)
+            with open(part_path, "wb") as f:
+                file_object.download(f).execute_query()
+            os.replace(part_path, file_dir_path)
+            return str(file_dir_path)
         except Exception as e:
+            self.__remove_part(part_path)
             error_message = f"Couldn't write file_object to {file_dir_path}, due to:\n {e}"
-            raise Exception(error_message)
+            raise Exception(error_message) from e
+
+    def __download(self, server_relative_url: str, local_folder_dest: str) -> dict:
+        '''
+            Download one file by its server relative url and report the outcome instead of raising
+        '''
+        result = {"file": server_relative_url, "path": None, "success": True, "error": None, "exception": None, "elapsed": 0.0}
+        start = time.perf_counter()
+        try:
+            ctx = self.__auth()
+            file_object = ctx.web.get_file_by_server_relative_path(server_relative_url)
+            result["path"] = self.__save_file(local_folder_dest, PurePath(server_relative_url).name, file_object)
+        except Exception as e:
+            result["success"] = False
+            result["error"] = str(e)
+            # Kept so callers can raise from it and the retry policy can classify the original error
+            result["exception"] = e
+        result["elapsed"] = time.perf_counter() - start
+        return result
 
+    @Metrics.integration("sharepoint")
+    @RetryPolicy.integration("sharepoint")
     def download_file(self, file_relative_url: str, local_folder_dest: str):
         '''
             Download file from Sharepoint
                 - file_relative_url: relative url to target file. 
                 - E.g.: file_relative_url = "Data/2024/2024.xlsx", SITE_NAME = "Contoso", DOC_NAME = "Shared Documents"
                 => Full url: /sites/Contoso/Shared Documents/Data/2024.xlsx
+            Return: local path of the downloaded file
         '''
-        try:
-            ctx = self.__auth()
-            file_url = f"/sites/{SITE_NAME}/{DOC_NAME}/{file_relative_url}"
-            file_object = ctx.web.get_file_by_server_relative_path(file_relative_url).execute_query()
-            print(f"Retrieved file from {SITE_URL}/{file_url}, ready for download")
-        except Exception as e:
-            error_message = f"Couldn't retrieve file object from {SITE_URL}/{file_url}, due to:\n {e}"
-            raise Exception(error_message)
-        
-        self.__save_file(local_folder_dest, file_object.name, file_object)
+        file_url = f"/sites/{SITE_NAME}/{DOC_NAME}/{file_relative_url}"
+        result = self.__download(file_url, local_folder_dest)
+        if not result["success"]:
+            error_message = f"Couldn't download file from {SITE_URL}/{file_url}, due to:\n {result['error']}"
+            raise Exception(error_message) from result["exception"]
+        print(f"Downloaded file from {SITE_URL}/{file_url} to {result['path']}")
+        return result["path"]
     
-    def download_files(self, local_folder_dest: str, file_relative_urls: list):
-        try:
-            for file_relative_url in file_relative_urls:
-                self.download_file(file_relative_url, local_folder_dest)
-        except:
-            print("Couldn't download multiple files")
+    def __download_many(self, local_folder_dest: str, server_relative_urls: List[str], max_workers: Optional[int] = None) -> List[dict]:
+        executor = self.__get_executor(max_workers if max_workers else self.max_workers)
+        def _download(server_relative_url: str) -> dict:
+            # The guarded caller took one token for the whole call, every download is a request of its own
+            RateLimiter.get("sharepoint").acquire()
+            return self.__download(server_relative_url, local_folder_dest)
+
+        results = list(executor.map(_download, server_relative_urls))
+        failed = [result for result in results if not result["success"]]
+        print(f"Downloaded {len(results) - len(failed)}/{len(results)} file(s) to {local_folder_dest}")
+        for result in failed:
+            print(f"Couldn't download {result['file']}, due to:\n {result['error']}")
+        return results
+
+    @Metrics.integration("sharepoint")
+    @RetryPolicy.integration("sharepoint")
+    def download_files(self, local_folder_dest: str, file_relative_urls: list, max_workers: Optional[int] = None) -> List[dict]:
+        '''
+            Download many files from Sharepoint in parallel
+                - file_relative_urls: relative urls to target files, see download_file
+                - max_workers: number of parallel downloads, self.max_workers if not provided
+            Return: list of per-file results {file, path, success, error, exception, elapsed}
+        '''
+        file_urls = [f"/sites/{SITE_NAME}/{DOC_NAME}/{file_relative_url}" for file_relative_url in file_relative_urls]
+        return self.__download_many(local_folder_dest, file_urls, max_workers)
     
-    def download_all_files_in_subfolder(self, local_folder_dest: str, folder_relative_url: str):
+    @Metrics.integration("sharepoint")
+    @RetryPolicy.integration("sharepoint")
+    def download_all_files_in_subfolder(self, local_folder_dest: str, folder_relative_url: str, max_workers: Optional[int] = None) -> List[dict]:
+        '''
+            Download every file of a Sharepoint folder in parallel
+            Return: list of per-file results {file, path, success, error, exception, elapsed}
+        '''
         try:
             file_list = self.__get_file_list(folder_relative_url)
-            for file in file_list:
-                self.__save_file(local_folder_dest, file.name, file)
+            server_relative_urls = [file.serverRelativeUrl for file in file_list]
         except Exception as e:
             error_message = f"Couldn't download all files from {folder_relative_url} due to:\n {e}"
-            raise Exception(error_message)
+            raise Exception(error_message) from e
+        return self.__download_many(local_folder_dest, server_relative_urls, max_workers)
+
+    @staticmethod
+    def __load_manifest(manifest_path: str) -> dict:
+        try:
+            with open(manifest_path, "r") as f:
+                return json.load(f).get("files", {})
+        except (OSError, ValueError):
+            return {}
 
+    @staticmethod
+    def __write_manifest(manifest_path: str, folder_relative_url: str, files: dict):
+        '''
+            Write the manifest to a temporary file first, so an interrupted run never leaves a half written manifest
+        '''
+        temp_path = manifest_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"folder": folder_relative_url, "files": files}, f, indent=2)
+        os.replace(temp_path, manifest_path)
+
+    @Metrics.integration("sharepoint")
+    @RetryPolicy.integration("sharepoint")
+    def sync_folder(
+                    self,
+                    local_folder_dest: str,
+                    folder_relative_url: str,
+                    delete_removed: bool = False,
+                    max_workers: Optional[int] = None
+                    ) -> dict:
+        '''
+            Download only the files of a Sharepoint folder that are new or changed since the last sync.
+            ETag, size and modified time of every synced file are kept in a manifest in the local folder
+                - folder_relative_url: url of target folder (without DOC_NAME), e.g. Data/2024
+                - delete_removed: delete local files that were synced before and no longer exist on Sharepoint.
+                  Local files that are not in the manifest are never deleted
+                - max_workers: number of parallel downloads, self.max_workers if not provided
+            Return: dict with downloaded/deleted/failed file names and the number of unchanged files
+        '''
+        manifest_path = os.path.join(local_folder_dest, MANIFEST_NAME)
+        manifest = self.__load_manifest(manifest_path)
+        try:
+            file_list = self.__get_file_list(folder_relative_url)
+        except Exception as e:
+            error_message = f"Couldn't sync folder {folder_relative_url} due to:\n {e}"
+            raise Exception(error_message) from e
+
+        remote_files = {}
+        for file in file_list:
+            remote_files[file.name] = {
+                "etag": file.properties.get("ETag"),
+                "size": int(file.length or 0),
+                "modified": str(file.time_last_modified),
+                "url": file.serverRelativeUrl
+            }
+
+        changed = []
+        for name, remote_file in remote_files.items():
+            entry = manifest.get(name)
+            unchanged = (
+                entry is not None
+                and entry.get("etag") == remote_file["etag"]
+                and entry.get("size") == remote_file["size"]
+                and entry.get("modified") == remote_file["modified"]
+                and os.path.exists(os.path.join(local_folder_dest, name)))
+            if not unchanged:
+                changed.append(name)
+
+        summary = {"downloaded": [], "unchanged": len(remote_files) - len(changed), "deleted": [], "failed": []}
+        if changed:
+            results = self.__download_many(local_folder_dest, [remote_files[name]["url"] for name in changed], max_workers)
+            for name, result in zip(changed, results):
+                if result["success"]:
+                    manifest[name] = {key: value for key, value in remote_files[name].items() if key != "url"}
+                    summary["downloaded"].append(name)
+                else:
+                    manifest.pop(name, None)
+                    summary["failed"].append(name)
+
+        if delete_removed:
+            for name in [name for name in manifest if name not in remote_files]:
+                try:
+                    local_path = os.path.join(local_folder_dest, name)
+                    if os.path.exists(local_path):
+                        os.remove(local_path)
+                    del manifest[name]
+                    summary["deleted"].append(name)
+                except OSError as e:
+                    print(f"Couldn't delete {name} from {local_folder_dest}, due to:\n {e}")
+
+        self.__write_manifest(manifest_path, folder_relative_url, manifest)
+        print(f"Synced {folder_relative_url}: {len(summary['downloaded'])} downloaded, {summary['unchanged']} unchanged, "
+              f"{len(summary['deleted'])} deleted, {len(summary['failed'])} failed")
+        return summary
+
+    @Metrics.integration("sharepoint")
+    @RetryPolicy.integration("sharepoint")
     def upload_file(self, relative_url, local_file_path):
+        return self.__upload_file(relative_url, local_file_path)
+
+    def __upload_file(self, relative_url, local_file_path):
+        '''
+            upload_file without the integration guard, for calls made inside a guarded method
+        '''
         try:
             ctx = self.__auth()
             target_url = f"sites/{SITE_NAME}/{DOC_NAME}/{relative_url}"
@@ -96,5 +452,203 @@ class Sharepoint:
             print(f"Upload {local_file_path} to {target_url} successfully")
         except Exception as e:
             error_message = f"Upload {local_file_path} to {relative_url} unsuccessfully, due to:\n {e}"
-            raise Exception(error_message)
-    
\ No newline at end of file
+            raise Exception(error_message) from e
+
+    @Metrics.integration("sharepoint")
+    @RetryPolicy.integration("sharepoint")
+    def download_file_chunked(
+                                self,
+                                file_relative_url: str,
+                                local_folder_dest: str,
+                                chunk_size: int = CHUNK_SIZE,
+                                progress_callback: Optional[Callable[[int, int], None]] = None,
+                                resume: bool = True
+                                ) -> str:
+        '''
+            Stream a large file from Sharepoint to disk in chunks, only one chunk is held in memory
+                - file_relative_url: relative url to target file, see download_file
+                - chunk_size: bytes read per chunk
+                - progress_callback: called with (bytes downloaded, total bytes) after each chunk
+                - resume: continue an interrupted download from its .part file with an HTTP Range request.
+                  The ETag of the file is kept next to the .part file and sent as If-Range, a file changed since
+                  the interrupted download is downloaded again from the start
+            Return: local path of the downloaded file
+        '''
+        file_url = f"/sites/{SITE_NAME}/{DOC_NAME}/{file_relative_url}"
+        try:
+            ctx = self.__auth()
+            file_object = ctx.web.get_file_by_server_relative_path(file_url).get().execute_query()
+            total_size = int(file_object.length)
+            etag = file_object.properties.get("ETag")
+            file_dir_path = str(PurePath(local_folder_dest, file_object.name))
+            part_path = file_dir_path + ".part"
+            etag_path = part_path + ".etag"
+            offset = os.path.getsize(part_path) if resume and os.path.exists(part_path) else 0
+            if offset and (not etag or self.__read_part_etag(etag_path) != etag or offset > total_size):
+                # Without a matching ETag the .part file may belong to an older version of the file
+                offset = 0
+
+            if offset < total_size or total_size == 0:
+                server_relative_path = quote(file_url.replace("'", "''"))
+                request = RequestOptions(f"{ctx.service_root_url()}/web/GetFileByServerRelativePath(decodedurl='{server_relative_path}')/$value")
+                ctx.authentication_context.authenticate_request(request)
+                headers = dict(request.headers)
+                if offset:
+                    headers["Range"] = f"bytes={offset}-"
+                    headers["If-Range"] = etag
+                elif etag:
+                    with open(etag_path, "w") as f:
+                        f.write(etag)
+
+                with requests.get(request.url, headers=headers, stream=True, timeout=300) as response:
+                    if response.status_code == 416:
+                        # The range starts past the end of the file, the .part file doesn't match it: start over next time
+                        self.__remove_part(part_path, etag_path)
+                    response.raise_for_status()
+                    if offset and response.status_code != 206:
+                        # The server ignored the Range header or the file changed (If-Range), it sent the whole file
+                        offset = 0
+                        if etag:
+                            with open(etag_path, "w") as f:
+                                f.write(etag)
+                    with open(part_path, "ab" if offset else "wb") as f:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            f.write(chunk)
+                            offset += len(chunk)
+                            if progress_callback:
+                                progress_callback(offset, total_size)
+            elif progress_callback:
+                # The .part file is complete, only the rename was interrupted
+                progress_callback(offset, total_size)
+
+            if offset != total_size:
+                raise Exception(f"Downloaded {offset} of {total_size} bytes, call again to resume")
+            os.replace(part_path, file_dir_path)
+            self.__remove_part(etag_path)
+            print(f"Downloaded file from {SITE_URL}/{file_url} to {file_dir_path}")
+            return file_dir_path
+        except Exception as e:
+            error_message = f"Couldn't download file from {SITE_URL}/{file_url}, due to:\n {e}"
+            raise Exception(error_message) from e
+
+    @staticmethod
+    def __read_part_etag(etag_path: str) -> Optional[str]:
+        try:
+            with open(etag_path, "r") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    @staticmethod
+    def __remove_part(*paths: str):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def __load_upload_state(state_path: str, target_file_url: str, local_file_path: str) -> Optional[dict]:
+        '''
+            Return the saved upload session if it belongs to the same target and unchanged local file
+        '''
+        try:
+            with open(state_path, "r") as f:
+                state = json.load(f)
+            stat = os.stat(local_file_path)
+            if state["target"] == target_file_url and state["size"] == stat.st_size and state["mtime"] == stat.st_mtime:
+                return state
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    @staticmethod
+    def __save_upload_state(state_path: str, state: dict):
+        with open(state_path, "w") as f:
+            json.dump(state, f)
+
+    def __upload_chunks(
+                        self,
+                        ctx,
+                        target_file_url: str,
+                        local_file_path: str,
+                        state: dict,
+                        state_path: str,
+                        chunk_size: int,
+                        progress_callback: Optional[Callable[[int, int], None]]
+                        ):
+        '''
+            Send the local file from state["offset"] on, saving the offset after every chunk so the upload can be resumed
+        '''
+        target_file = ctx.web.get_file_by_server_relative_path(target_file_url)
+        total_size = state["size"]
+        offset = state["offset"]
+        with open(local_file_path, "rb") as f:
+            f.seek(offset)
+            while offset < total_size:
+                chunk = f.read(chunk_size)
+                if offset == 0:
+                    target_file.start_upload(state["upload_id"], chunk).execute_query()
+                elif offset + len(chunk) >= total_size:
+                    target_file.finish_upload(state["upload_id"], offset, chunk).execute_query()
+                else:
+                    target_file.continue_upload(state["upload_id"], offset, chunk).execute_query()
+                offset += len(chunk)
+                state["offset"] = offset
+                self.__save_upload_state(state_path, state)
+                if progress_callback:
+                    progress_callback(offset, total_size)
+
+    @Metrics.integration("sharepoint")
+    @RetryPolicy.integration("sharepoint")
+    def upload_file_chunked(
+                            self,
+                            relative_url: str,
+                            local_file_path: str,
+                            chunk_size: int = CHUNK_SIZE,
+                            progress_callback: Optional[Callable[[int, int], None]] = None,
+                            resume: bool = True
+                            ) -> str:
+        '''
+            Upload a large file to Sharepoint with an upload session (StartUpload/ContinueUpload/FinishUpload)
+                - relative_url: relative url of the target folder, see upload_file
+                - chunk_size: bytes sent per request, only one chunk is held in memory
+                - progress_callback: called with (bytes uploaded, total bytes) after each chunk
+                - resume: continue an interrupted upload from the session saved next to the local file (<file>.upload.json)
+            Return: server relative url of the uploaded file
+        '''
+        target_url = f"sites/{SITE_NAME}/{DOC_NAME}/{relative_url}"
+        file_name = os.path.basename(local_file_path)
+        target_file_url = f"/{target_url.rstrip('/')}/{file_name}"
+        state_path = local_file_path + ".upload.json"
+        try:
+            total_size = os.path.getsize(local_file_path)
+            if total_size <= chunk_size:
+                self.__upload_file(relative_url, local_file_path)
+                if progress_callback:
+                    progress_callback(total_size, total_size)
+                return target_file_url
+
+            ctx = self.__auth()
+            state = self.__load_upload_state(state_path, target_file_url, local_file_path) if resume else None
+            if state:
+                print(f"Resuming upload of {local_file_path} at {state['offset']}/{total_size} bytes")
+                try:
+                    self.__upload_chunks(ctx, target_file_url, local_file_path, state, state_path, chunk_size, progress_callback)
+                except Exception as e:
+                    # The upload session may have expired on the server, start a new one
+                    print(f"Couldn't resume upload of {local_file_path}, restarting. Due to:\n {e}")
+                    state = None
+            if not state:
+                folder = ctx.web.get_folder_by_server_relative_url(target_url)
+                folder.files.add(file_name, b"", overwrite=True).execute_query()
+                stat = os.stat(local_file_path)
+                state = {"target": target_file_url, "upload_id": str(uuid.uuid4()), "offset": 0, "size": stat.st_size, "mtime": stat.st_mtime}
+                self.__upload_chunks(ctx, target_file_url, local_file_path, state, state_path, chunk_size, progress_callback)
+
+            os.remove(state_path)
+            print(f"Upload {local_file_path} to {target_url} successfully")
+            return target_file_url
+        except Exception as e:
+            error_message = f"Upload {local_file_path} to {relative_url} unsuccessfully, due to:\n {e}"
+            raise Exception(error_message) from e
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+class TTLCache:
+    """
+        Thread-safe in-process cache with time-to-live and LRU eviction:
+            - max_size: max number of entries, the least recently used entry is evicted first
+            - ttl: seconds an entry stays valid after it is set
+            - hits/misses/evictions are counted and returned by stats()
+    """
+    __MISSING = object()
+
+    def __init__(self, max_size: int = 256, ttl: float = 300) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.__entries : OrderedDict = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+            Return the cached value of a key, default if it is missing or expired
+            -key: cache key
+            -default: value returned on a miss
+            Return: cached value or default
+        """
+        with self.__lock:
+            entry = self.__entries.get(key, self.__MISSING)
+            if entry is self.__MISSING:
+                self.__stats["misses"] += 1
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.__entries[key]
+                self.__stats["expirations"] += 1
+                self.__stats["misses"] += 1
+                return default
+            self.__entries.move_to_end(key)
+            self.__stats["hits"] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+            Cache a value
+            -key: cache key
+            -value: value to cache
+            -ttl: seconds the entry stays valid, the cache ttl if not provided
+            Return: None
+        """
+        with self.__lock:
+            self.__entries[key] = (value, time.monotonic() + (ttl if ttl is not None else self.ttl))
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+                self.__stats["evictions"] += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+            Remove a key from the cache
+            Return: None
+        """
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+            Remove every key the predicate returns True for
+            -predicate: callable taking a key
+            Return: number of removed keys
+        """
+        with self.__lock:
+            keys = [key for key in self.__entries if predicate(key)]
+            for key in keys:
+                del self.__entries[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        """
+            Remove every entry
+            Return: None
+        """
+        with self.__lock:
+            self.__entries.clear()
+
+    def stats(self) -> dict:
+        """
+            Return hit/miss/eviction counts, current size and hit ratio
+        """
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats["size"] = len(self.__entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def __len__(self) -> int:
+        return len(self.__entries)
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+class IdempotencyStore:
+    """
+        Remember which message ids already finished processing, so redelivered messages are not processed twice:
+            - A bounded in-memory LRU answers repeated lookups without touching the disk
+            - A SQLite index (WAL mode) keeps processed ids across restarts, entries older than retention_days are purged
+            - db_path: SQLite file, defaults to IDEMPOTENCY_STORE_PATH or Data/processed_messages.db under the working directory
+    """
+    def __init__(self, db_path: Optional[str] = None, memory_size: int = 10000, retention_days: float = 14) -> None:
+        if not db_path:
+            db_path = os.getenv("IDEMPOTENCY_STORE_PATH") or os.path.join(os.getcwd(), "Data", "processed_messages.db")
+        self.db_path = db_path
+        self.memory_size = memory_size
+        self.retention_seconds = retention_days * 24 * 3600
+        self.__memory : OrderedDict = OrderedDict()
+        self.__lock = threading.Lock()
+        try:
+            self.__connection = sqlite3.connect(db_path, check_same_thread=False)
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("PRAGMA synchronous=NORMAL")
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS processed_messages (message_id TEXT PRIMARY KEY, processed_at REAL NOT NULL) WITHOUT ROWID")
+            self.__connection.commit()
+        except Exception as e:
+            raise Exception(f"Couldn't open idempotency store {db_path}, due to:\n {e}")
+        self.purge()
+
+    def __remember(self, message_id: str) -> None:
+        self.__memory[message_id] = True
+        self.__memory.move_to_end(message_id)
+        if len(self.__memory) > self.memory_size:
+            self.__memory.popitem(last=False)
+
+    def is_processed(self, message_id: str) -> bool:
+        """
+            Check whether a message id already finished processing
+            -message_id: id of the message
+            Return: bool
+        """
+        if not message_id:
+            return False
+        with self.__lock:
+            if message_id in self.__memory:
+                self.__memory.move_to_end(message_id)
+                return True
+            row = self.__connection.execute(
+                "SELECT 1 FROM processed_messages WHERE message_id = ?", (message_id,)).fetchone()
+            if row:
+                self.__remember(message_id)
+            return row is not None
+
+    def mark_processed(self, message_id: str) -> None:
+        """
+            Record that a message id finished processing
+            -message_id: id of the message
+            Return: None
+        """
+        if not message_id:
+            return
+        with self.__lock:
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO processed_messages VALUES (?, ?)", (message_id, time.time()))
+            self.__connection.commit()
+            self.__remember(message_id)
+
+    def purge(self) -> int:
+        """
+            Delete ids older than the retention period
+            Return: number of deleted ids
+        """
+        with self.__lock:
+            cursor = self.__connection.execute(
+                "DELETE FROM processed_messages WHERE processed_at < ?", (time.time() - self.retention_seconds,))
+            self.__connection.commit()
+            return cursor.rowcount
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__connection.close()
@@ -0,0 +1,118 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FRAMEWORK_MODULES = [
+    "MainFramework.Common.logger",
+    "MainFramework.Exception.exception",
+    "MainFramework.Initialization.initializator",
+    "MainFramework.Transaction.transaction",
+    "MainFramework.Business.business",
+    "MainFramework.Dispatcher.dispatcher",
+    "MainFramework.Termination.terminate",
+]
+IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+class ImportBenchmark:
+    '''
+        Measure the cold import time of the framework modules and of each integration in the registry:
+        - Every target is imported in a fresh interpreter with -X importtime, so nothing is shared between measurements
+        - Integrations are loaded through Integrations.get, the same path the robots use
+        - Modules already imported by a bare interpreter are left out, the heaviest root packages of each target are listed
+    '''
+    def __init__(self, python: str = sys.executable, top: int = 5, repeat: int = 1):
+        self.python = python
+        self.top = top
+        self.repeat = repeat
+        self.__startup : Optional[set] = None
+
+    def __import_time(self, statement: str):
+        completed = subprocess.run(
+            [self.python, "-X", "importtime", "-c", statement],
+            cwd = ROOT_DIR,
+            capture_output = True,
+            text = True)
+        if completed.returncode != 0:
+            stderr = completed.stderr.strip()
+            raise Exception(stderr.splitlines()[-1] if stderr else f"exit code {completed.returncode}")
+        lines = []
+        for line in completed.stderr.splitlines():
+            match = IMPORT_TIME_LINE.match(line)
+            if match:
+                lines.append((int(match.group(1)), int(match.group(2)), len(match.group(3)), match.group(4)))
+        return lines
+
+    def __startup_modules(self) -> set:
+        if self.__startup is None:
+            self.__startup = {name for _, _, _, name in self.__import_time("pass")}
+        return self.__startup
+
+    def __measure(self, statement: str) -> dict:
+        samples = []
+        packages : dict = {}
+        try:
+            startup = self.__startup_modules()
+            for _ in range(self.repeat):
+                total = 0
+                packages = {}
+                for self_time, cumulative, indent, name in self.__import_time(statement):
+                    if name in startup:
+                        continue
+                    # Top level imports (one space of indent) add up to the total, self times are grouped by root package
+                    if indent == 1:
+                        total += cumulative
+                    root = name.split(".")[0]
+                    packages[root] = packages.get(root, 0) + self_time
+                samples.append(total)
+        except Exception as e:
+            return {"seconds": None, "heaviest": [], "error": str(e)}
+        heaviest = sorted(packages.items(), key=lambda package: package[1], reverse=True)[:self.top]
+        return {
+            "seconds": min(samples) / 1e6,
+            "heaviest": [(name, microseconds / 1e6) for name, microseconds in heaviest],
+            "error": None}
+
+    def run(self, modules: Optional[List[str]] = None, integrations: Optional[List[str]] = None) -> List[dict]:
+        '''
+            Measure modules (dotted names) and integrations (registry names)
+            Return: list of dicts with target, seconds, heaviest (package, seconds) pairs and error, slowest first
+        '''
+        from MainFramework.Common.integrations import Integrations
+        modules = FRAMEWORK_MODULES if modules is None else modules
+        integrations = Integrations.available() if integrations is None else integrations
+        results = []
+        for module in modules:
+            results.append({"target": module, **self.__measure(f"import {module}")})
+        for name in integrations:
+            statement = f"from MainFramework.Common.integrations import Integrations; Integrations.get({name!r})"
+            results.append({"target": f"integration:{name}", **self.__measure(statement)})
+        return sorted(results, key=lambda result: result["seconds"] or 0.0, reverse=True)
+
+    @staticmethod
+    def report(results: List[dict]) -> str:
+        '''
+            Format results as a text table
+        '''
+        lines = [f"{'target':<50} {'import (s)':>10}  heaviest imports"]
+        for result in results:
+            if result["error"]:
+                lines.append(f"{result['target']:<50} {'failed':>10}  {result['error']}")
+                continue
+            heaviest = ", ".join(f"{name} {seconds:.3f}" for name, seconds in result["heaviest"])
+            lines.append(f"{result['target']:<50} {result['seconds']:>10.3f}  {heaviest}")
+        return "\n".join(lines)
+
+if __name__ == "__main__":
+    sys.path.insert(0, ROOT_DIR)
+    parser = argparse.ArgumentParser(description="Report the cold import time of framework modules and integrations")
+    parser.add_argument("--module", action="append", dest="modules", help="Dotted module to measure, repeatable, defaults to the framework modules")
+    parser.add_argument("--integration", action="append", dest="integrations", help="Registered integration to measure, repeatable, defaults to all")
+    parser.add_argument("--top", type=int, default=5, help="Number of heaviest imports listed per target")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per target, the fastest run is reported")
+    args = parser.parse_args()
+    benchmark = ImportBenchmark(top = args.top, repeat = args.repeat)
+    print(ImportBenchmark.report(benchmark.run(modules = args.modules, integrations = args.integrations)))
@@ -0,0 +1,97 @@
+import importlib
+import importlib.util
+import os
+import sys
+import threading
+from typing import Dict, List, Tuple
+
+COMMON_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class Integrations:
+    '''
+        Lazy registry of the integration clients, the SDK behind an integration is only imported on first use:
+        - Each entry is a module (dotted name, or a file path under MainFramework/Common for the hyphenated files) and a class name
+        - Loaded modules are cached in sys.modules, so later lookups cost a dict access
+        - Integrations.get("sharepoint") returns the class, Integrations.create("sharepoint", ...) an instance
+    '''
+    __registry : Dict[str, Tuple[str, str]] = {
+        "service_bus": ("Azure/service-bus.py", "AzureServiceBus"),
+        "async_service_bus": ("MainFramework.Common.Azure.async_service_bus", "AsyncAzureServiceBus"),
+        "dead_letter_replay": ("MainFramework.Common.Azure.dead_letter_replay", "DeadLetterReplayer"),
+        "key_vault": ("Azure/key-vault.py", "AzureKeyVault"),
+        "sharepoint": ("MainFramework.Common.Sharepoint.sharepoint", "Sharepoint"),
+        "outlook": ("MainFramework.Common.outlook", "Outlook"),
+    }
+    __lock = threading.RLock()
+
+    def __init__(self) -> None:
+        pass
+
+    @staticmethod
+    def __module_name(module: str) -> str:
+        if not module.endswith(".py"):
+            return module
+        return "MainFramework.Common." + module[:-3].replace("/", ".").replace("-", "_")
+
+    @classmethod
+    def __import(cls, module: str):
+        module_name = cls.__module_name(module)
+        if module_name in sys.modules:
+            return sys.modules[module_name]
+        if not module.endswith(".py"):
+            return importlib.import_module(module_name)
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(COMMON_DIR, module))
+        loaded = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = loaded
+        try:
+            spec.loader.exec_module(loaded)
+        except BaseException:
+            del sys.modules[module_name]
+            raise
+        return loaded
+
+    @classmethod
+    def register(cls, name: str, module: str, attribute: str) -> None:
+        '''
+            Register an integration, replacing an existing entry with the same name
+            - module: dotted module name, or a .py path relative to MainFramework/Common
+            - attribute: name of the class in the module
+        '''
+        with cls.__lock:
+            cls.__registry[name] = (module, attribute)
+
+    @classmethod
+    def get(cls, name: str):
+        '''
+            Return the class of an integration, importing its module on first use
+        '''
+        try:
+            module, attribute = cls.__registry[name]
+        except KeyError:
+            raise Exception(f"Unknown integration {name}, available: {', '.join(cls.available())}")
+        with cls.__lock:
+            try:
+                return getattr(cls.__import(module), attribute)
+            except Exception as e:
+                raise Exception(f"Couldn't load integration {name} from {module}, due to:\n {e}")
+
+    @classmethod
+    def create(cls, name: str, *args, **kwargs):
+        '''
+            Create an instance of an integration, arguments are passed to its constructor
+        '''
+        return cls.get(name)(*args, **kwargs)
+
+    @classmethod
+    def available(cls) -> List[str]:
+        '''
+            Names of the registered integrations
+        '''
+        return sorted(cls.__registry)
+
+    @classmethod
+    def loaded(cls) -> List[str]:
+        '''
+            Names of the integrations whose module is already imported
+        '''
+        return sorted(name for name, (module, _) in cls.__registry.items() if cls.__module_name(module) in sys.modules)
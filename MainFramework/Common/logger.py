@@ -1,31 +1,298 @@
+import atexit
+import glob
+import gzip
+import json
 import logging
+import multiprocessing
 import os
-from datetime import datetime
-from dotenv import load_dotenv
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener
+
+class BatchFileHandler(logging.FileHandler):
+    """
+    FileHandler that buffers formatted records and writes them in one call:
+        - batch_size: records kept in memory before a write
+        - records at flush_level or above are written at once, together with the buffer
+    """
+    def __init__(self, filename: str, mode: str = "a", batch_size: int = 100, flush_level: int = logging.ERROR, encoding: str = "utf-8") -> None:
+        super().__init__(filename, mode=mode, encoding=encoding)
+        self.batch_size = batch_size
+        self.flush_level = flush_level
+        self.__buffer : list = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.__buffer.append(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self.__buffer) >= self.batch_size or record.levelno >= self.flush_level:
+            self.flush()
+
+    def pending_bytes(self) -> int:
+        return sum(len(line) for line in self.__buffer)
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if self.__buffer:
+                if self.stream is None:
+                    self.stream = self._open()
+                self.stream.write("".join(self.__buffer))
+                self.__buffer.clear()
+            super().flush()
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        self.flush()
+        super().close()
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as one JSON object per line for the log pipeline
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SegmentCompressor:
+    """
+    Gzip rotated log segments on one background thread, so rotation never waits for compression.
+    Shutdown doesn't wait for the backlog either, a segment left uncompressed is compressed on the next start
+    """
+    __queue : queue.Queue = queue.Queue()
+    __thread : threading.Thread = None
+    __lock = threading.Lock()
+
+    @classmethod
+    def submit(cls, path: str) -> None:
+        with cls.__lock:
+            if not cls.__thread or not cls.__thread.is_alive():
+                cls.__thread = threading.Thread(target=cls.__run, name="log-compressor", daemon=True)
+                cls.__thread.start()
+        cls.__queue.put(path)
+
+    @classmethod
+    def wait(cls) -> None:
+        """
+            Block until every submitted segment is compressed
+        """
+        cls.__queue.join()
+
+    @classmethod
+    def __run(cls) -> None:
+        while True:
+            path = cls.__queue.get()
+            try:
+                if os.path.exists(path):
+                    with open(path, "rb") as source, gzip.open(f"{path}.gz.tmp", "wb") as target:
+                        shutil.copyfileobj(source, target, 1024 * 1024)
+                    os.replace(f"{path}.gz.tmp", f"{path}.gz")
+                    os.remove(path)
+            except Exception as e:
+                print(f"Couldn't compress log segment {path}, due to:\n {e}")
+            finally:
+                cls.__queue.task_done()
+
+class RotatingBatchFileHandler(BatchFileHandler):
+    """
+    BatchFileHandler that rotates the log file by size and by time:
+        - max_bytes: rotate once the file would grow past this size, 0 turns size rotation off
+        - when: "S", "M", "H", "D" (every interval units) or "midnight", empty turns time rotation off
+        - rotated segments are named <file>.<YYYYmmdd-HHMMSS>.log and gzip-compressed in the background when compress is set
+        - retention: only the newest backup_count segments younger than retention_days are kept
+        - segment_patterns: globs of older log files this handler owns, defaults to its own rotated segments
+        - filename_pattern: strftime pattern of the file name (e.g. a date in it), a rollover that lands on a new name
+          starts a new file and leaves the previous one as a segment
+    """
+    __units = {"S": 1, "M": 60, "H": 3600, "D": 86400}
+
+    def __init__(
+                    self,
+                    filename: str,
+                    mode: str = "a",
+                    batch_size: int = 100,
+                    max_bytes: int = 100 * 1024 * 1024,
+                    when: str = "midnight",
+                    interval: int = 1,
+                    backup_count: int = 30,
+                    retention_days: float = 30,
+                    compress: bool = True,
+                    segment_patterns: list = None,
+                    filename_pattern: str = None
+                    ) -> None:
+        super().__init__(filename, mode=mode, batch_size=batch_size)
+        self.max_bytes = max_bytes
+        self.when = (when or "").strip()
+        if self.when and self.when != "midnight" and self.when.upper() not in self.__units:
+            raise ValueError(f"Invalid log rotation interval {when}, use S, M, H, D or midnight")
+        self.interval = max(1, interval)
+        self.backup_count = backup_count
+        self.retention_days = retention_days
+        self.compress = compress
+        self.filename_pattern = filename_pattern
+        self.__stem = os.path.splitext(self.baseFilename)[0]
+        self.segment_patterns = segment_patterns if segment_patterns else [f"{glob.escape(self.__stem)}.*-*.log"]
+        self.__rollover_at = self.__next_rollover(time.time())
+        # Segments left uncompressed by a previous run are compressed now
+        if self.compress:
+            for segment in self.__segments(compressed=False):
+                SegmentCompressor.submit(segment)
+        self.__apply_retention()
+
+    def __segments(self, compressed: bool = True) -> list:
+        segments = set()
+        for pattern in self.segment_patterns:
+            segments.update(glob.glob(pattern))
+            if compressed:
+                segments.update(glob.glob(f"{pattern}.gz"))
+        segments.discard(self.baseFilename)
+        return list(segments)
+
+    def __next_rollover(self, now: float):
+        if not self.when:
+            return None
+        if self.when == "midnight":
+            tomorrow = datetime.fromtimestamp(now).date() + timedelta(days=1)
+            return datetime(tomorrow.year, tomorrow.month, tomorrow.day).timestamp()
+        return now + self.__units[self.when.upper()] * self.interval
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if self.__should_rollover():
+                self.__rollover()
+            super().flush()
+        finally:
+            self.release()
+
+    def __should_rollover(self) -> bool:
+        if self.__rollover_at and time.time() >= self.__rollover_at:
+            return True
+        if self.max_bytes and self.stream is not None:
+            self.stream.seek(0, 2)
+            return self.stream.tell() + self.pending_bytes() >= self.max_bytes and self.stream.tell() > 0
+        return False
+
+    def __rollover(self) -> None:
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        now = time.time()
+        filename = os.path.abspath(datetime.fromtimestamp(now).strftime(self.filename_pattern)) if self.filename_pattern else self.baseFilename
+        if filename != self.baseFilename:
+            # A new date in the file name, the file of the previous period is already a segment by its name
+            previous, self.baseFilename = self.baseFilename, filename
+            self.__stem = os.path.splitext(self.baseFilename)[0]
+            if self.compress and os.path.exists(previous):
+                SegmentCompressor.submit(previous)
+        else:
+            segment = f"{self.__stem}.{datetime.fromtimestamp(now).strftime('%Y%m%d-%H%M%S')}.log"
+            suffix = 1
+            while os.path.exists(segment) or os.path.exists(f"{segment}.gz"):
+                segment = f"{self.__stem}.{datetime.fromtimestamp(now).strftime('%Y%m%d-%H%M%S')}-{suffix}.log"
+                suffix += 1
+            if os.path.exists(self.baseFilename):
+                os.replace(self.baseFilename, segment)
+                if self.compress:
+                    SegmentCompressor.submit(segment)
+        self.stream = self._open()
+        self.__rollover_at = self.__next_rollover(now)
+        self.__apply_retention()
+
+    def __apply_retention(self) -> None:
+        segments = self.__segments()
+        segments.sort(key=os.path.getmtime, reverse=True)
+        expires_before = time.time() - self.retention_days * 86400 if self.retention_days else None
+        for index, segment in enumerate(segments):
+            try:
+                if (self.backup_count and index >= self.backup_count) or (expires_before and os.path.getmtime(segment) < expires_before):
+                    os.remove(segment)
+            except OSError as e:
+                print(f"Couldn't remove log segment {segment}, due to:\n {e}")
+
+class BatchQueueListener(QueueListener):
+    """
+    QueueListener that flushes its handlers whenever the queue stays empty for flush_interval seconds,
+    so buffered lines never wait for a full batch on a quiet process
+    """
+    def __init__(self, log_queue: queue.Queue, *handlers, flush_interval: float = 1.0) -> None:
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.flush_interval = flush_interval
+
+    def dequeue(self, block: bool):
+        while True:
+            try:
+                return self.queue.get(block=block, timeout=self.flush_interval if block else None)
+            except queue.Empty:
+                if not block:
+                    raise
+                self.flush()
+
+    def flush(self) -> None:
+        for handler in self.handlers:
+            handler.flush()
+
+class ForwardHandler(logging.Handler):
+    """
+    Hand records received from worker processes to the Logger of this process
+    """
+    def __init__(self, target: logging.Logger) -> None:
+        super().__init__()
+        self.target = target
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.target.handle(record)
 
 class Logger:
     """
     Custom Logger using logging library:
         - format_type: format of logging file
         - file_mode: logging.BasicConfig mode "a" for append, mode "w" for replace, ...
+        - log_format: "text" or "json" (one JSON object per line) for the log file, defaults to LOG_FORMAT
+    The file rotates by size (LOG_MAX_BYTES) and time (LOG_ROTATE_WHEN, LOG_ROTATE_INTERVAL), rotated segments are
+    gzip-compressed (LOG_COMPRESS) and kept by LOG_BACKUP_COUNT and LOG_RETENTION_DAYS.
+    Records are put on a queue by the calling thread, a single listener thread formats them and writes the file in batches.
+    Setting up is idempotent, constructing Logger() again for the same file adds no handler.
+    Worker processes have no listener of their own: pass Logger.worker_queue() to Logger.setup_worker in the process
+    (e.g. as ProcessPoolExecutor initializer) and their records are written by the listener of this process
     """
-    load_dotenv()
-    __logger : logging.Logger = None
-    if not __logger:
-        __logger = logging.getLogger(__name__)
-        print(__logger.hasHandlers())
-    else:
-        pass
-    
-    def __init__(self, file_mode: str = "a", format_type="%(asctime)s - %(created)s - %(msecs)s - %(levelname)s - %(message)s") -> None:
+    __logger : logging.Logger = logging.getLogger(__name__)
+    __queue : queue.Queue = queue.Queue(-1)
+    __listener : BatchQueueListener = None
+    __worker_queue = None
+    __worker_listener : QueueListener = None
+    __file_pattern : str = None
+    __lock = threading.Lock()
+
+    def __init__(self, file_mode: str = "a", format_type="%(asctime)s - %(created)s - %(msecs)s - %(levelname)s - %(message)s", log_format: str = None) -> None:
         try:
             self.format_type = format_type
             self.file_mode = file_mode
+            self.log_format = (log_format or os.getenv("LOG_FORMAT", "text")).strip().lower()
             if os.getenv('AUTOMATION_LOGS') and os.getenv('PROCESS_NAME'):
-                self.file_path = f"{os.getcwd()}/{os.getenv('AUTOMATION_LOGS')}/{datetime.now().strftime('%d%m%Y')}-{os.getenv('PROCESS_NAME')}.log"
+                # The date is part of the file name, the file handler moves to a new file after midnight
+                log_dir = f"{os.getcwd()}/{os.getenv('AUTOMATION_LOGS')}".replace("%", "%%")
+                self.file_pattern = f"{log_dir}/%d%m%Y-{os.getenv('PROCESS_NAME').replace('%', '%%')}.log"
+                self.file_path = datetime.now().strftime(self.file_pattern)
             else:
                 raise Exception("os.getenv('AUTOMATION_LOGS') or os.getenv('PROCESS_NAME') are not set")
-            self.__base_config_logger()
             self.__config_log_handler()
         except FileNotFoundError as e:
             raise Exception(f"File path: {self.file_path} does not exist")
@@ -34,20 +301,116 @@ class Logger:
 
     def __config_log_handler(self) -> None:
         """
-            Set up handler for logging
+            Set up the queue handler and the listener writing the log file and the console, once per file
+            Return: None
+        """
+        file_path = os.path.abspath(self.file_path)
+        file_pattern = os.path.abspath(self.file_pattern)
+        with Logger.__lock:
+            if Logger.__listener and Logger.__file_pattern == file_pattern:
+                return
+            formatter = logging.Formatter(self.format_type)
+            file_handler = RotatingBatchFileHandler(
+                filename = file_path,
+                mode = self.file_mode,
+                batch_size = int(os.getenv("LOG_BATCH_SIZE", 100)),
+                max_bytes = int(os.getenv("LOG_MAX_BYTES", 100 * 1024 * 1024)),
+                when = os.getenv("LOG_ROTATE_WHEN", "midnight"),
+                interval = int(os.getenv("LOG_ROTATE_INTERVAL", 1)),
+                backup_count = int(os.getenv("LOG_BACKUP_COUNT", 30)),
+                retention_days = float(os.getenv("LOG_RETENTION_DAYS", 30)),
+                compress = os.getenv("LOG_COMPRESS", "true").strip().lower() in ("true", "1", "yes"),
+                segment_patterns = [
+                    os.path.join(glob.escape(os.path.dirname(file_path)), f"*-{glob.escape(os.getenv('PROCESS_NAME'))}.log"),
+                    os.path.join(glob.escape(os.path.dirname(file_path)), f"*-{glob.escape(os.getenv('PROCESS_NAME'))}.*-*.log")],
+                filename_pattern = file_pattern)
+            file_handler.setFormatter(JsonFormatter() if self.log_format == "json" else formatter)
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            Logger.__stop_listener()
+            Logger.__listener = BatchQueueListener(
+                Logger.__queue, file_handler, console_handler,
+                flush_interval = float(os.getenv("LOG_FLUSH_INTERVAL", 1.0)))
+            Logger.__listener.start()
+            Logger.__file_pattern = file_pattern
+            if not any(isinstance(handler, QueueHandler) for handler in Logger.__logger.handlers):
+                Logger.__logger.addHandler(QueueHandler(Logger.__queue))
+            Logger.__logger.setLevel(logging.INFO)
+            Logger.__logger.propagate = False
+
+    @staticmethod
+    def worker_queue():
+        """
+            Return the queue worker processes put their records on, the records are forwarded to this process' Logger
+            Return: multiprocessing.Queue
+        """
+        with Logger.__lock:
+            if Logger.__worker_listener is None:
+                Logger.__worker_queue = multiprocessing.Queue(-1)
+                Logger.__worker_listener = QueueListener(Logger.__worker_queue, ForwardHandler(Logger.__logger))
+                Logger.__worker_listener.start()
+            return Logger.__worker_queue
+
+    @staticmethod
+    def setup_worker(log_queue) -> None:
+        """
+            Send the records of a worker process to log_queue (from Logger.worker_queue()), run in the worker process
+            Return: None
+        """
+        # A forked worker inherits the parent's listener objects, but not their threads
+        Logger.__listener = None
+        Logger.__file_pattern = None
+        Logger.__worker_queue = None
+        Logger.__worker_listener = None
+        for handler in list(Logger.__logger.handlers):
+            Logger.__logger.removeHandler(handler)
+        Logger.__logger.addHandler(QueueHandler(log_queue))
+        Logger.__logger.setLevel(logging.INFO)
+        Logger.__logger.propagate = False
+
+    @staticmethod
+    def __stop_worker_listener() -> None:
+        if Logger.__worker_listener:
+            # Worker records are handed to the file listener first, so they are written before it stops
+            Logger.__worker_listener.stop()
+            Logger.__worker_queue.close()
+            Logger.__worker_listener = None
+            Logger.__worker_queue = None
+
+    @staticmethod
+    def __stop_listener() -> None:
+        if Logger.__listener:
+            Logger.__listener.stop()
+            for handler in Logger.__listener.handlers:
+                handler.close()
+            Logger.__listener = None
+            Logger.__file_pattern = None
+
+    @staticmethod
+    def flush() -> None:
+        """
+            Write every queued record to the log file before returning
             Return: None
         """
-        formatter = logging.Formatter(self.format_type)
-        handler = logging.FileHandler(filename=self.file_path)
-        handler.setFormatter(formatter)
-        self.__logger.addHandler(hdlr= handler)
+        with Logger.__lock:
+            if Logger.__worker_listener:
+                Logger.__worker_listener.stop()
+                Logger.__worker_listener.start()
+            if Logger.__listener:
+                # stop() drains the queue on the listener thread, the listener is restarted for later records
+                Logger.__listener.stop()
+                Logger.__listener.flush()
+                Logger.__listener.start()
 
-    def __base_config_logger(self) -> None:
+    @staticmethod
+    def shutdown() -> None:
         """
-            Set up baseConfig for logging
+            Drain the queue, close the log file and stop the listener thread
             Return: None
         """
-        logging.basicConfig(level=logging.INFO, format=self.format_type)
+        with Logger.__lock:
+            Logger.__stop_worker_listener()
+            Logger.__stop_listener()
 
     @staticmethod
     def trace_exception(msg: str) -> None:
@@ -65,6 +428,14 @@ class Logger:
         """
         Logger.__logger.info(msg)
 
+    @staticmethod
+    def warning(msg) -> None:
+        """
+            -msg: log messages
+            Return: None
+        """
+        Logger.__logger.warning(msg)
+
     @staticmethod
     def error(msg) -> None:
         """
@@ -80,11 +451,13 @@ class Logger:
             Return: None
         """
         Logger.__logger.debug(msg)
-    
+
     @staticmethod
     def critical(msg) -> None:
         """
             -msg: log messages
             Return: None
         """
-        Logger.__logger.critical(msg)
\ No newline at end of file
+        Logger.__logger.critical(msg)
+
+atexit.register(Logger.shutdown)
@@ -0,0 +1,263 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+class Histogram:
+    """
+        Latency histogram with fixed upper bounds in seconds, compatible with the Prometheus histogram type
+    """
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min : Optional[float] = None
+        self.max : Optional[float] = None
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def cumulative(self) -> list:
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "avg": self.sum / self.count if self.count else 0.0,
+            "min": self.min,
+            "max": self.max,
+            "buckets": {str(bound): count for bound, count in self.cumulative()}}
+
+class Metrics:
+    """
+        Process-wide metrics registry for the framework stages and the integration clients:
+            - Metrics.timer(name, **labels) / @Metrics.timed(name, **labels) record a latency histogram
+            - Metrics.increment(name, **labels) counts retries, exceptions and processed items
+            - @Metrics.integration("service_bus") times every call of a client method and counts its errors
+            - snapshot() returns everything as a dict, export() writes a Prometheus textfile or a JSON snapshot
+    """
+    __lock = threading.Lock()
+    __counters : Dict[Tuple[str, tuple], float] = {}
+    __gauges : Dict[Tuple[str, tuple], float] = {}
+    __histograms : Dict[Tuple[str, tuple], Histogram] = {}
+    __started_at = time.time()
+    __exporter : Optional[threading.Thread] = None
+    __stop_exporter = threading.Event()
+
+    def __init__(self) -> None:
+        pass
+
+    @staticmethod
+    def __key(name: str, labels: dict) -> Tuple[str, tuple]:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    @classmethod
+    def increment(cls, name: str, value: float = 1, **labels) -> None:
+        """
+            Add value to a counter
+        """
+        key = cls.__key(name, labels)
+        with cls.__lock:
+            cls.__counters[key] = cls.__counters.get(key, 0) + value
+
+    @classmethod
+    def set_gauge(cls, name: str, value: float, **labels) -> None:
+        """
+            Set a gauge to its current value
+        """
+        with cls.__lock:
+            cls.__gauges[cls.__key(name, labels)] = value
+
+    @classmethod
+    def observe(cls, name: str, seconds: float, **labels) -> None:
+        """
+            Add a duration in seconds to a histogram
+        """
+        key = cls.__key(name, labels)
+        with cls.__lock:
+            histogram = cls.__histograms.get(key)
+            if histogram is None:
+                histogram = cls.__histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @classmethod
+    @contextmanager
+    def timer(cls, name: str, **labels):
+        """
+            Time the with block into histogram name, an exception is counted in <name>_errors_total with its type,
+            a _duration_seconds suffix is dropped from the counter name
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            cls.increment(f"{name.removesuffix('_duration_seconds')}_errors_total", exception=type(e).__name__, **labels)
+            raise
+        finally:
+            cls.observe(name, time.perf_counter() - start, **labels)
+
+    @classmethod
+    def timed(cls, name: str, **labels):
+        """
+            Decorator version of timer, works for plain and async functions
+        """
+        def decorator(function):
+            if inspect.iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def async_wrapper(*args, **kwargs):
+                    with cls.timer(name, **labels):
+                        return await function(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with cls.timer(name, **labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @classmethod
+    def integration(cls, integration: str, operation: Optional[str] = None):
+        """
+            Decorator timing calls of an integration client method into integration_call_duration_seconds
+            -integration: service name, e.g. service_bus, key_vault, sharepoint, outlook
+            -operation: defaults to the method name
+        """
+        def decorator(function):
+            return cls.timed("integration_call_duration_seconds", integration=integration, operation=operation or function.__name__)(function)
+        return decorator
+
+    @classmethod
+    def stage(cls, stage: str):
+        """
+            Context manager timing a framework stage into stage_duration_seconds
+        """
+        return cls.timer("stage_duration_seconds", stage=stage)
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls.__lock:
+            cls.__counters.clear()
+            cls.__gauges.clear()
+            cls.__histograms.clear()
+            cls.__started_at = time.time()
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        """
+            Return counters, gauges, histograms and items per minute as a JSON serializable dict
+        """
+        with cls.__lock:
+            uptime = time.time() - cls.__started_at
+            counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in cls.__counters.items()]
+            gauges = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in cls.__gauges.items()]
+            histograms = [{"name": name, "labels": dict(labels), **histogram.to_dict()} for (name, labels), histogram in cls.__histograms.items()]
+            items = sum(value for (name, _), value in cls.__counters.items() if name == "items_processed_total")
+        return {
+            "timestamp": time.time(),
+            "uptime_seconds": uptime,
+            "items_per_minute": items / uptime * 60 if uptime > 0 else 0.0,
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms}
+
+    @staticmethod
+    def __format_labels(labels: dict, extra: Optional[dict] = None) -> str:
+        merged = {**labels, **(extra or {})}
+        if not merged:
+            return ""
+        escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for key, value in merged.items())
+        return "{" + ",".join(escaped) + "}"
+
+    @classmethod
+    def to_prometheus(cls, prefix: str = "automation_") -> str:
+        """
+            Render the snapshot in the Prometheus text exposition format, every sample of a metric in one group
+        """
+        snapshot = cls.snapshot()
+        lines = []
+        typed = set()
+
+        def _type(name: str, kind: str):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for counter in sorted(snapshot["counters"], key=lambda metric: metric["name"]):
+            name = prefix + counter["name"]
+            _type(name, "counter")
+            lines.append(f"{name}{cls.__format_labels(counter['labels'])} {counter['value']}")
+        for gauge in sorted(snapshot["gauges"], key=lambda metric: metric["name"]):
+            name = prefix + gauge["name"]
+            _type(name, "gauge")
+            lines.append(f"{name}{cls.__format_labels(gauge['labels'])} {gauge['value']}")
+        for histogram in sorted(snapshot["histograms"], key=lambda metric: metric["name"]):
+            name = prefix + histogram["name"]
+            _type(name, "histogram")
+            for bound, count in histogram["buckets"].items():
+                lines.append(f"{name}_bucket{cls.__format_labels(histogram['labels'], {'le': bound})} {count}")
+            lines.append(f"{name}_bucket{cls.__format_labels(histogram['labels'], {'le': '+Inf'})} {histogram['count']}")
+            lines.append(f"{name}_sum{cls.__format_labels(histogram['labels'])} {histogram['sum']}")
+            lines.append(f"{name}_count{cls.__format_labels(histogram['labels'])} {histogram['count']}")
+        _type(f"{prefix}items_per_minute", "gauge")
+        lines.append(f"{prefix}items_per_minute {snapshot['items_per_minute']}")
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def export(cls, path: str, format: str = "prometheus") -> None:
+        """
+            Write the metrics atomically, so a collector never reads a half written file
+            -path: target file, e.g. a node_exporter textfile directory entry ending in .prom
+            -format: "prometheus" or "json"
+        """
+        content = cls.to_prometheus() if format == "prometheus" else json.dumps(cls.snapshot(), indent=2, default=str)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def start_exporter(cls, path: str, format: str = "prometheus", interval: float = 30) -> None:
+        """
+            Export the metrics every interval seconds on a daemon thread, until stop_exporter
+        """
+        if cls.__exporter and cls.__exporter.is_alive():
+            return
+        cls.__stop_exporter.clear()
+
+        def _run():
+            while not cls.__stop_exporter.wait(interval):
+                try:
+                    cls.export(path, format)
+                except Exception as e:
+                    print(f"Couldn't export metrics to {path}, due to:\n {e}")
+
+        cls.__exporter = threading.Thread(target=_run, name="metrics-exporter", daemon=True)
+        cls.__exporter.start()
+
+    @classmethod
+    def stop_exporter(cls) -> None:
+        cls.__stop_exporter.set()
+        if cls.__exporter:
+            cls.__exporter.join()
+            cls.__exporter = None
@@ -1,5 +1,6 @@
-import win32com.client as client
 from typing import List, Optional, Tuple
+from MainFramework.Common.metrics import Metrics
+from MainFramework.Common.retry import RetryPolicy
 
 class Outlook:
     '''
@@ -14,6 +15,7 @@ class Outlook:
             Initialize connection to Outlook, return a tuple for Application object, namespace object, default account
         '''
         try:
+            import win32com.client as client
             ol = client.Dispatch("Outlook.Application")
             namespace = ol.GetNamespace("MAPI")
             default_account = ol.Session.Accounts[0]
@@ -44,6 +46,8 @@ class Outlook:
             raise e
     
     @staticmethod
+    @Metrics.integration("outlook")
+    @RetryPolicy.integration("outlook", retry=False)
     def DeleteMailMessage(mail_item):
         """
             Delete Email message
@@ -56,6 +60,8 @@ class Outlook:
             raise Exception(error_message)
         
     @staticmethod    
+    @Metrics.integration("outlook")
+    @RetryPolicy.integration("outlook")
     def MarkAsReadUnread(mail_item, mark_unread: bool):
         '''
             Mark mail message as read/unread:
@@ -68,6 +74,8 @@ class Outlook:
             error_message = f'Error marking message as read/unread: {e}'
             raise Exception(error_message)
 
+    @Metrics.integration("outlook")
+    @RetryPolicy.integration("outlook", retry=False)
     def SendMailMessage(
                         self,
                         mailTo: str, 
@@ -119,6 +127,8 @@ class Outlook:
             error_message = f"Error sending email: {e}"
             raise Exception(error_message)   
 
+    @Metrics.integration("outlook")
+    @RetryPolicy.integration("outlook")
     def GetMailMessages(
                         self,
                         account_address: Optional[str] = None, 
@@ -166,6 +176,8 @@ class Outlook:
             error_message = f'Error retrieving mail messages from {folder_name}: {e}'
             raise Exception(error_message)
 
+    @Metrics.integration("outlook")
+    @RetryPolicy.integration("outlook", retry=False)
     def MoveMailMessage(
                         self, 
                         mail_item, 
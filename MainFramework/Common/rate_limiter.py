@@ -0,0 +1,244 @@
+import asyncio
+import builtins
+import json
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from MainFramework.Common.metrics import Metrics
+
+THROTTLED_STATUS_CODES = (429, 503)
+# Exception groups are built in from Python 3.11, an empty tuple matches nothing on older versions
+BASE_EXCEPTION_GROUP = getattr(builtins, "BaseExceptionGroup", ())
+# Throttling errors that carry no Retry-After header, matched by class name so no SDK has to be imported
+THROTTLED_EXCEPTION_NAMES = {"ServiceBusServerBusyError", "ServiceBusQuotaExceededError"}
+
+def retry_after_from(exception: BaseException, default: float = 10.0) -> Optional[float]:
+    """
+        Seconds a service asked to wait, read from the exception chain:
+            - a retry_after attribute, or a Retry-After header (seconds or HTTP date) on exception.response
+            - a 429/503 response or a known throttling exception without header waits default seconds
+            - an exception group waits for the longest of its exceptions
+            - an open circuit breaker (CircuitOpenError) is not a throttling response, its retry_after is ignored
+        Return: seconds, None when the exception is not a throttling response
+    """
+    seen = set()
+    current = exception
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        if type(current).__name__ == "CircuitOpenError":
+            # Matched by name, retry imports this module
+            return None
+        retry_after = getattr(current, "retry_after", None)
+        if retry_after:
+            return float(retry_after)
+        response = getattr(current, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        header = headers.get("Retry-After") or headers.get("retry-after") if hasattr(headers, "get") else None
+        if header:
+            try:
+                return max(0.0, float(header))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    return default
+        status = getattr(response, "status_code", None) or getattr(current, "status_code", None)
+        if status in THROTTLED_STATUS_CODES or type(current).__name__ in THROTTLED_EXCEPTION_NAMES:
+            return default
+        if isinstance(current, BASE_EXCEPTION_GROUP):
+            # A fan-out waits for its longest throttled request
+            waits = [wait for wait in (retry_after_from(member, default) for member in current.exceptions) if wait is not None]
+            return max(waits) if waits else None
+        current = current.__cause__ or current.__context__
+    return None
+
+class RateLimiter:
+    """
+        Token bucket limiting the calls made to one service:
+            - rate: tokens added per second, capacity: largest burst
+            - penalize(seconds) blocks every caller after a 429/Retry-After response
+            - state_path: when set, the bucket lives in a JSON file guarded by portalocker,
+              so every process on the machine shares one quota
+            - the wait of the last acquire is exposed as the rate_limiter_wait_seconds gauge
+        RateLimiter.get("sharepoint") returns the limiter of a service, unconfigured services are unlimited
+    """
+    __limiters : Dict[str, "RateLimiter"] = {}
+    __registry_lock = threading.Lock()
+
+    def __init__(self, name: str, rate: Optional[float] = None, capacity: Optional[float] = None, state_path: Optional[str] = None) -> None:
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity if capacity else (max(1.0, rate) if rate else None)
+        self.state_path = state_path
+        self.__lock = threading.Lock()
+        self.__state = {"tokens": self.capacity or 0.0, "updated_at": time.time(), "blocked_until": 0.0}
+
+    @classmethod
+    def get(cls, name: str) -> "RateLimiter":
+        with cls.__registry_lock:
+            limiter = cls.__limiters.get(name)
+            if limiter is None:
+                limiter = cls.__limiters[name] = RateLimiter(name)
+            return limiter
+
+    @classmethod
+    def configure(cls, name: str, rate: Optional[float], capacity: Optional[float] = None, state_path: Optional[str] = None) -> "RateLimiter":
+        """
+            Replace the limiter of a service, a penalty of the previous limiter still blocks the new one
+        """
+        limiter = RateLimiter(name, rate, capacity, state_path)
+        with cls.__registry_lock:
+            previous = cls.__limiters.get(name)
+            cls.__limiters[name] = limiter
+        if previous is not None:
+            blocked_for = previous.__update(lambda state: max(0.0, state["blocked_until"] - time.time()))
+            if blocked_for > 0:
+                limiter.__block(blocked_for)
+        return limiter
+
+    @staticmethod
+    def parse_rate(value) -> Optional[tuple]:
+        """
+            Parse "10/s", "600/m", "5000/h" or "10/s:20" (rate:burst) into (tokens per second, capacity)
+        """
+        if value is None or str(value).strip() == "":
+            return None
+        text, _, burst = str(value).strip().partition(":")
+        count, _, unit = text.partition("/")
+        seconds = {"": 1, "s": 1, "m": 60, "h": 3600}.get(unit.strip().lower()[:1])
+        if seconds is None:
+            raise ValueError(f"Invalid rate limit {value}, use e.g. 10/s, 600/m or 10/s:20")
+        return float(count) / seconds, float(burst) if burst else None
+
+    @classmethod
+    def configure_from(cls, in_config) -> None:
+        """
+            Configure every service with a "rate_limit_<service>" key in the config file, e.g. rate_limit_sharepoint = 10/s.
+            With "rate_limit_shared" the buckets are kept in "rate_limit_state_dir" and shared between processes
+        """
+        state_dir = None
+        if in_config.get("rate_limit_shared"):
+            state_dir = in_config.get("rate_limit_state_dir") or os.path.join(os.getcwd(), "Data", "rate_limits")
+            os.makedirs(state_dir, exist_ok=True)
+        for key in in_config:
+            if not key.startswith("rate_limit_") or key in ("rate_limit_shared", "rate_limit_state_dir"):
+                continue
+            parsed = cls.parse_rate(in_config[key])
+            if parsed:
+                name = key[len("rate_limit_"):]
+                cls.configure(name, parsed[0], parsed[1], os.path.join(state_dir, f"{name}.json") if state_dir else None)
+
+    def __refill(self, state: dict, now: float) -> None:
+        elapsed = max(0.0, now - state["updated_at"])
+        state["tokens"] = min(self.capacity, state["tokens"] + elapsed * self.rate)
+        state["updated_at"] = now
+
+    def __take(self, state: dict, tokens: float) -> float:
+        """
+            Consume tokens from state when possible, return the seconds to wait otherwise (0 when consumed)
+        """
+        now = time.time()
+        if state["blocked_until"] > now:
+            return state["blocked_until"] - now
+        self.__refill(state, now)
+        if state["tokens"] >= tokens:
+            state["tokens"] -= tokens
+            return 0.0
+        return (tokens - state["tokens"]) / self.rate
+
+    def __update_shared(self, update):
+        import portalocker
+        with portalocker.Lock(f"{self.state_path}.lock", mode="a", timeout=30):
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {"tokens": self.capacity or 0.0, "updated_at": time.time(), "blocked_until": 0.0}
+            result = update(state)
+            temp_path = f"{self.state_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(temp_path, self.state_path)
+            return result
+
+    def __update(self, update):
+        with self.__lock:
+            if self.state_path:
+                return self.__update_shared(update)
+            return update(self.__state)
+
+    def __next_wait(self, tokens: float, started: float, timeout: Optional[float]) -> float:
+        '''
+            Take tokens when available (return 0), otherwise the seconds to wait before trying again
+        '''
+        if self.rate:
+            wait = self.__update(lambda state: self.__take(state, min(tokens, self.capacity)))
+        else:
+            wait = self.__update(lambda state: max(0.0, state["blocked_until"] - time.time()))
+        waited = time.monotonic() - started
+        Metrics.set_gauge("rate_limiter_wait_seconds", wait if wait > 0 else waited, integration=self.name)
+        if wait > 0 and timeout is not None and waited + wait > timeout:
+            raise TimeoutError(f"Rate limiter {self.name} would wait {wait:.2f}s, over the {timeout}s timeout")
+        return wait
+
+    async def __next_wait_async(self, tokens: float, started: float, timeout: Optional[float]) -> float:
+        if self.state_path:
+            # The file lock can be held by another process, wait for it on a worker thread
+            return await asyncio.to_thread(self.__next_wait, tokens, started, timeout)
+        return self.__next_wait(tokens, started, timeout)
+
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> float:
+        """
+            Block until tokens are available
+            -timeout: give up after this many seconds with a TimeoutError, wait forever if not provided
+            Return: seconds waited
+        """
+        started = time.monotonic()
+        while (wait := self.__next_wait(tokens, started, timeout)) > 0:
+            time.sleep(wait)
+            if not self.rate:
+                break
+        return time.monotonic() - started
+
+    async def acquire_async(self, tokens: float = 1, timeout: Optional[float] = None) -> float:
+        """
+            Async version of acquire, waits with asyncio.sleep so a waiting coroutine holds no thread.
+            A shared bucket is read and written under its file lock on a worker thread, so the event loop never blocks on it
+        """
+        started = time.monotonic()
+        while (wait := await self.__next_wait_async(tokens, started, timeout)) > 0:
+            await asyncio.sleep(wait)
+            if not self.rate:
+                break
+        return time.monotonic() - started
+
+    def __block(self, seconds: float) -> None:
+        def _block(state: dict) -> None:
+            state["blocked_until"] = max(state["blocked_until"], time.time() + seconds)
+            # The bucket starts refilling when the block ends
+            state["tokens"] = 0.0
+            state["updated_at"] = state["blocked_until"]
+        self.__update(_block)
+
+    def penalize(self, seconds: float) -> None:
+        """
+            Block every caller of the service for seconds, after a 429 or Retry-After response
+        """
+        self.__block(seconds)
+        Metrics.increment("rate_limiter_throttled_total", integration=self.name)
+
+    def current_wait(self) -> float:
+        """
+            Seconds the next acquire would wait, without consuming a token
+        """
+        def _peek(state: dict) -> float:
+            now = time.time()
+            if state["blocked_until"] > now:
+                return state["blocked_until"] - now
+            if not self.rate:
+                return 0.0
+            tokens = min(self.capacity, state["tokens"] + max(0.0, now - state["updated_at"]) * self.rate)
+            return max(0.0, (1 - tokens) / self.rate)
+        return self.__update(_peek)
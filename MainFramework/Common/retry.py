@@ -0,0 +1,373 @@
+import asyncio
+import builtins
+import functools
+import inspect
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple, Type
+from MainFramework.Common.logger import Logger
+from MainFramework.Common.metrics import Metrics
+from MainFramework.Common.rate_limiter import RateLimiter, retry_after_from
+from MainFramework.Exception.exception import BusinessException
+
+# Errors that fail the same way on every attempt, matched by class name so no SDK has to be imported
+FATAL_EXCEPTION_NAMES = {
+    "BusinessException",
+    "ClientAuthenticationError",
+    "ResourceNotFoundError",
+    "MessageSizeExceededError",
+    "MessageNotFoundError",
+    "MessageAlreadySettled",
+    "MessageLockLostError",
+    "SessionLockLostError",
+    "FileNotFoundError",
+    "PermissionError",
+    "NotImplementedError",
+}
+
+# Exception groups are built in from Python 3.11, an empty tuple matches nothing on older versions
+BASE_EXCEPTION_GROUP = getattr(builtins, "BaseExceptionGroup", ())
+
+# HTTP responses that fail the same way on every attempt, read from exception.status_code or exception.response.status_code
+FATAL_STATUS_CODES = {400, 401, 403, 404, 405, 409, 410, 412, 413}
+
+class CircuitOpenError(Exception):
+    """
+        Raised instead of calling an integration whose circuit breaker is open
+    """
+    def __init__(self, name: str, retry_after: float) -> None:
+        super().__init__(f"Circuit breaker {name} is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+def is_circuit_open(exception: BaseException) -> bool:
+    """
+        True when a CircuitOpenError is in the __cause__/__context__ chain of exception
+    """
+    seen = set()
+    current = exception
+    while current is not None and id(current) not in seen:
+        if isinstance(current, CircuitOpenError):
+            return True
+        seen.add(id(current))
+        current = current.__cause__ or current.__context__
+    return False
+
+class CircuitBreaker:
+    """
+        Stop calling an integration that keeps failing, so a degraded service gets time to recover:
+            - closed: calls go through, failure_threshold consecutive failures open the circuit
+            - open: calls fail fast with CircuitOpenError for recovery_timeout seconds
+            - half open: one trial call decides whether the circuit closes again or re-opens
+        One breaker is shared per integration name, CircuitBreaker.get("sharepoint")
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+    __breakers : Dict[str, "CircuitBreaker"] = {}
+    __registry_lock = threading.Lock()
+    __defaults = {"failure_threshold": 5, "recovery_timeout": 30.0}
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.__failures = 0
+        self.__opened_at = 0.0
+        self.__open_for = recovery_timeout
+        self.__trial_running = False
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def get(cls, name: str) -> "CircuitBreaker":
+        with cls.__registry_lock:
+            breaker = cls.__breakers.get(name)
+            if breaker is None:
+                breaker = cls.__breakers[name] = CircuitBreaker(name, **cls.__defaults)
+            return breaker
+
+    @classmethod
+    def configure(cls, failure_threshold: int, recovery_timeout: float) -> None:
+        """
+            Set the thresholds of every breaker, existing and future ones
+        """
+        with cls.__registry_lock:
+            cls.__defaults = {"failure_threshold": failure_threshold, "recovery_timeout": recovery_timeout}
+            for breaker in cls.__breakers.values():
+                breaker.failure_threshold = failure_threshold
+                breaker.recovery_timeout = recovery_timeout
+
+    def __set_state(self, state: str) -> None:
+        if state != self.state:
+            Logger.info(f"Circuit breaker {self.name}: {self.state} -> {state}")
+        self.state = state
+        Metrics.set_gauge("circuit_breaker_open", 1 if state == self.OPEN else 0, integration=self.name)
+
+    def before_call(self) -> None:
+        """
+            Raise CircuitOpenError when the call must not go through
+        """
+        with self.__lock:
+            if self.state == self.OPEN:
+                remaining = self.__opened_at + self.__open_for - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(self.name, remaining)
+                self.__set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                if self.__trial_running:
+                    raise CircuitOpenError(self.name, self.recovery_timeout)
+                self.__trial_running = True
+
+    def record_success(self) -> None:
+        with self.__lock:
+            self.__failures = 0
+            self.__trial_running = False
+            self.__set_state(self.CLOSED)
+
+    def __open(self, seconds: float) -> None:
+        self.__opened_at = time.monotonic()
+        self.__open_for = seconds
+        self.__set_state(self.OPEN)
+
+    def record_failure(self) -> None:
+        with self.__lock:
+            self.__failures += 1
+            self.__trial_running = False
+            if self.state == self.HALF_OPEN or self.__failures >= self.failure_threshold:
+                self.__open(self.recovery_timeout)
+
+    def record_ignored(self) -> None:
+        """
+            A call failed in a way that says nothing about the health of the service (fatal error),
+            the service answered, so a half open trial passes and the circuit closes
+        """
+        with self.__lock:
+            self.__trial_running = False
+            if self.state == self.HALF_OPEN:
+                self.__failures = 0
+                self.__set_state(self.CLOSED)
+
+    def record_throttled(self, retry_after: float) -> None:
+        """
+            A call was throttled, a half open trial re-opens the circuit for at least retry_after seconds
+        """
+        with self.__lock:
+            self.__trial_running = False
+            if self.state == self.HALF_OPEN:
+                self.__open(max(self.recovery_timeout, retry_after))
+
+    def release_trial(self) -> None:
+        """
+            A call ended without a result (cancelled, interrupted), the next call becomes the half open trial
+        """
+        with self.__lock:
+            self.__trial_running = False
+
+class RetryPolicy:
+    """
+        Retry a call with exponential backoff and jitter:
+            - delay before retry n is base_delay * multiplier ** (n - 1), capped at max_delay
+            - jitter "full" waits a random time up to that delay, "equal" half of it plus a random half, "none" the delay itself
+            - fatal exceptions (FATAL_EXCEPTION_NAMES, FATAL_STATUS_CODES, fatal types, anywhere in the exception chain) are raised at once
+            - an exception with a retry_after attribute (seconds) waits at least that long
+    """
+    __integration_defaults = {"max_retries": 3, "base_delay": 1.0, "max_delay": 30.0}
+
+    def __init__(
+                    self,
+                    name: str = "call",
+                    max_retries: int = 3,
+                    base_delay: float = 1.0,
+                    max_delay: float = 60.0,
+                    multiplier: float = 2.0,
+                    jitter: str = "full",
+                    fatal: Tuple[Type[BaseException], ...] = (BusinessException,),
+                    classifier: Optional[Callable[[BaseException], Optional[bool]]] = None
+                    ) -> None:
+        if jitter not in ("full", "equal", "none"):
+            raise ValueError(f"jitter must be 'full', 'equal' or 'none', got {jitter}")
+        self.name = name
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.fatal = fatal
+        self.classifier = classifier
+
+    @classmethod
+    def from_config(cls, name: str, max_retries: int, in_config) -> "RetryPolicy":
+        """
+            Build a policy with the backoff settings of the config file
+        """
+        return cls(
+            name = name,
+            max_retries = max_retries,
+            base_delay = in_config.get("retry_base_delay", 1.0),
+            max_delay = in_config.get("retry_max_delay", 60.0),
+            jitter = in_config.get("retry_jitter", "full"))
+
+    @classmethod
+    def configure_integrations(cls, in_config) -> None:
+        """
+            Apply the integration retry and circuit breaker settings of the config file
+        """
+        cls.__integration_defaults = {
+            "max_retries": in_config.get("integration_max_retries", 3),
+            "base_delay": in_config.get("retry_base_delay", 1.0),
+            "max_delay": in_config.get("retry_max_delay", 30.0)}
+        CircuitBreaker.configure(
+            failure_threshold = in_config.get("circuit_failure_threshold", 5),
+            recovery_timeout = in_config.get("circuit_recovery_timeout", 30.0))
+
+    def delay(self, retry_number: int) -> float:
+        """
+            Seconds to wait before retry number retry_number (1 based)
+        """
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (retry_number - 1))
+        if self.jitter == "full":
+            return random.uniform(0, delay)
+        if self.jitter == "equal":
+            return delay / 2 + random.uniform(0, delay / 2)
+        return delay
+
+    def is_retryable(self, exception: BaseException) -> bool:
+        """
+            Classify an exception, the whole __cause__/__context__ chain is checked since the clients wrap SDK errors,
+            an exception group is retryable when one of its exceptions is
+        """
+        if not isinstance(exception, Exception):
+            return False
+        if self.classifier:
+            verdict = self.classifier(exception)
+            if verdict is not None:
+                return verdict
+        return self.__is_chain_retryable(exception, set())
+
+    def __is_chain_retryable(self, exception: BaseException, seen: set) -> bool:
+        current = exception
+        while current is not None and id(current) not in seen:
+            seen.add(id(current))
+            if isinstance(current, self.fatal) or any(klass.__name__ in FATAL_EXCEPTION_NAMES for klass in type(current).__mro__):
+                return False
+            status = getattr(current, "status_code", None) or getattr(getattr(current, "response", None), "status_code", None)
+            if status in FATAL_STATUS_CODES:
+                return False
+            if isinstance(current, BASE_EXCEPTION_GROUP):
+                # A fan-out (e.g. PrefetchSecrets) is worth retrying when one of its failures is
+                return any(self.__is_chain_retryable(member, set(seen)) for member in current.exceptions)
+            current = current.__cause__ or current.__context__
+        return True
+
+    def __wait_for(self, retry_number: int, exception: BaseException) -> float:
+        delay = max(self.delay(retry_number), float(getattr(exception, "retry_after", 0) or 0))
+        Metrics.increment("retries_total", stage=self.name)
+        Logger.info(f"Retry {self.name}, count: {retry_number}, waiting {delay:.2f}s. Due to: {str(exception)}")
+        return delay
+
+    def call(self, function: Callable, *args, **kwargs):
+        """
+            Call function, retrying retryable exceptions up to max_retries times
+            Return: result of function, the last exception is raised when retries are spent
+        """
+        retry_number = 0
+        while True:
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                if retry_number >= self.max_retries or not self.is_retryable(e):
+                    raise
+                retry_number += 1
+                time.sleep(self.__wait_for(retry_number, e))
+
+    async def call_async(self, function: Callable, *args, **kwargs):
+        """
+            Async version of call, waits with asyncio.sleep
+        """
+        retry_number = 0
+        while True:
+            try:
+                return await function(*args, **kwargs)
+            except Exception as e:
+                if retry_number >= self.max_retries or not self.is_retryable(e):
+                    raise
+                retry_number += 1
+                await asyncio.sleep(self.__wait_for(retry_number, e))
+
+    @classmethod
+    def integration(cls, name: str, retry: bool = True):
+        """
+            Decorator guarding an integration client method with the circuit breaker and rate limiter of the integration
+            and, unless retry is False (calls that are not safe to repeat), the integration retry policy.
+            A throttling response blocks the rate limiter for its Retry-After and is retried after it
+            -name: integration name, e.g. service_bus, key_vault, sharepoint, outlook
+        """
+        def decorator(function):
+            def _policy() -> "RetryPolicy":
+                # An open circuit fails fast here, the stage retry policy decides whether to wait for it
+                return cls(name=name, max_retries=cls.__integration_defaults["max_retries"] if retry else 0,
+                           base_delay=cls.__integration_defaults["base_delay"], max_delay=cls.__integration_defaults["max_delay"],
+                           classifier=lambda e: False if is_circuit_open(e) else None)
+
+            def _record_failure(breaker: CircuitBreaker, exception: Exception) -> None:
+                if is_circuit_open(exception):
+                    # An open circuit of a nested call says nothing new about the service, this call only ends its trial
+                    breaker.release_trial()
+                    return
+                retry_after = retry_after_from(exception)
+                if retry_after is not None:
+                    # Throttling means the service is up, every caller backs off through the rate limiter instead
+                    RateLimiter.get(name).penalize(retry_after)
+                    breaker.record_throttled(retry_after)
+                    try:
+                        exception.retry_after = retry_after
+                    except AttributeError:
+                        pass
+                elif _policy().is_retryable(exception):
+                    breaker.record_failure()
+                else:
+                    # Fatal errors (bad input, missing resource) say nothing about the health of the service
+                    breaker.record_ignored()
+
+            def _guarded_sync(*args, **kwargs):
+                # The token is taken first, so a limiter timeout never leaves a half open trial behind
+                RateLimiter.get(name).acquire()
+                breaker = CircuitBreaker.get(name)
+                breaker.before_call()
+                try:
+                    result = function(*args, **kwargs)
+                except Exception as e:
+                    _record_failure(breaker, e)
+                    raise
+                except BaseException:
+                    breaker.release_trial()
+                    raise
+                breaker.record_success()
+                return result
+
+            async def _guarded_async(*args, **kwargs):
+                await RateLimiter.get(name).acquire_async()
+                breaker = CircuitBreaker.get(name)
+                breaker.before_call()
+                try:
+                    result = await function(*args, **kwargs)
+                except Exception as e:
+                    _record_failure(breaker, e)
+                    raise
+                except BaseException:
+                    breaker.release_trial()
+                    raise
+                breaker.record_success()
+                return result
+
+            if inspect.iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def async_wrapper(*args, **kwargs):
+                    return await _policy().call_async(_guarded_async, *args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                return _policy().call(_guarded_sync, *args, **kwargs)
+            return wrapper
+        return decorator
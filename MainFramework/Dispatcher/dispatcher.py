@@ -0,0 +1,179 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Any, Callable, Optional
+from MainFramework.Business.business import Business
+from MainFramework.Transaction.transaction import Transaction
+from MainFramework.Common.logger import Logger
+from MainFramework.Common.metrics import Metrics
+from MainFramework.Common.retry import RetryPolicy
+from MainFramework.Exception.exception import BusinessException
+from MainFramework.Transaction.transaction_journal import TransactionJournal
+from Data.constant import ItemState
+import heapq
+import itertools
+import time
+
+class TransactionItem:
+    """
+        Wrap a transaction item with its own retry state, so every item is retried independently
+        -data: business data of the item
+        -reference: optional identifier used in logs
+    """
+    def __init__(self, data: Any, reference: Optional[str] = None) -> None:
+        self.data = data
+        self.reference = reference if reference is not None else str(id(self))
+        self.retry_count = 0
+        self.exception : Optional[Exception] = None
+        self.submitted_at = 0.0
+
+class Dispatcher:
+    """
+        Loop over transaction items and run Business.program for them on a bounded thread or process pool
+            - max_workers: number of items processed at the same time
+            - executor_type: "thread" for I/O bound business steps, "process" for CPU bound ones
+            - max_businessex_retry: retry limit applied to every item separately
+            - retry_policy: backoff between the attempts of an item and which exceptions are not retried,
+              a waiting item doesn't hold a worker
+            - journal: records every item state transition, items finished before a crash are skipped on resume
+    """
+    def __init__(
+                    self,
+                    in_config: dict,
+                    max_workers: int = 4,
+                    executor_type: str = "thread",
+                    max_businessex_retry: int = 3,
+                    get_item: Optional[Callable[[dict], Any]] = None,
+                    retry_policy: Optional[RetryPolicy] = None,
+                    journal: Optional[TransactionJournal] = None
+                    ) -> None:
+        if max_workers < 1:
+            raise ValueError(f"max_workers must be greater than 0, got {max_workers}")
+        if executor_type.lower() not in ("thread", "process"):
+            raise ValueError(f"executor_type must be 'thread' or 'process', got {executor_type}")
+        self.in_config = in_config
+        self.max_workers = max_workers
+        self.executor_type = executor_type.lower()
+        self.max_businessex_retry = max_businessex_retry
+        self.get_item = get_item if get_item else Transaction.program
+        self.retry_policy = retry_policy if retry_policy else RetryPolicy(name="business", max_retries=max_businessex_retry)
+        self.journal = journal
+        self.skipped = 0
+        self.__delayed : list = []
+        self.__sequence = itertools.count()
+        self.succeeded : list = []
+        self.failed : list = []
+
+    def reload(self, in_config) -> None:
+        """
+            Apply a reloaded config to the items dispatched from now on.
+            The retry limit changes right away, max_workers and executor_type only on the next run
+            -in_config: new configuration object
+            Return: None
+        """
+        self.in_config = in_config
+        self.max_businessex_retry = int(in_config.get("max_businessex_retry", self.max_businessex_retry))
+        self.retry_policy = RetryPolicy.from_config("business", self.max_businessex_retry, in_config)
+        Logger.info(f"Dispatcher picked up new config, max_businessex_retry: {self.max_businessex_retry}")
+
+    def __create_executor(self):
+        if self.executor_type == "process":
+            # The queued Logger has no listener in a worker process, its records go back to the listener of this one
+            return ProcessPoolExecutor(max_workers=self.max_workers, initializer=Logger.setup_worker, initargs=(Logger.worker_queue(),))
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="dispatcher")
+
+    def __next_item(self) -> Optional[TransactionItem]:
+        """
+            Get the next transaction item, None means there is no more data to process
+        """
+        while True:
+            data = self.get_item(self.in_config)
+            if data is None:
+                return None
+            item = data if isinstance(data, TransactionItem) else TransactionItem(data, self.journal.next_reference(data) if self.journal else None)
+            if not self.journal:
+                return item
+            if self.journal.is_done(item.reference):
+                self.skipped += 1
+                continue
+            self.journal.record(item.reference, ItemState.PENDING)
+            return item
+
+    def __record(self, item: TransactionItem, state: ItemState, detail: Optional[str] = None) -> None:
+        if self.journal:
+            self.journal.record(item.reference, state, item.retry_count, detail)
+
+    def __submit(self, executor, item: TransactionItem) -> Future:
+        item.submitted_at = time.perf_counter()
+        self.__record(item, ItemState.IN_PROGRESS)
+        return executor.submit(Business.program, self.in_config, item.data)
+
+    def __handle_result(self, executor, future: Future, item: TransactionItem, in_flight: dict) -> None:
+        """
+            Record a finished item or re-submit it while its own retry budget is not spent
+        """
+        Metrics.observe("stage_duration_seconds", time.perf_counter() - item.submitted_at, stage="business")
+        try:
+            future.result()
+            self.succeeded.append(item)
+            self.__record(item, ItemState.SUCCEEDED)
+            Metrics.increment("items_processed_total", status="succeeded")
+            BusinessException.record_success()
+        except Exception as e:
+            item.exception = e
+            Metrics.increment("stage_errors_total", stage="business", exception=type(e).__name__)
+            if item.retry_count < self.max_businessex_retry and self.retry_policy.is_retryable(e):
+                item.retry_count += 1
+                delay = self.retry_policy.delay(item.retry_count)
+                Metrics.increment("retries_total", stage="business")
+                Logger.info(f"Retry process item {item.reference}, count: {str(item.retry_count)}, in {delay:.2f}s")
+                self.__record(item, ItemState.RETRY, str(e))
+                heapq.heappush(self.__delayed, (time.monotonic() + delay, next(self.__sequence), item))
+            else:
+                self.failed.append(item)
+                self.__record(item, ItemState.FAILED, str(e))
+                Metrics.increment("items_processed_total", status="failed")
+                # Ends the process only once max_consecutive_failures items failed in a row
+                BusinessException.raise_exception(f"Process Business step failed for item {item.reference}: {str(e)}", item.reference)
+
+    def program(self) -> dict:
+        """
+            Dispatch transaction items until the source runs out of data.
+            At most max_workers * 2 items are in flight, so the source is never drained into memory
+            Return: summary dict with processed/succeeded/failed counts
+        """
+        max_in_flight = self.max_workers * 2
+        in_flight : dict = {}
+        exhausted = False
+        with self.__create_executor() as executor:
+            while True:
+                # Items whose backoff is over go first, they count against max_in_flight like new items
+                while self.__delayed and self.__delayed[0][0] <= time.monotonic() and len(in_flight) < max_in_flight:
+                    _, _, item = heapq.heappop(self.__delayed)
+                    in_flight[self.__submit(executor, item)] = item
+
+                while not exhausted and len(in_flight) + len(self.__delayed) < max_in_flight:
+                    item = self.__next_item()
+                    if item is None:
+                        exhausted = True
+                        break
+                    in_flight[self.__submit(executor, item)] = item
+
+                if not in_flight and not self.__delayed:
+                    break
+
+                timeout = max(0.0, self.__delayed[0][0] - time.monotonic()) if self.__delayed else None
+                if not in_flight:
+                    time.sleep(timeout)
+                    continue
+                done, _ = wait(in_flight.keys(), timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = in_flight.pop(future)
+                    self.__handle_result(executor, future, item, in_flight)
+
+        summary = {
+            "processed": len(self.succeeded) + len(self.failed),
+            "succeeded": len(self.succeeded),
+            "failed": len(self.failed),
+            "skipped": self.skipped
+        }
+        Logger.info(f"Dispatcher finished: {summary}")
+        return summary
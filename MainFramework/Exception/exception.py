@@ -1,13 +1,16 @@
 import os
-from dotenv import load_dotenv
+import threading
+from collections import deque
+from typing import Optional
 from MainFramework.Common.logger import Logger
-import logging
+from MainFramework.Common.metrics import Metrics
+from MainFramework.Transaction.transaction_journal import TransactionJournal
 
 class SystemException(Exception):
     """
         The exception happens during initialization and get transaction data
     """
-    logger = Logger()
+    logger : Logger = None
     def __init__(self ,*args):
         super().__init__(*args)
     
@@ -19,25 +22,63 @@ class SystemException(Exception):
         """
         # Send email or perform other advanced exception handling
         
+        if cls.logger is None:
+            cls.logger = Logger()
         cls.logger.error(str(exception))
+        # os._exit skips atexit, the queued records and journal transitions have to be written first
+        TransactionJournal.flush_all()
+        Logger.shutdown()
         os._exit(1)
 
 class BusinessException(Exception):
     """
-        The exception happens when facing any errors during automation
+        The exception happens when facing any errors during automation.
+        A failed item is recorded and the process goes on with the next item,
+        max_consecutive_failures failed items in a row are treated as a system failure and end the process (0 never ends it).
+        failed_count counts every failed item, failed_items keeps the last FAILED_ITEMS_KEPT of them
     """
+    FAILED_ITEMS_KEPT = 100
+    max_consecutive_failures : int = 5
+    consecutive_failures : int = 0
+    failed_count : int = 0
+    failed_items : deque = deque(maxlen=FAILED_ITEMS_KEPT)
+    __lock = threading.Lock()
 
     def __init__(self, *args):
         super().__init__(*args)
 
     @classmethod
-    def raise_exception(cls, exception: Exception) -> None:
+    def configure(cls, in_config) -> None:
+        """
+            Apply "max_consecutive_failures" of the config file
+        """
+        cls.max_consecutive_failures = in_config.get("max_consecutive_failures", 5)
+
+    @classmethod
+    def raise_exception(cls, exception: Exception, reference: Optional[str] = None) -> None:
         """
-            Raise business exception
+            Record a failed item and return, so the caller continues with the next item
             -exception: exception retrieves from sub-function
+            -reference: identifier of the failed item
         """
         # Send email or perform other advanced exception handling
         Logger.error((str(exception)))
-        os._exit(1)
-        
-        
\ No newline at end of file
+        Metrics.increment("items_failed_total")
+        with cls.__lock:
+            cls.failed_items.append({"reference": reference, "error": str(exception)})
+            cls.failed_count += 1
+            cls.consecutive_failures += 1
+            consecutive_failures = cls.consecutive_failures
+        Metrics.set_gauge("consecutive_failures", consecutive_failures)
+        if cls.max_consecutive_failures and consecutive_failures >= cls.max_consecutive_failures:
+            # Every item failing in a row points at the system (application down, bad credentials), not at the data
+            SystemException.raise_exception(f"{consecutive_failures} consecutive items failed, last error: {str(exception)}")
+
+    @classmethod
+    def record_success(cls) -> None:
+        """
+            Reset the consecutive failure count after an item succeeded
+        """
+        with cls.__lock:
+            cls.consecutive_failures = 0
+        Metrics.set_gauge("consecutive_failures", 0)
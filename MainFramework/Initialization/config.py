@@ -0,0 +1,166 @@
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+SHEETS = {"settings": "CONFIG_VALUE", "constants": "CONSTANT_VALUE", "assets": "ASSET_VALUE"}
+
+def to_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in ("true", "1", "yes", "y"):
+            return True
+        if text in ("false", "0", "no", "n", ""):
+            return False
+        raise ValueError(f"{value!r} is not a boolean")
+    return bool(value)
+
+def to_int(value: Any) -> int:
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError(f"{value!r} is not a whole number")
+    return int(value)
+
+def to_str(value: Any) -> str:
+    # Numeric cells such as queue names made of digits come back as floats
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+# Known settings of the CONFIG_VALUE sheet: key -> (converter, default, allowed values)
+SETTINGS_SCHEMA : Dict[str, Tuple[Callable[[Any], Any], Any, Optional[tuple]]] = {
+    "max_sysex_retry": (to_int, 3, None),
+    "max_businessex_retry": (to_int, 3, None),
+    "max_consecutive_failures": (to_int, 5, None),
+    "dispatcher_mode": (to_bool, False, None),
+    "max_workers": (to_int, 4, None),
+    "executor_type": (lambda value: to_str(value).lower(), "thread", ("thread", "process")),
+    "transaction_batch_size": (to_int, 10, None),
+    "transaction_buffer_size": (to_int, 50, None),
+    "key_vault_max_concurrency": (to_int, 10, None),
+    "config_hot_reload": (to_bool, False, None),
+    "config_reload_interval": (float, 5.0, None),
+    "metrics_path": (to_str, "", None),
+    "metrics_format": (lambda value: to_str(value).lower(), "prometheus", ("prometheus", "json")),
+    "metrics_export_interval": (float, 0.0, None),
+    "retry_base_delay": (float, 1.0, None),
+    "retry_max_delay": (float, 60.0, None),
+    "retry_jitter": (lambda value: to_str(value).lower(), "full", ("full", "equal", "none")),
+    "integration_max_retries": (to_int, 3, None),
+    "circuit_failure_threshold": (to_int, 5, None),
+    "circuit_recovery_timeout": (float, 30.0, None),
+    "rate_limit_shared": (to_bool, False, None),
+    "rate_limit_state_dir": (to_str, "", None),
+    "journal_enabled": (to_bool, False, None),
+    "journal_path": (to_str, "", None),
+    "journal_batch_size": (to_int, 100, None),
+    "journal_flush_interval": (float, 1.0, None),
+}
+
+# Settings read once at startup, a hot reload changing them only takes effect after a restart.
+# Every other setting is applied at runtime by the listeners registered with ConfigurationInit.on_change
+RESTART_REQUIRED_SETTINGS = (
+    "dispatcher_mode",
+    "max_workers",
+    "executor_type",
+    "transaction_batch_size",
+    "transaction_buffer_size",
+    "key_vault_max_concurrency",
+    "config_hot_reload",
+    "config_reload_interval",
+    "metrics_path",
+    "metrics_format",
+    "metrics_export_interval",
+    "journal_enabled",
+    "journal_path",
+    "journal_batch_size",
+    "journal_flush_interval",
+)
+
+class Config(Mapping):
+    """
+        Immutable, typed configuration parsed from the config workbook:
+            - settings: CONFIG_VALUE sheet, known keys are converted and validated against SETTINGS_SCHEMA
+            - constants: CONSTANT_VALUE sheet, assets: ASSET_VALUE sheet, both optional
+            - Lookups (config["key"], config.get("key")) search settings, then constants, then assets,
+              so code written against the plain config dict keeps working
+    """
+    def __init__(self, settings: dict, constants: Optional[dict] = None, assets: Optional[dict] = None, loaded_at: Optional[datetime] = None) -> None:
+        object.__setattr__(self, "_Config__sections", {
+            "settings": dict(settings),
+            "constants": dict(constants or {}),
+            "assets": dict(assets or {})})
+        object.__setattr__(self, "loaded_at", loaded_at or datetime.now())
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Config is immutable, edit the config file instead")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("Config is immutable, edit the config file instead")
+
+    def __reduce__(self):
+        # Keeps Config picklable for the process pool of the dispatcher
+        sections = self.__sections
+        return (Config, (sections["settings"], sections["constants"], sections["assets"], self.loaded_at))
+
+    @classmethod
+    def from_sheets(cls, sheets: Dict[str, dict]) -> "Config":
+        """
+            Build a validated config from raw Key/Value pairs per section
+            -sheets: {"settings": {...}, "constants": {...}, "assets": {...}}
+            Return: Config
+        """
+        settings = dict(sheets.get("settings") or {})
+        errors = []
+        for key, (converter, default, allowed) in SETTINGS_SCHEMA.items():
+            value = settings.get(key)
+            if value is None or (isinstance(value, float) and value != value):
+                settings[key] = default
+                continue
+            try:
+                settings[key] = converter(value)
+            except (TypeError, ValueError) as e:
+                errors.append(f"{key}: {e}")
+                continue
+            if allowed and settings[key] not in allowed:
+                errors.append(f"{key}: {settings[key]!r} is not one of {', '.join(allowed)}")
+        if errors:
+            raise ValueError("Invalid configuration, " + "; ".join(errors))
+        return cls(settings, sheets.get("constants"), sheets.get("assets"))
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        return dict(self.__sections["settings"])
+
+    @property
+    def constants(self) -> Dict[str, Any]:
+        return dict(self.__sections["constants"])
+
+    @property
+    def assets(self) -> Dict[str, Any]:
+        return dict(self.__sections["assets"])
+
+    def constant(self, key: str, default: Any = None) -> Any:
+        return self.__sections["constants"].get(key, default)
+
+    def asset(self, key: str, default: Any = None) -> Any:
+        return self.__sections["assets"].get(key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        for section in self.__sections.values():
+            if key in section:
+                return section[key]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        seen = set()
+        for section in self.__sections.values():
+            for key in section:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        counts = ", ".join(f"{name}={len(section)}" for name, section in self.__sections.items())
+        return f"Config({counts}, loaded_at={self.loaded_at:%Y-%m-%d %H:%M:%S})"
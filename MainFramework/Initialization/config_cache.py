@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+CACHE_VERSION = 3
+
+class ConfigCache:
+    """
+        Compiled cache of a parsed configuration workbook, so later starts skip pandas and the Excel parsing:
+            - Entries are keyed on the workbook path, mtime and sha256 hash, a changed workbook is parsed again
+            - A workbook with a new mtime but the same content (copied, touched) reuses the cache
+            - cache_path: cache file, defaults to CONFIG_CACHE_PATH or .<workbook name>.cache next to the workbook
+            - The cache is JSON, dates, times, tuples and dicts with non-string keys are stored as {"__type__": ..., "value": ...}
+    """
+    def __init__(self, workbook_path: str, cache_path: Optional[str] = None) -> None:
+        self.workbook_path = os.path.abspath(workbook_path)
+        if not cache_path:
+            cache_path = os.getenv("CONFIG_CACHE_PATH") or os.path.join(
+                os.path.dirname(self.workbook_path), f".{os.path.basename(self.workbook_path)}.cache")
+        self.cache_path = cache_path
+
+    def __hash_workbook(self) -> str:
+        digest = hashlib.sha256()
+        with open(self.workbook_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @classmethod
+    def __encode(cls, value):
+        """
+            Convert a parsed configuration value to JSON, values JSON has no type for are tagged with __type__
+        """
+        if value is None or isinstance(value, (str, bool, int, float)):
+            return value
+        if isinstance(value, datetime):
+            return {"__type__": "datetime", "value": value.isoformat()}
+        if isinstance(value, date):
+            return {"__type__": "date", "value": value.isoformat()}
+        if isinstance(value, time):
+            return {"__type__": "time", "value": value.isoformat()}
+        if isinstance(value, timedelta):
+            return {"__type__": "timedelta", "value": value.total_seconds()}
+        if isinstance(value, tuple):
+            return {"__type__": "tuple", "value": [cls.__encode(item) for item in value]}
+        if isinstance(value, list):
+            return [cls.__encode(item) for item in value]
+        if isinstance(value, dict):
+            if all(isinstance(key, str) for key in value) and "__type__" not in value:
+                return {key: cls.__encode(item) for key, item in value.items()}
+            return {"__type__": "dict", "value": [[cls.__encode(key), cls.__encode(item)] for key, item in value.items()]}
+        raise TypeError(f"Configuration value {value!r} of type {type(value).__name__} can't be cached")
+
+    @classmethod
+    def __decode(cls, value):
+        """
+            Reverse of __encode
+        """
+        if isinstance(value, list):
+            return [cls.__decode(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        match value.get("__type__"):
+            case None:
+                return {key: cls.__decode(item) for key, item in value.items()}
+            case "datetime":
+                return datetime.fromisoformat(value["value"])
+            case "date":
+                return date.fromisoformat(value["value"])
+            case "time":
+                return time.fromisoformat(value["value"])
+            case "timedelta":
+                return timedelta(seconds=value["value"])
+            case "tuple":
+                return tuple(cls.__decode(item) for item in value["value"])
+            case "dict":
+                return {cls.__decode(key): cls.__decode(item) for key, item in value["value"]}
+        raise ValueError(f"Unknown cached value type {value['__type__']}")
+
+    def __read_cache(self) -> Optional[dict]:
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION or cache.get("path") != self.workbook_path:
+                return None
+            cache["data"] = self.__decode(cache["data"])
+        except Exception:
+            # Missing, unreadable, or written by an older version
+            return None
+        return cache
+
+    def __write_cache(self, cache: dict) -> None:
+        temp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            content = json.dumps(dict(cache, data=self.__encode(cache["data"])))
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(temp_path, self.cache_path)
+        except Exception as e:
+            # A read-only Data folder only costs the cache, the configuration itself was read fine
+            print(f"Couldn't write configuration cache {self.cache_path}, due to:\n {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def load(self) -> Optional[dict]:
+        """
+            Return the cached configuration, None if there is no cache or the workbook changed since it was written
+        """
+        cache = self.__read_cache()
+        if cache is None:
+            return None
+        stat = os.stat(self.workbook_path)
+        if cache["mtime_ns"] == stat.st_mtime_ns and cache["size"] == stat.st_size:
+            return cache["data"]
+        if cache["sha256"] != self.__hash_workbook():
+            return None
+        cache["mtime_ns"], cache["size"] = stat.st_mtime_ns, stat.st_size
+        self.__write_cache(cache)
+        return cache["data"]
+
+    def save(self, data: dict) -> None:
+        """
+            Store the parsed configuration of the workbook, data must hold plain python values only
+        """
+        stat = os.stat(self.workbook_path)
+        self.__write_cache({
+            "version": CACHE_VERSION,
+            "path": self.workbook_path,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": self.__hash_workbook(),
+            "data": data})
+
+    @staticmethod
+    def to_native(value):
+        """
+            Convert numpy/pandas scalars read from Excel to plain python values, so the cache loads without pandas
+        """
+        if type(value).__name__ == "NaTType":
+            return None
+        if hasattr(value, "to_pydatetime"):
+            return value.to_pydatetime()
+        if hasattr(value, "item") and type(value).__module__ == "numpy":
+            return value.item()
+        return value
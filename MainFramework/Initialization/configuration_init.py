@@ -1,31 +1,136 @@
 from MainFramework.Initialization.Abstract.abstract_initializor import AbsInitializor
-import pandas as pd
+from MainFramework.Initialization.config import RESTART_REQUIRED_SETTINGS, SHEETS, Config
+from MainFramework.Common.logger import Logger
+from MainFramework.Initialization.config_cache import ConfigCache
+from typing import Callable, List, Optional
 import os
+import threading
 
 class ConfigurationInit(AbsInitializor):
     """
         ConfigurationInit class use to read all configuration in config.xlsx file
     """
-    config : dict = {}
+    config : Config = Config({})
+    __watcher : Optional[threading.Thread] = None
+    __stop_watching = threading.Event()
+    __listeners : List[Callable[[Config], None]] = []
 
     def __init__(self) -> None:
         pass
 
+    @staticmethod
+    def read_workbook(in_config_path: str) -> dict:
+        """
+            Parse the Key/Value columns of every config sheet, pandas is only imported here
+            Sheet "CONFIG_VALUE" is required, "CONSTANT_VALUE" and "ASSET_VALUE" are optional
+            -in_config_path: config_path to get the config object
+            Return: dict of section name to {key: value}
+        """
+        import pandas as pd
+        with pd.ExcelFile(in_config_path) as workbook:
+            sections = {}
+            for section, sheet_name in SHEETS.items():
+                if sheet_name not in workbook.sheet_names:
+                    if section == "settings":
+                        raise Exception(f"Sheet {sheet_name} is missing in {in_config_path}")
+                    sections[section] = {}
+                    continue
+                df = workbook.parse(sheet_name)
+                sections[section] = {key: ConfigCache.to_native(value) for key, value in zip(df['Key'], df['Value'])}
+        return sections
+
+    @classmethod
+    def load(cls, in_config_path: str) -> Config:
+        """
+            Parse and validate the config file, from the compiled cache when the workbook didn't change
+            -in_config_path: config_path to get the config object
+            Return: config : Config
+        """
+        cache = ConfigCache(in_config_path)
+        sections = cache.load()
+        if sections is None:
+            sections = cls.read_workbook(in_config_path)
+            cache.save(sections)
+        return Config.from_sheets(sections)
+
     @classmethod
-    def init(cls, in_config_path: str) -> dict:
+    def init(cls, in_config_path: str) -> Config:
         """
-            Read config file using pandas sheet "CONFIG_VALUE"
+            Read config file sheets "CONFIG_VALUE", "CONSTANT_VALUE" and "ASSET_VALUE" into an immutable Config
+            Hot reload is started when "config_hot_reload" is set
             -in_config_path: config_path to get the config object
-            Return: config : dict
+            Return: config : Config
         """
         try:
             print("Initializing Configuration...")
-            df = pd.read_excel(in_config_path, sheet_name= 'CONFIG_VALUE')
-            for index, row in df.iterrows():
-                key = row['Key']
-                value = row['Value']
-                cls.config[key] = value
+            cls.config = cls.load(in_config_path)
+            if cls.config["config_hot_reload"]:
+                cls.watch(in_config_path, interval = cls.config["config_reload_interval"])
             return cls.config
         except Exception as e:
             raise Exception(f"{os.path.basename(__name__)}-{e}")
+
+    @classmethod
+    def on_change(cls, listener: Callable[[Config], None]) -> None:
+        """
+            Register a callable that receives the new Config after every hot reload, a listener is registered once
+        """
+        if listener not in cls.__listeners:
+            cls.__listeners.append(listener)
+
+    @classmethod
+    def watch(cls, in_config_path: str, interval: float = 5.0) -> None:
+        """
+            Poll the config file every interval seconds and reload it when it changes.
+            An invalid file is reported and the current config is kept.
+            Settings in RESTART_REQUIRED_SETTINGS only take effect after a restart, a warning is logged when they change
+            -in_config_path: config_path to watch
+            -interval: seconds between checks
+            Return: None
+        """
+        if cls.__watcher and cls.__watcher.is_alive():
+            return
+        cls.__stop_watching.clear()
+        # The baseline is taken here, a change made right after watch() returns is not missed by a slow starting thread
+        cls.__watcher = threading.Thread(
+            target=cls.__watch, args=(in_config_path, interval, cls.__signature(in_config_path)), name="config-watcher", daemon=True)
+        cls.__watcher.start()
+
+    @classmethod
+    def stop_watching(cls) -> None:
+        cls.__stop_watching.set()
+        if cls.__watcher:
+            cls.__watcher.join()
+            cls.__watcher = None
+
+    @staticmethod
+    def __signature(in_config_path: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(in_config_path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    @classmethod
+    def __watch(cls, in_config_path: str, interval: float, last_signature: Optional[tuple]) -> None:
+        while not cls.__stop_watching.wait(interval):
+            signature = cls.__signature(in_config_path)
+            if signature is None or signature == last_signature:
+                continue
+            last_signature = signature
+            previous = cls.config
+            try:
+                cls.config = cls.load(in_config_path)
+            except Exception as e:
+                Logger.error(f"Couldn't reload configuration {in_config_path}, keeping the current one. Due to:\n {e}")
+                continue
+            ignored = [key for key in RESTART_REQUIRED_SETTINGS if previous.get(key) != cls.config.get(key)]
+            if ignored:
+                Logger.warning(f"Configuration {', '.join(ignored)} changed, these settings only take effect after a restart")
+            Logger.info(f"Reloaded configuration {in_config_path}")
+            for listener in list(cls.__listeners):
+                try:
+                    listener(cls.config)
+                except Exception as e:
+                    Logger.error(f"Configuration listener failed, due to:\n {e}")
         
@@ -1,6 +1,12 @@
 from MainFramework.Initialization.configuration_init import ConfigurationInit
 from MainFramework.Initialization.application_init import ApplicationInit
+from MainFramework.Initialization.secret_init import SecretInit
+from MainFramework.Initialization.config import Config
 from MainFramework.Common.logger import Logger
+from MainFramework.Common.retry import RetryPolicy
+from MainFramework.Common.rate_limiter import RateLimiter
+from MainFramework.Exception.exception import BusinessException
+from typing import Callable
 
 class Initializator:
     """
@@ -10,24 +16,57 @@ class Initializator:
         pass
     
     @classmethod
-    def program(cls, in_config_path: str) -> dict:
+    def program(cls, in_config_path: str) -> Config:
         """
-            The class uses to initialize all settings which includes Configuration and Relevant Application
+            The class uses to initialize all settings which includes Configuration, Secrets and Relevant Application
             -in_config_path: config_path to get the config object
             Return : None
         """
-        out_config : dict = cls.read_configuration(in_config_path = in_config_path)
+        out_config : Config = cls.read_configuration(in_config_path = in_config_path)
+        cls.apply_runtime_settings(out_config)
+        cls.on_config_change(cls.apply_runtime_settings)
+        cls.prefetch_secrets(config = out_config)
         cls.init_application(config = out_config)
         return out_config
 
     @staticmethod
-    def read_configuration(in_config_path: str) -> dict:
+    def read_configuration(in_config_path: str) -> Config:
         """
             This class uses to read the configuration file in Data folder
             -in_config_path: config_path to get the config object
-            Return: dict
+            Return: Config
         """
-        ConfigurationInit.init(in_config_path=in_config_path)
+        return ConfigurationInit.init(in_config_path=in_config_path)
+
+    @staticmethod
+    def apply_runtime_settings(config : Config) -> None:
+        """
+            Apply the settings that can change while the process runs: integration retries, circuit breakers,
+            rate limits and max_consecutive_failures. Called at startup and after every hot reload
+            -config : config object retrieves from config file
+            Return: None
+        """
+        RetryPolicy.configure_integrations(config)
+        RateLimiter.configure_from(config)
+        BusinessException.configure(config)
+
+    @staticmethod
+    def on_config_change(listener: Callable[[Config], None]) -> None:
+        """
+            Register a callable that receives the new config when hot reload picks up a changed config file
+            -listener: callable taking the new Config
+            Return: None
+        """
+        ConfigurationInit.on_change(listener)
+
+    @staticmethod
+    def prefetch_secrets(config : dict) -> dict:
+        """
+            The class uses to fetch all secrets listed in the config file in parallel before any transaction needs them
+            -config : config object retrieves from config file
+            Return: dict of secret name to value
+        """
+        return SecretInit.init(in_config= config)
 
     @staticmethod
     def init_application(config : dict) -> None:
@@ -0,0 +1,33 @@
+from MainFramework.Initialization.Abstract.abstract_initializor import AbsInitializor
+from MainFramework.Common.integrations import Integrations
+import os
+
+class SecretInit(AbsInitializor):
+    """
+        SecretInit class use to prefetch all secrets listed in the config file from Azure Key Vault in parallel
+    """
+    secrets : dict = {}
+
+    def __init__(self) -> None:
+        pass
+
+    @classmethod
+    def init(cls, in_config : dict) -> dict:
+        """
+            Prefetch secrets named in "key_vault_secrets" (comma separated) from the vault in "key_vault_name"
+            -in_config: config object retrieves from config file
+            Return: secrets : dict
+        """
+        try:
+            vault_name = in_config.get("key_vault_name")
+            secret_names = [name.strip() for name in str(in_config.get("key_vault_secrets") or "").split(",") if name.strip()]
+            if not vault_name or not secret_names:
+                return cls.secrets
+            print("Prefetching Secrets...")
+            key_vault = Integrations.create("key_vault", str(vault_name))
+            cls.secrets = key_vault.PrefetchSecrets(
+                secret_names,
+                max_concurrency = int(in_config.get("key_vault_max_concurrency", 10)))
+            return cls.secrets
+        except Exception as e:
+            raise Exception(f"{os.path.basename(__name__)}-{e}")
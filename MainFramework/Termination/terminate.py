@@ -1,4 +1,3 @@
-import psutil
 import os
 class Terminate:
     def __init__(self) -> None:
@@ -13,6 +12,7 @@ class Terminate:
         # Get the list of all running processes
         try:
             print("Terminate...")
+            import psutil
             all_processes = psutil.process_iter()
 
             # Iterate through each process and terminate it
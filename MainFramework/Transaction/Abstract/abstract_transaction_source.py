@@ -0,0 +1,23 @@
+from abc import abstractmethod
+class AbsTransactionSource:
+    """
+        Base class of every transaction source (queues, spreadsheets, databases, mailboxes, web APIs)
+    """
+    def __init__(self) -> None:
+        pass
+
+    @abstractmethod
+    def fetch_batch(self, batch_size: int) -> list:
+        """
+            Pull up to batch_size items from the source
+            -batch_size: max number of items to retrieve in one round trip
+            Return: list of items, an empty list means the source has no more data
+        """
+        pass
+
+    def close(self) -> None:
+        """
+            Release connections held by the source
+            Return: None
+        """
+        pass
@@ -0,0 +1,101 @@
+import queue
+import threading
+from typing import Optional
+from MainFramework.Transaction.Abstract.abstract_transaction_source import AbsTransactionSource
+
+class PrefetchBuffer:
+    """
+        Pull items from a transaction source in batches on a background thread into a bounded buffer,
+        so the next item is ready as soon as the current one is processed
+            - source: transaction source to pull items from
+            - batch_size: number of items requested from the source per round trip
+            - buffer_size: max number of items held in memory
+    """
+    __END = object()
+
+    def __init__(self, source: AbsTransactionSource, batch_size: int = 10, buffer_size: int = 50) -> None:
+        if batch_size < 1 or buffer_size < 1:
+            raise ValueError("batch_size and buffer_size must be greater than 0")
+        self.source = source
+        self.batch_size = batch_size
+        self.__queue : queue.Queue = queue.Queue(maxsize=buffer_size)
+        self.__stop = threading.Event()
+        self.__lock = threading.Lock()
+        self.__thread : Optional[threading.Thread] = None
+        self.__exception : Optional[Exception] = None
+        self.__exhausted = False
+
+    def start(self) -> None:
+        """
+            Start the background thread if it is not running
+            Return: None
+        """
+        with self.__lock:
+            if self.__exhausted or (self.__thread and self.__thread.is_alive()):
+                return
+            self.__stop.clear()
+            self.__thread = threading.Thread(target=self.__fill, name="transaction-prefetch", daemon=True)
+            self.__thread.start()
+
+    def __put(self, item) -> bool:
+        """
+            Block until there is room in the buffer, give up when the buffer is stopped
+        """
+        while not self.__stop.is_set():
+            try:
+                self.__queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __fill(self) -> None:
+        try:
+            while not self.__stop.is_set():
+                batch = self.source.fetch_batch(self.batch_size)
+                if not batch:
+                    self.__put(self.__END)
+                    return
+                for item in batch:
+                    if not self.__put(item):
+                        return
+        except Exception as e:
+            self.__exception = e
+            self.__put(self.__END)
+
+    def get(self, timeout: Optional[float] = None):
+        """
+            Get the next prefetched item
+            -timeout: max seconds to wait for an item, None waits until the source answers
+            Return: item, None when the source has no more data
+            Raise: TimeoutError when no item arrived within timeout, the source may still have data and get() can be called again
+        """
+        if self.__exhausted:
+            return None
+        if self.__thread is None:
+            self.start()
+        try:
+            item = self.__queue.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No transaction item arrived within {timeout}s")
+        if item is not self.__END:
+            return item
+
+        if self.__exception is not None:
+            # The filler thread stopped on the error, the next get() restarts it from where the source left off
+            self.__thread.join()
+            exception, self.__exception = self.__exception, None
+            self.__thread = None
+            raise Exception(f"Couldn't fetch transaction items, due to:\n {exception}")
+        self.__exhausted = True
+        return None
+
+    def stop(self) -> None:
+        """
+            Stop the background thread and close the source
+            Return: None
+        """
+        self.__stop.set()
+        if self.__thread:
+            self.__thread.join(timeout=5)
+        self.source.close()
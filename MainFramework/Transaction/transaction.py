@@ -1,17 +1,69 @@
+from typing import Optional
+from MainFramework.Transaction.Abstract.abstract_transaction_source import AbsTransactionSource
+from MainFramework.Transaction.transaction_source import SpreadsheetTransactionSource
+from MainFramework.Transaction.prefetch_buffer import PrefetchBuffer
+
 class Transaction:
+    """
+        Transaction step, items are served from a prefetch buffer filled from the registered transaction source
+    """
+    __buffer : Optional[PrefetchBuffer] = None
+
     def __init__(self) -> None:
         pass
 
-    @staticmethod
-    def program(in_config: dict) -> None:
+    @classmethod
+    def set_source(cls, source: AbsTransactionSource, batch_size: int = 10, buffer_size: int = 50) -> None:
+        """
+            Register the source that transaction items are pulled from
+            -source: transaction source (queue, spreadsheet, database, mailbox, web API, ...)
+            -batch_size: number of items requested from the source per round trip
+            -buffer_size: max number of prefetched items held in memory
+            Return: None
+        """
+        if cls.__buffer:
+            cls.__buffer.stop()
+        cls.__buffer = PrefetchBuffer(source=source, batch_size=batch_size, buffer_size=buffer_size)
+        cls.__buffer.start()
+
+    @classmethod
+    def close(cls) -> None:
+        """
+            Stop prefetching and close the registered source
+            Return: None
+        """
+        if cls.__buffer:
+            cls.__buffer.stop()
+            cls.__buffer = None
+
+    @classmethod
+    def program(cls, in_config: dict):
         """
             Get a transaction item from a specified source (e.g., Orchestrator queues, spreadsheets, databases, mailboxes or web APIs).
+            Without a registered source, "transaction_file_path" in the config file is read as a spreadsheet source
+            -in_config: configuration object retrieves from config file
+            Return: transaction item, None when there is no more data to process
         """
-        try:
-            print("Get Transaction Item...")
-            pass
-        except:
-            pass
+        print("Get Transaction Item...")
+        if not cls.__buffer and in_config.get("transaction_file_path"):
+            cls.set_source(
+                source = SpreadsheetTransactionSource(
+                    file_path = str(in_config["transaction_file_path"]),
+                    sheet_name = in_config.get("transaction_sheet_name")
+                ),
+                batch_size = int(in_config.get("transaction_batch_size", 10)),
+                buffer_size = int(in_config.get("transaction_buffer_size", 50))
+            )
+        return cls.get_transaction_item()
 
-    def get_transaction_item() -> None:
-        pass
\ No newline at end of file
+    @classmethod
+    def get_transaction_item(cls, timeout: Optional[float] = None):
+        """
+            Get the next prefetched transaction item
+            -timeout: max seconds to wait for the source
+            Return: transaction item, None when there is no source or no more data
+            Raise: TimeoutError when no item arrived within timeout
+        """
+        if not cls.__buffer:
+            return None
+        return cls.__buffer.get(timeout=timeout)
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+from Data.constant import ItemState
+
+class TransactionJournal:
+    """
+        Append-only journal of transaction item state transitions, kept in a SQLite file (WAL mode):
+            - every transition is appended, the last transition of an item is its current state
+            - transitions are buffered and committed in batches of batch_size, or every flush_interval seconds,
+              a crash loses at most that window and those items are simply processed again
+            - a run that didn't call complete_run() is resumed on the next start: the items that succeeded
+              before the restart are skipped, transitions written by the current run never are. Failed items are processed
+              again, the system failure that stopped the run may have been what made them fail
+            - db_path: SQLite file, defaults to TRANSACTION_JOURNAL_PATH or Data/transaction_journal.db under the working directory
+    """
+    __open_journals : set = set()
+
+    def __init__(self, db_path: Optional[str] = None, batch_size: int = 100, flush_interval: float = 1.0) -> None:
+        if not db_path:
+            db_path = os.getenv("TRANSACTION_JOURNAL_PATH") or os.path.join(os.getcwd(), "Data", "transaction_journal.db")
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.__lock = threading.RLock()
+        self.__pending : list = []
+        self.__done : frozenset = frozenset()
+        self.__occurrences : Dict[str, int] = {}
+        self.__closed = threading.Event()
+        try:
+            self.__connection = sqlite3.connect(db_path, check_same_thread=False)
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("PRAGMA synchronous=NORMAL")
+            self.__connection.execute(
+                """CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    started_at REAL NOT NULL,
+                    resumed_at REAL,
+                    finished_at REAL)""")
+            self.__connection.execute(
+                """CREATE TABLE IF NOT EXISTS transitions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id TEXT NOT NULL,
+                    reference TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    attempt INTEGER NOT NULL,
+                    detail TEXT,
+                    at REAL NOT NULL)""")
+            self.__connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_transitions_run_reference ON transitions (run_id, reference, id)")
+            self.__connection.commit()
+        except Exception as e:
+            raise Exception(f"Couldn't open transaction journal {db_path}, due to:\n {e}")
+        self.run_id, self.resumed = self.__start_run()
+        self.__flusher = threading.Thread(target=self.__flush_periodically, name="journal-flusher", daemon=True)
+        self.__flusher.start()
+        TransactionJournal.__open_journals.add(self)
+
+    @classmethod
+    def from_config(cls, in_config) -> Optional["TransactionJournal"]:
+        """
+            Open the journal when "journal_enabled" is set in the config file, None otherwise
+        """
+        if not in_config.get("journal_enabled"):
+            return None
+        return cls(
+            db_path = in_config.get("journal_path") or None,
+            batch_size = in_config.get("journal_batch_size", 100),
+            flush_interval = in_config.get("journal_flush_interval", 1.0))
+
+    def __start_run(self) -> tuple:
+        """
+            Resume the last unfinished run, or start a new one
+        """
+        row = self.__connection.execute(
+            "SELECT run_id FROM runs WHERE finished_at IS NULL ORDER BY started_at DESC LIMIT 1").fetchone()
+        if row:
+            run_id = row[0]
+            self.__connection.execute("UPDATE runs SET resumed_at = ? WHERE run_id = ?", (time.time(), run_id))
+            # Current state of an item is its last transition, only succeeded items are skipped
+            self.__done = frozenset(reference for reference, in self.__connection.execute(
+                """SELECT t.reference FROM transitions t
+                   JOIN (SELECT reference, MAX(id) AS id FROM transitions WHERE run_id = ? GROUP BY reference) last
+                   ON t.id = last.id WHERE t.state = ?""",
+                (run_id, ItemState.SUCCEEDED.value)))
+            self.__connection.commit()
+            return run_id, True
+        run_id = uuid.uuid4().hex
+        self.__connection.execute("INSERT INTO runs (run_id, started_at) VALUES (?, ?)", (run_id, time.time()))
+        self.__connection.commit()
+        return run_id, False
+
+    @staticmethod
+    def __explicit_reference(data: Any) -> Optional[str]:
+        if isinstance(data, dict):
+            for key in ("reference", "Reference", "id", "ID", "Id"):
+                if data.get(key) not in (None, ""):
+                    return str(data[key])
+        return None
+
+    @staticmethod
+    def reference_for(data: Any, occurrence: int = 0) -> str:
+        """
+            Stable reference of an item across restarts: its "reference" or "id" field,
+            or a hash of its content followed by occurrence, the number of identical items read before it
+        """
+        reference = TransactionJournal.__explicit_reference(data)
+        if reference is not None:
+            return reference
+        content = json.dumps(data, sort_keys=True, default=str)
+        return f"{hashlib.sha1(content.encode('utf-8')).hexdigest()}:{occurrence}"
+
+    def next_reference(self, data: Any) -> str:
+        """
+            Reference of the next item read from the source. Identical items without a reference/id field
+            are told apart by their position among each other, which is the same when the source is read again on resume
+        """
+        if self.__explicit_reference(data) is not None:
+            return self.reference_for(data)
+        key = self.reference_for(data)
+        with self.__lock:
+            occurrence = self.__occurrences.get(key, 0)
+            self.__occurrences[key] = occurrence + 1
+        return self.reference_for(data, occurrence)
+
+    def is_done(self, reference: str) -> bool:
+        """
+            Check whether an item succeeded in the resumed run, before the restart
+        """
+        return reference in self.__done
+
+    def record(self, reference: str, state: ItemState, attempt: int = 0, detail: Optional[str] = None) -> None:
+        """
+            Append a state transition, committed with the next batch
+        """
+        with self.__lock:
+            self.__pending.append((self.run_id, reference, state.value, attempt, detail, time.time()))
+            if len(self.__pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self) -> None:
+        """
+            Commit every buffered transition in one transaction
+        """
+        with self.__lock:
+            if not self.__pending or self.__closed.is_set():
+                return
+            with self.__connection:
+                self.__connection.executemany(
+                    "INSERT INTO transitions (run_id, reference, state, attempt, detail, at) VALUES (?, ?, ?, ?, ?, ?)",
+                    self.__pending)
+            self.__pending.clear()
+
+    def __flush_periodically(self) -> None:
+        while not self.__closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Couldn't flush transaction journal {self.db_path}, due to:\n {e}")
+
+    def summary(self) -> dict:
+        """
+            Number of items per current state in this run
+        """
+        self.flush()
+        with self.__lock:
+            rows = self.__connection.execute(
+                """SELECT t.state, COUNT(*) FROM transitions t
+                   JOIN (SELECT reference, MAX(id) AS id FROM transitions WHERE run_id = ? GROUP BY reference) last
+                   ON t.id = last.id GROUP BY t.state""", (self.run_id,)).fetchall()
+        return {state: count for state, count in rows}
+
+    def complete_run(self) -> None:
+        """
+            Mark the run finished, the next start begins a new run instead of resuming this one
+        """
+        self.flush()
+        with self.__lock:
+            with self.__connection:
+                self.__connection.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (time.time(), self.run_id))
+
+    def close(self) -> None:
+        self.flush()
+        with self.__lock:
+            self.__closed.set()
+            self.__connection.close()
+        TransactionJournal.__open_journals.discard(self)
+
+    @classmethod
+    def flush_all(cls) -> None:
+        """
+            Commit the buffered transitions of every open journal, called before os._exit
+        """
+        for journal in list(cls.__open_journals):
+            try:
+                journal.flush()
+            except Exception as e:
+                print(f"Couldn't flush transaction journal {journal.db_path}, due to:\n {e}")
@@ -0,0 +1,41 @@
+from MainFramework.Transaction.Abstract.abstract_transaction_source import AbsTransactionSource
+from itertools import islice
+from typing import Iterable, Optional
+import os
+
+class ListTransactionSource(AbsTransactionSource):
+    """
+        Transaction source over any iterable or generator, items are pulled lazily
+    """
+    def __init__(self, items: Iterable) -> None:
+        self.__items = iter(items)
+
+    def fetch_batch(self, batch_size: int) -> list:
+        return list(islice(self.__items, batch_size))
+
+class SpreadsheetTransactionSource(AbsTransactionSource):
+    """
+        Transaction source over the rows of an Excel sheet, every row is returned as a dict
+            - file_path: path of the Excel file
+            - sheet_name: sheet to read the rows from
+    """
+    def __init__(self, file_path: str, sheet_name: Optional[str] = None) -> None:
+        self.file_path = file_path
+        self.sheet_name = sheet_name if sheet_name else 0
+        self.__rows : Optional[list] = None
+        self.__position = 0
+
+    def __load(self) -> None:
+        try:
+            import pandas as pd
+            df = pd.read_excel(self.file_path, sheet_name=self.sheet_name)
+            self.__rows = df.to_dict("records")
+        except Exception as e:
+            raise Exception(f"{os.path.basename(__name__)}-Couldn't read transaction items from {self.file_path}, due to:\n {e}")
+
+    def fetch_batch(self, batch_size: int) -> list:
+        if self.__rows is None:
+            self.__load()
+        batch = self.__rows[self.__position:self.__position + batch_size]
+        self.__position += len(batch)
+        return batch
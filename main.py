@@ -6,89 +6,116 @@ from MainFramework.Exception.exception import SystemException, BusinessException
 from MainFramework.Transaction.transaction import Transaction
 from MainFramework.Business.business import Business
 from MainFramework.Termination.terminate import Terminate
+from MainFramework.Dispatcher.dispatcher import Dispatcher
+from MainFramework.Initialization.config import Config
+from MainFramework.Common.metrics import Metrics
+from MainFramework.Common.retry import RetryPolicy
+from MainFramework.Transaction.transaction_journal import TransactionJournal
+from Data.constant import ItemState
+from typing import Optional
 
 max_sysex_retry = 3
-sysex_retry_count = 0
 max_businessex_retry = 3
-businessex_retry_count = 0
 
 class Main:
-    __config = {}
+    __config : Config = Config({})
+    __journal : Optional[TransactionJournal] = None
     load_dotenv()
-    # Logger()
 
     def __init__(self) -> None:
         pass
 
+    @staticmethod
+    def system_policy(name: str, in_config : Config) -> RetryPolicy:
+        """
+                Retry policy of the system stages, "max_sysex_retry" retries with backoff and jitter
+                -name: stage name used in logs and metrics
+                -in_config: configuration object retrieves from config file
+                Return: RetryPolicy
+        """
+        return RetryPolicy.from_config(name, in_config.get("max_sysex_retry", max_sysex_retry), in_config)
+
     @staticmethod
     def initialization() -> None:
         """
             Read Config. Initialize all applications.
-            If facing any errors, re-try based on what users've config
+            If facing any errors, re-try with backoff. The config is not read yet, so the default policy is used
         """
-        global max_sysex_retry
-        global sysex_retry_count
+        def _initialize() -> Config:
+            if not os.getenv("CONFIG_PATH"):
+                raise FileNotFoundError("Can't retrieve config path, CONFIG_PATH is not set")
+            with Metrics.stage("initialization"):
+                return Initializator.program(in_config_path=os.getcwd() + os.getenv('CONFIG_PATH'))
+
         try:
-            if os.getenv("CONFIG_PATH"):
-                Main.__config = Initializator.program(in_config_path=os.getcwd() + os.getenv('CONFIG_PATH'))
-                max_sysex_retry = int(Main.__config["max_sysex_retry"])
-                sysex_retry_count = 0
-            else:
-                raise FileNotFoundError(f"Can't retrieve config path {os.getcwd() + os.getenv('CONFIG_PATH')}")
+            Main.__config = Main.system_policy("initialization", Main.__config).call(_initialize)
+            Initializator.on_config_change(Main.on_config_change)
         except Exception as e:
-            if (sysex_retry_count < max_sysex_retry):
-                sysex_retry_count += 1
-                Logger.info(f"Retry initialization, count: {str(sysex_retry_count)}")
-                Main.initialization()
-            else:
-                print(e)
-                SystemException.raise_exception(f"Initialization step: {str(e)}")
+            print(e)
+            SystemException.raise_exception(f"Initialization step: {str(e)}")
 
     @staticmethod
-    def get_transaction_item(in_config: dict) -> None:
+    def on_config_change(in_config : Config) -> None:
+        """
+                Use a hot reloaded config for the stages run from now on
+                -in_config: new configuration object
+                Return: None
+        """
+        Main.__config = in_config
+
+    @staticmethod
+    def get_transaction_item(in_config: Config):
         """
             Retrieve, set and maintain transactional business data. Decide when process ends.
             -in_config: configuration object retrieves from config file
-            Return: None
+            Return: transaction item, None when there is no more data to process
         """
-        global max_sysex_retry
-        global sysex_retry_count
+        def _get_transaction_item():
+            with Metrics.stage("transaction"):
+                return Transaction.program(in_config = in_config)
+
         try:
-            Transaction.program(in_config = in_config)
-            max_sysex_retry = int(in_config["max_sysex_retry"])
-            sysex_retry_count = 0
+            return Main.system_policy("transaction", in_config).call(_get_transaction_item)
         except Exception as e:
-            if (sysex_retry_count < max_sysex_retry):
-                sysex_retry_count += 1
-                Logger.info(f"Retry get transaction item, count: {str(sysex_retry_count)}")
-                Main.get_transaction_item(in_config)
-            else:
-                print(e)
-                SystemException.raise_exception(f"Transaction step: {str(e)}")
+            print(e)
+            SystemException.raise_exception(f"Transaction step: {str(e)}")
 
     @staticmethod
-    def process(in_config : dict) -> None:
+    def process(in_config : Config, in_transaction_item = None) -> None:
         """
                 Interact with applications opened in init state using data obtained in the data layer
                 A transaction that fails with BusinessException will not retried. All others exception will be retried
+                A failed transaction is recorded and skipped, the process only ends after "max_consecutive_failures" failures in a row
                 -in_config: configuration object retrieves from config file
+                -in_transaction_item: transaction item retrieves from get_transaction_item
                 Return: None
         """
-        global max_businessex_retry
-        global businessex_retry_count
+        journal = Main.__journal
+        reference = journal.next_reference(in_transaction_item) if journal and in_transaction_item is not None else None
+        if reference and journal.is_done(reference):
+            Logger.info(f"Skip item {reference}, it was finished before the restart")
+            return
+        attempt = [0]
+
+        def _process() -> None:
+            if reference:
+                journal.record(reference, ItemState.IN_PROGRESS, attempt[0])
+            attempt[0] += 1
+            with Metrics.stage("business"):
+                Business.program(in_config = in_config, in_transaction_item = in_transaction_item)
+
         try:
-            Business.program(in_config = in_config)
-            max_businessex_retry = int(in_config["max_businessex_retry"])
-            businessex_retry_count = 0
+            RetryPolicy.from_config("business", in_config.get("max_businessex_retry", max_businessex_retry), in_config).call(_process)
+            Metrics.increment("items_processed_total", status="succeeded")
+            if reference:
+                journal.record(reference, ItemState.SUCCEEDED, attempt[0] - 1)
+            BusinessException.record_success()
         except Exception as e:
-            if (businessex_retry_count < max_businessex_retry):
-                businessex_retry_count += 1
-                Logger.info(f"Retry process, count: {str(businessex_retry_count)}")
-                Main.process(in_config)
-            else:
-                print(e)
-                BusinessException.raise_exception(f"Process Business step: {str(e)}")
-            
+            print(e)
+            Metrics.increment("items_processed_total", status="failed")
+            if reference:
+                journal.record(reference, ItemState.FAILED, attempt[0] - 1, str(e))
+            BusinessException.raise_exception(f"Process Business step: {str(e)}", reference)
 
     @staticmethod
     def end_process() -> None:
@@ -96,15 +123,85 @@ class Main:
                 Terminate all process are running
                 Return: None
         """
+        def _end_process() -> None:
+            with Metrics.stage("terminate"):
+                Terminate.program()
+
         try:
-            Terminate.program()
+            Main.system_policy("terminate", Main.__config).call(_end_process)
         except Exception as e:
-            if (sysex_retry_count < max_sysex_retry):
-                sysex_retry_count += 1
-                Logger.info(f"Retry end process, count: {str(sysex_retry_count)}")
-                Main.end_process()
             SystemException.raise_exception(e)
 
+    @staticmethod
+    def dispatch(in_config : Config) -> dict:
+        """
+                Loop over all transaction items and process them concurrently on a bounded pool.
+                Every item keeps its own retry count and backoff instead of sharing one global counter
+                -in_config: configuration object retrieves from config file
+                Return: summary dict of the dispatcher run
+        """
+        dispatcher = Dispatcher(
+            in_config = in_config,
+            max_workers = in_config["max_workers"],
+            executor_type = in_config["executor_type"],
+            max_businessex_retry = in_config["max_businessex_retry"],
+            get_item = Main.get_transaction_item,
+            retry_policy = RetryPolicy.from_config("business", in_config["max_businessex_retry"], in_config),
+            journal = Main.__journal
+        )
+        Initializator.on_config_change(dispatcher.reload)
+        return dispatcher.program()
+
+    @staticmethod
+    def open_journal(in_config : Config) -> Optional[TransactionJournal]:
+        """
+                Open the transaction journal when "journal_enabled" is set, resuming the last unfinished run
+                -in_config: configuration object retrieves from config file
+                Return: TransactionJournal or None
+        """
+        try:
+            journal = TransactionJournal.from_config(in_config)
+            if journal and journal.resumed:
+                Logger.info(f"Resuming run {journal.run_id} from its checkpoint: {journal.summary()}")
+            return journal
+        except Exception as e:
+            print(e)
+            SystemException.raise_exception(f"Journal step: {str(e)}")
+
+    @staticmethod
+    def start_metrics(in_config : Config) -> None:
+        """
+                Export metrics every "metrics_export_interval" seconds to "metrics_path" while the process runs
+                -in_config: configuration object retrieves from config file
+                Return: None
+        """
+        if in_config["metrics_path"] and in_config["metrics_export_interval"] > 0:
+            Metrics.start_exporter(in_config["metrics_path"], in_config["metrics_format"], in_config["metrics_export_interval"])
+
+    @staticmethod
+    def export_metrics(in_config : Config) -> None:
+        """
+                Write the final metrics to "metrics_path" as a Prometheus textfile or a JSON snapshot
+                -in_config: configuration object retrieves from config file
+                Return: None
+        """
+        if not in_config["metrics_path"]:
+            return
+        Metrics.stop_exporter()
+        try:
+            Metrics.export(in_config["metrics_path"], in_config["metrics_format"])
+        except Exception as e:
+            Logger.error(f"Couldn't export metrics to {in_config['metrics_path']}: {str(e)}")
+
+    @staticmethod
+    def is_dispatcher_mode(in_config : Config) -> bool:
+        """
+                Dispatcher mode is turned on by "dispatcher_mode" in the config file
+                -in_config: configuration object retrieves from config file
+                Return: bool
+        """
+        return in_config["dispatcher_mode"]
+
     @classmethod
     def program(self) -> None:
         """
@@ -113,11 +210,28 @@ class Main:
                 -Get Transaction Data
                 -Run Main Business Process
                 -Terminate all process
+            Step 2 and 3 loop until there is no more transaction data, in dispatcher mode on a worker pool
             Return: None
         """
+        Logger()
         self.initialization()
-        self.get_transaction_item(self.__config)
-        self.process(self.__config)
-        #self.end_process()
+        Main.__journal = self.open_journal(self.__config)
+        self.start_metrics(self.__config)
+        try:
+            if self.is_dispatcher_mode(self.__config):
+                self.dispatch(self.__config)
+            else:
+                # Without a transaction source the business step still runs once, with no item
+                transaction_item = self.get_transaction_item(self.__config)
+                self.process(self.__config, transaction_item)
+                while transaction_item is not None and (transaction_item := self.get_transaction_item(self.__config)) is not None:
+                    self.process(self.__config, transaction_item)
+            #self.end_process()
+            # Only a run that got here is finished, otherwise the next start resumes it
+            if Main.__journal:
+                Main.__journal.complete_run()
+                Main.__journal.close()
+        finally:
+            self.export_metrics(self.__config)
 
 Main.program()
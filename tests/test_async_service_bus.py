@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import pytest
+
+pytest.importorskip("azure.servicebus")
+
+from MainFramework.Common.Azure.async_service_bus import AsyncAzureServiceBus
+
+class FakeMessage:
+    def __init__(self, message_id: str) -> None:
+        self.message_id = message_id
+
+class FakeReceiver:
+    def __init__(self, bus: "FakeBus") -> None:
+        self.bus = bus
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.bus.running_at_close.append(self.bus.running)
+        return False
+
+    async def receive_messages(self, max_message_count: int, max_wait_time: float):
+        await asyncio.sleep(0)
+        if self.bus.fail_when_empty and not self.bus.messages:
+            raise PermissionError("receive denied")
+        messages = self.bus.messages[:max_message_count]
+        del self.bus.messages[:max_message_count]
+        return messages
+
+    async def complete_message(self, message):
+        self.bus.settled[message.message_id] = "complete"
+
+    async def abandon_message(self, message):
+        self.bus.settled[message.message_id] = "abandon"
+
+    async def dead_letter_message(self, message, reason=None, error_description=None):
+        self.bus.settled[message.message_id] = "dead letter"
+
+    async def defer_message(self, message):
+        self.bus.settled[message.message_id] = "defer"
+
+class FakeSender:
+    def __init__(self) -> None:
+        self.sent = []
+        self.closed = False
+
+    async def send_messages(self, messages):
+        self.sent.append(messages)
+
+    async def close(self):
+        self.closed = True
+
+class FakeBus:
+    """
+        In-process stand-in for the aio ServiceBusClient
+    """
+    def __init__(self, message_count: int = 0, fail_when_empty: bool = False) -> None:
+        self.messages = [FakeMessage(str(number)) for number in range(message_count)]
+        self.settled = {}
+        self.senders = []
+        self.fail_when_empty = fail_when_empty
+        self.running = 0
+        self.running_at_close = []
+
+    def get_queue_receiver(self, queue_name: str, receive_mode=None):
+        return FakeReceiver(self)
+
+    def get_queue_sender(self, queue_name: str):
+        sender = FakeSender()
+        self.senders.append(sender)
+        return sender
+
+    async def close(self):
+        pass
+
+def test_handlers_run_concurrently_up_to_max_concurrency():
+    bus = FakeBus(message_count=40)
+    running = {"now": 0, "max": 0}
+
+    async def handler(message):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        if message.message_id == "7":
+            raise ValueError("bad message")
+
+    async def run():
+        async with AsyncAzureServiceBus(client_factory=lambda: bus) as service_bus:
+            return await service_bus.ProcessQueueMessages("queue", handler, max_concurrency=5, receiver_count=2, number_of_messages=10, timeout=0)
+
+    summary = asyncio.run(run())
+    assert 1 < running["max"] <= 5
+    assert summary["received"] == 40
+    assert summary["complete"] == 39 and summary["abandon"] == 1
+    assert len(bus.settled) == 40 and bus.settled["7"] == "abandon"
+
+def test_sender_is_reused_and_closed():
+    bus = FakeBus()
+
+    async def run():
+        service_bus = AsyncAzureServiceBus(client_factory=lambda: bus)
+        first = await service_bus.SendMessageToQueue("queue", ["a"])
+        second = await service_bus.SendMessageToQueue("queue", ["b"])
+        await service_bus.close()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first is second
+    assert len(bus.senders) == 1 and bus.senders[0].closed
+
+class FakeStore:
+    def __init__(self, processed: set) -> None:
+        self.processed = processed
+        self.threads = set()
+
+    def is_processed(self, message_id: str) -> bool:
+        self.threads.add(threading.current_thread())
+        return message_id in self.processed
+
+    def mark_processed(self, message_id: str):
+        self.threads.add(threading.current_thread())
+        self.processed.add(message_id)
+
+def test_receive_failure_ends_handlers_before_the_receiver_closes():
+    bus = FakeBus(message_count=5, fail_when_empty=True)
+
+    async def handler(message):
+        bus.running += 1
+        try:
+            await asyncio.sleep(0.05)
+        finally:
+            bus.running -= 1
+
+    async def run():
+        async with AsyncAzureServiceBus(client_factory=lambda: bus) as service_bus:
+            return await service_bus.ProcessQueueMessages("queue", handler, max_concurrency=10, number_of_messages=5, timeout=0)
+
+    with pytest.raises(Exception, match="receive denied"):
+        asyncio.run(run())
+    assert bus.running_at_close == [0]
+
+def test_idempotency_store_runs_off_the_event_loop():
+    bus = FakeBus(message_count=4)
+    store = FakeStore({"0"})
+    handled = []
+
+    async def handler(message):
+        handled.append(message.message_id)
+
+    async def run():
+        async with AsyncAzureServiceBus(client_factory=lambda: bus, idempotency_store=store) as service_bus:
+            return await service_bus.ProcessQueueMessages("queue", handler, timeout=0)
+
+    summary = asyncio.run(run())
+    assert summary["duplicates"] == 1 and sorted(handled) == ["1", "2", "3"]
+    assert store.processed == {"0", "1", "2", "3"}
+    assert threading.main_thread() not in store.threads
@@ -0,0 +1,55 @@
+import threading
+import time
+from MainFramework.Common.cache import TTLCache
+
+def test_entry_expires_after_its_ttl():
+    cache = TTLCache(ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=60)
+    assert cache.get("a") == 1
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.stats()["expirations"] == 1
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_invalidation():
+    cache = TTLCache()
+    for key in [("db", None), ("db", "v2"), ("api", None)]:
+        cache.set(key, "secret")
+    cache.invalidate(("api", None))
+    assert cache.invalidate_where(lambda key: key[0] == "db") == 2
+    assert len(cache) == 0
+
+def test_concurrent_reads_and_writes_keep_the_cache_consistent():
+    cache = TTLCache(max_size=50)
+    errors = []
+
+    def _worker(offset: int):
+        try:
+            for number in range(500):
+                key = (offset + number) % 100
+                cache.set(key, key)
+                value = cache.get(key)
+                assert value is None or value == key
+        except AssertionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=_worker, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    stats = cache.stats()
+    assert stats["size"] <= 50
+    assert stats["hits"] + stats["misses"] == 8 * 500
@@ -0,0 +1,80 @@
+import ast
+import threading
+import pytest
+from unittest import mock
+from MainFramework.Common.logger import Logger
+from MainFramework.Initialization.config import Config
+from MainFramework.Initialization.configuration_init import ConfigurationInit
+
+def test_settings_are_converted_and_defaulted():
+    config = Config.from_sheets({
+        "settings": {"max_workers": 8.0, "dispatcher_mode": "yes", "executor_type": " Process ", "retry_jitter": float("nan")},
+        "constants": {"queue": "orders"}})
+    assert config["max_workers"] == 8 and config["dispatcher_mode"] is True
+    assert config["executor_type"] == "process"
+    assert config["retry_jitter"] == "full"
+    assert config["queue"] == "orders" and config.get("missing") is None
+
+def test_invalid_settings_are_all_reported():
+    with pytest.raises(ValueError) as error:
+        Config.from_sheets({"settings": {"max_workers": 2.5, "executor_type": "fiber", "config_hot_reload": "maybe"}})
+    message = str(error.value)
+    assert "max_workers" in message and "executor_type" in message and "config_hot_reload" in message
+
+def test_config_is_immutable():
+    config = Config.from_sheets({"settings": {}})
+    with pytest.raises(AttributeError):
+        config.max_workers = 2
+
+@pytest.fixture
+def workbook(tmp_path, monkeypatch):
+    """
+        Workbook file whose text is the Python literal of its settings sheet, read_workbook evaluates it instead of parsing Excel
+    """
+    path = tmp_path / "Config.xlsx"
+    monkeypatch.setattr(ConfigurationInit, "read_workbook", staticmethod(lambda in_config_path: {"settings": ast.literal_eval(open(in_config_path).read())}))
+    monkeypatch.setattr(ConfigurationInit, "_ConfigurationInit__listeners", [])
+    monkeypatch.setattr(ConfigurationInit, "config", Config({}))
+    yield path
+    ConfigurationInit.stop_watching()
+
+def reload(path, settings: dict, listener_called: threading.Event) -> None:
+    listener_called.clear()
+    # A different size changes the file signature even within the mtime resolution
+    path.write_text(repr(settings) + " " * len(path.read_text()))
+
+def test_reload_calls_listeners_and_warns_about_restart_only_settings(workbook):
+    workbook.write_text(repr({"max_workers": 2, "retry_base_delay": 1.0}))
+    ConfigurationInit.config = ConfigurationInit.load(str(workbook))
+    reloaded = []
+    called = threading.Event()
+
+    def _listener(config):
+        reloaded.append(config)
+        called.set()
+
+    ConfigurationInit.on_change(_listener)
+    ConfigurationInit.on_change(_listener)
+    with mock.patch.object(Logger, "warning") as warning, mock.patch.object(Logger, "info"):
+        ConfigurationInit.watch(str(workbook), interval=0.02)
+        reload(workbook, {"max_workers": 6, "retry_base_delay": 2.0}, called)
+        assert called.wait(5)
+    assert len(reloaded) == 1
+    assert ConfigurationInit.config["retry_base_delay"] == 2.0
+    warning.assert_called_once()
+    assert "max_workers" in warning.call_args[0][0]
+
+def test_invalid_reload_keeps_the_current_config(workbook):
+    workbook.write_text(repr({"max_workers": 2}))
+    ConfigurationInit.config = ConfigurationInit.load(str(workbook))
+    called = threading.Event()
+    ConfigurationInit.on_change(lambda config: called.set())
+    with mock.patch.object(Logger, "error") as error, mock.patch.object(Logger, "info"):
+        ConfigurationInit.watch(str(workbook), interval=0.02)
+        reload(workbook, {"max_workers": "many"}, called)
+        for _ in range(250):
+            if error.called:
+                break
+            called.wait(0.02)
+    assert error.called and not called.is_set()
+    assert ConfigurationInit.config["max_workers"] == 2
@@ -0,0 +1,41 @@
+import os
+import pickle
+from datetime import date, datetime, time, timedelta
+from MainFramework.Initialization.config_cache import ConfigCache
+
+def workbook(tmp_path, content: bytes = b"workbook"):
+    path = tmp_path / "Config.xlsx"
+    path.write_bytes(content)
+    return str(path)
+
+def test_values_survive_the_cache(tmp_path):
+    sections = {
+        "settings": {"start": datetime(2024, 1, 31, 8, 30), "day": date(2024, 2, 1), "at": time(6, 15),
+                     "every": timedelta(minutes=5), "retries": 3, "ratio": 0.5, "enabled": True, "name": "bot", "empty": None},
+        "constants": {1: "numeric key", "pair": (1, "a")}}
+    ConfigCache(workbook(tmp_path)).save(sections)
+    assert ConfigCache(workbook(tmp_path)).load() == sections
+
+def test_cache_is_json(tmp_path):
+    cache = ConfigCache(workbook(tmp_path))
+    cache.save({"settings": {"start": datetime(2024, 1, 31)}})
+    with open(cache.cache_path, "r", encoding="utf-8") as f:
+        assert '"__type__": "datetime"' in f.read()
+
+def test_pickled_cache_is_ignored(tmp_path):
+    cache = ConfigCache(workbook(tmp_path))
+    with open(cache.cache_path, "wb") as f:
+        pickle.dump({"version": 2, "path": cache.workbook_path, "data": {}}, f)
+    assert cache.load() is None
+
+def test_changed_workbook_is_parsed_again(tmp_path):
+    path = workbook(tmp_path)
+    ConfigCache(path).save({"settings": {"retries": 3}})
+    workbook(tmp_path, b"edited workbook")
+    assert ConfigCache(path).load() is None
+
+def test_unchanged_workbook_with_new_mtime_reuses_the_cache(tmp_path):
+    path = workbook(tmp_path)
+    ConfigCache(path).save({"settings": {"retries": 3}})
+    os.utime(path, ns=(0, 0))
+    assert ConfigCache(path).load() == {"settings": {"retries": 3}}
@@ -0,0 +1,112 @@
+import json
+import pytest
+
+pytest.importorskip("azure.servicebus")
+
+from azure.servicebus.amqp import AmqpMessageBodyType
+from MainFramework.Common.Azure import dead_letter_replay
+from MainFramework.Common.Azure.dead_letter_replay import DeadLetterReplayer, DeadLetterReplayError
+from MainFramework.Common.Azure.service_bus_batch import MessageBatchSender
+
+class FakeMessage:
+    def __init__(self, number: int, reason: str = "replay", body=b"body", body_type=AmqpMessageBodyType.DATA) -> None:
+        self.message_id = str(number)
+        self.sequence_number = number
+        self.dead_letter_reason = reason
+        self.dead_letter_error_description = ""
+        self.body = [body] if body_type == AmqpMessageBodyType.DATA else body
+        self.body_type = body_type
+        self.application_properties = {}
+        self.session_id = self.content_type = self.correlation_id = self.subject = self.to = self.reply_to = None
+
+class FakeReceiver:
+    def __init__(self, bus: "FakeBus") -> None:
+        self.bus = bus
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def receive_messages(self, max_message_count: int, max_wait_time: float):
+        if self.bus.fail:
+            raise ConnectionError("link detached")
+        messages = self.bus.messages[:max_message_count]
+        del self.bus.messages[:max_message_count]
+        return messages
+
+    def complete_message(self, message):
+        self.bus.completed.append(message.message_id)
+
+    def abandon_message(self, message):
+        self.bus.abandoned.append(message.message_id)
+
+class FakeSender:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+class FakeBus:
+    def __init__(self, messages: list, fail: bool = False) -> None:
+        self.messages = messages
+        self.fail = fail
+        self.completed = []
+        self.abandoned = []
+
+    def get_client(self):
+        return self
+
+    def get_queue_receiver(self, queue_name: str, sub_queue=None, receive_mode=None):
+        return FakeReceiver(self)
+
+    def get_queue_sender(self, queue_name: str):
+        return FakeSender()
+
+class FakeLockRenewer:
+    def register(self, receiver, message, max_lock_renewal_duration=None):
+        pass
+
+    def close(self):
+        pass
+
+def fake_send(sender, messages):
+    return [{"message_count": len(list(messages)), "success": True}]
+
+@pytest.fixture
+def replayer(monkeypatch):
+    def _replayer(bus: FakeBus, **kwargs) -> DeadLetterReplayer:
+        monkeypatch.setattr(dead_letter_replay.ServiceBusClientPool, "get_pool", lambda connection_string: bus)
+        monkeypatch.setattr(dead_letter_replay, "AutoLockRenewer", FakeLockRenewer)
+        monkeypatch.setattr(MessageBatchSender, "Send", staticmethod(fake_send))
+        return DeadLetterReplayer("Endpoint=sb://fake/", "queue", receiver_count=1, reason_filter="^replay$", progress_interval=60, **kwargs)
+    return _replayer
+
+def test_value_and_sequence_bodies_are_sent_as_json():
+    value = DeadLetterReplayer.ToReplayMessage(FakeMessage(1, body={"id": 7}, body_type=AmqpMessageBodyType.VALUE))
+    assert json.loads(value.body) == {"id": 7}
+    sequence = DeadLetterReplayer.ToReplayMessage(FakeMessage(2, body=[[1, b"a"], [2]], body_type=AmqpMessageBodyType.SEQUENCE))
+    assert json.loads(sequence.body) == [[1, "a"], [2]]
+    text = DeadLetterReplayer.ToReplayMessage(FakeMessage(3, body="text", body_type=AmqpMessageBodyType.VALUE))
+    assert text.body == "text"
+
+def test_held_messages_over_the_limit_are_abandoned(replayer):
+    bus = FakeBus([FakeMessage(number, reason="keep") for number in range(5)] + [FakeMessage(5)])
+    stats = replayer(bus, batch_size=5, max_held=3).replay()
+    # The two over the limit at once, the three held ones when the worker stops
+    assert bus.abandoned == ["3", "4", "0", "1", "2"]
+    assert stats["skipped"] == 5 and stats["replayed"] == 0
+
+def test_held_messages_do_not_use_up_the_quota(replayer):
+    bus = FakeBus([FakeMessage(0, reason="keep"), FakeMessage(1, reason="keep"), FakeMessage(2),
+                   FakeMessage(3, reason="keep"), FakeMessage(4), FakeMessage(5)])
+    stats = replayer(bus, batch_size=10).replay(max_messages=2)
+    assert bus.completed == ["2", "4"]
+    assert stats["replayed"] == 2 and stats["skipped"] == 3
+
+def test_worker_failure_is_raised(replayer):
+    with pytest.raises(DeadLetterReplayError) as error:
+        replayer(FakeBus([], fail=True)).replay()
+    assert isinstance(error.value.errors[0], ConnectionError)
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+from MainFramework.Common.Azure.deferred_index import DeferredMessageIndex
+
+def test_due_messages_come_oldest_first_per_queue(tmp_path):
+    index = DeferredMessageIndex(str(tmp_path / "deferred.db"))
+    now = datetime.now()
+    index.add("queue", 3, due_at=now - timedelta(minutes=1))
+    index.add("queue", 1, due_at=now - timedelta(minutes=5))
+    index.add("queue", 2, due_at=now + timedelta(hours=1))
+    index.add("other", 4, due_at=now - timedelta(minutes=10))
+    assert index.due("queue") == [1, 3]
+    assert index.due("queue", limit=1) == [1]
+    assert index.due("queue", now=now + timedelta(hours=2)) == [1, 3, 2]
+    assert index.count("queue") == 3 and index.count() == 4
+    index.close()
+
+def test_deferring_again_replaces_the_entry(tmp_path):
+    index = DeferredMessageIndex(str(tmp_path / "deferred.db"))
+    index.add("queue", 1, message_id="a", reason="waiting for approval", due_at=0)
+    index.add("queue", 1, message_id="a", reason="approver away", due_at=100)
+    entry = index.get("queue", 1)
+    assert entry["message_id"] == "a" and entry["reason"] == "approver away" and entry["due_at"] == 100
+    assert index.count() == 1
+    assert index.get("queue", 2) is None
+    index.close()
+
+def test_removed_messages_are_gone_after_reopening(tmp_path):
+    path = str(tmp_path / "deferred.db")
+    index = DeferredMessageIndex(path)
+    for sequence_number in (1, 2, 3):
+        index.add("queue", sequence_number, due_at=0)
+    index.remove("queue", [1, 3])
+    index.close()
+
+    reopened = DeferredMessageIndex(path)
+    assert reopened.due("queue") == [2]
+    reopened.close()
+
+def test_default_path_comes_from_the_environment(tmp_path, monkeypatch):
+    path = str(tmp_path / "from_env.db")
+    monkeypatch.setenv("DEFERRED_INDEX_PATH", path)
+    index = DeferredMessageIndex()
+    assert index.db_path == path
+    index.close()
@@ -0,0 +1,94 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+from MainFramework.Common.logger import Logger
+from MainFramework.Common.retry import RetryPolicy
+from MainFramework.Dispatcher.dispatcher import Dispatcher
+from MainFramework.Exception.exception import BusinessException
+
+def source(rows: list):
+    iterator = iter(rows)
+    return lambda in_config: next(iterator, None)
+
+def policy(base_delay: float = 0.05) -> RetryPolicy:
+    return RetryPolicy(name="business", max_retries=3, base_delay=base_delay, jitter="none")
+
+def test_failed_item_is_retried_after_its_backoff():
+    attempts = []
+
+    def _business(in_config, item):
+        attempts.append(time.monotonic())
+        if len(attempts) < 3:
+            raise ConnectionError("application busy")
+
+    with mock.patch("MainFramework.Dispatcher.dispatcher.Business.program", side_effect=_business):
+        summary = Dispatcher({}, max_workers=1, get_item=source(["a"]), retry_policy=policy()).program()
+    assert summary["succeeded"] == 1 and summary["failed"] == 0
+    # base_delay * multiplier ** (n - 1): 0.05s then 0.1s
+    assert attempts[1] - attempts[0] >= 0.05
+    assert attempts[2] - attempts[1] >= 0.1
+
+def test_waiting_item_does_not_hold_a_worker():
+    calls = []
+
+    def _business(in_config, item):
+        calls.append(item)
+        if calls.count(item) == 1 and item == "a":
+            raise ConnectionError("application busy")
+
+    with mock.patch("MainFramework.Dispatcher.dispatcher.Business.program", side_effect=_business):
+        summary = Dispatcher({}, max_workers=1, get_item=source(["a", "b"]), retry_policy=policy(base_delay=0.2)).program()
+    assert calls == ["a", "b", "a"]
+    assert summary["succeeded"] == 2
+
+def test_fatal_error_fails_the_item_without_retry():
+    dispatcher = Dispatcher({}, max_workers=2, get_item=source(["a", "b"]), retry_policy=policy())
+
+    def _business(in_config, item):
+        if item == "a":
+            raise FileNotFoundError("input file missing")
+
+    with mock.patch("MainFramework.Dispatcher.dispatcher.Business.program", side_effect=_business) as business, \
+         mock.patch.object(BusinessException, "raise_exception") as raise_exception:
+        summary = dispatcher.program()
+    assert business.call_count == 2
+    assert summary == {"processed": 2, "succeeded": 1, "failed": 1, "skipped": 0}
+    assert [item.data for item in dispatcher.failed] == ["a"]
+    assert isinstance(dispatcher.failed[0].exception, FileNotFoundError)
+    raise_exception.assert_called_once()
+
+def test_retry_budget_is_per_item():
+    with mock.patch("MainFramework.Dispatcher.dispatcher.Business.program", side_effect=ConnectionError("down")) as business, \
+         mock.patch.object(BusinessException, "raise_exception"):
+        summary = Dispatcher({}, max_workers=2, max_businessex_retry=1, get_item=source(["a", "b"]), retry_policy=policy(0.01)).program()
+    assert business.call_count == 4
+    assert summary["failed"] == 2
+
+def test_process_executor_runs_items():
+    summary = Dispatcher({}, max_workers=2, executor_type="process", get_item=source(["a", "b", "c"])).program()
+    assert summary["succeeded"] == 3
+
+def log_from_worker(message: str) -> None:
+    Logger.info(message)
+
+class ListHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.messages.append(record.getMessage())
+
+def test_worker_process_records_reach_the_parent_logger():
+    handler = ListHandler()
+    parent_logger = logging.getLogger("MainFramework.Common.logger")
+    parent_logger.addHandler(handler)
+    try:
+        with ProcessPoolExecutor(max_workers=1, initializer=Logger.setup_worker, initargs=(Logger.worker_queue(),)) as executor:
+            executor.submit(log_from_worker, "from the worker").result()
+        Logger.flush()
+        assert "from the worker" in handler.messages
+    finally:
+        parent_logger.removeHandler(handler)
+        Logger.shutdown()
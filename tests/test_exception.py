@@ -0,0 +1,37 @@
+from unittest import mock
+import pytest
+from MainFramework.Exception.exception import BusinessException, SystemException
+
+@pytest.fixture(autouse=True)
+def reset_failures():
+    BusinessException.record_success()
+    BusinessException.failed_items.clear()
+    BusinessException.failed_count = 0
+    yield
+    BusinessException.max_consecutive_failures = 5
+
+def test_failed_item_does_not_end_the_process():
+    BusinessException.max_consecutive_failures = 3
+    with mock.patch.object(SystemException, "raise_exception") as system_exception:
+        BusinessException.raise_exception("bad row", "1")
+        BusinessException.raise_exception("bad row", "2")
+        BusinessException.record_success()
+        BusinessException.raise_exception("bad row", "3")
+        BusinessException.raise_exception("bad row", "4")
+    system_exception.assert_not_called()
+    assert BusinessException.failed_count == 4
+
+def test_consecutive_failures_end_the_process():
+    BusinessException.max_consecutive_failures = 2
+    with mock.patch.object(SystemException, "raise_exception") as system_exception:
+        BusinessException.raise_exception("application down", "1")
+        BusinessException.raise_exception("application down", "2")
+    system_exception.assert_called_once()
+
+def test_failed_items_are_capped():
+    BusinessException.max_consecutive_failures = 0
+    for number in range(BusinessException.FAILED_ITEMS_KEPT + 10):
+        BusinessException.raise_exception("bad row", str(number))
+    assert BusinessException.failed_count == BusinessException.FAILED_ITEMS_KEPT + 10
+    assert len(BusinessException.failed_items) == BusinessException.FAILED_ITEMS_KEPT
+    assert BusinessException.failed_items[-1]["reference"] == str(BusinessException.FAILED_ITEMS_KEPT + 9)
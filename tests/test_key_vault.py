@@ -0,0 +1,80 @@
+import importlib.util
+import itertools
+import sys
+import pytest
+
+pytest.importorskip("azure.keyvault.secrets")
+
+from MainFramework.Common.integrations import Integrations
+
+AzureKeyVault = Integrations.get("key_vault")
+key_vault_module = sys.modules[AzureKeyVault.__module__]
+__vaults = itertools.count()
+
+class FakeSecret:
+    def __init__(self, value: str) -> None:
+        self.value = value
+
+class FakeClient:
+    def __init__(self) -> None:
+        self.fetched = []
+
+    def get_secret(self, secret_name: str, secret_version=None, **kwargs):
+        self.fetched.append(secret_name)
+        return FakeSecret(f"value of {secret_name}")
+
+def vault(monkeypatch, client: FakeClient):
+    key_vault = AzureKeyVault(f"test-vault-{next(__vaults)}")
+    monkeypatch.setattr(key_vault, "_AzureKeyVault__auth", lambda: client)
+    return key_vault
+
+def test_cached_secret_is_not_fetched_again(monkeypatch):
+    client = FakeClient()
+    key_vault = vault(monkeypatch, client)
+    assert key_vault.GetSecret("db") == "value of db"
+    assert key_vault.GetSecret("db") == "value of db"
+    assert key_vault.GetSecret("db", use_cache=False) == "value of db"
+    assert client.fetched == ["db", "db"]
+
+def test_concurrent_prefetch_fetches_only_missing_secrets(monkeypatch):
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name, *args: None)
+    client = FakeClient()
+    key_vault = vault(monkeypatch, client)
+    key_vault.GetSecret("db")
+    secrets = key_vault.PrefetchSecrets(["db", "api", "smtp", "api"], max_concurrency=3)
+    assert secrets == {"db": "value of db", "api": "value of api", "smtp": "value of smtp"}
+    assert sorted(client.fetched) == ["api", "db", "smtp"]
+    assert key_vault.GetCacheStats()["size"] == 3
+
+def test_async_prefetch_reuses_the_shared_credential(monkeypatch):
+    import azure.identity.aio
+    from azure.keyvault.secrets import aio
+
+    credentials = []
+
+    class AsyncSecretClient:
+        def __init__(self, vault_url: str, credential) -> None:
+            credentials.append(credential)
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *args):
+            pass
+
+        async def get_secret(self, secret_name: str):
+            return FakeSecret(f"value of {secret_name}")
+
+    def _no_new_credential(**kwargs):
+        raise AssertionError("a new async credential was created")
+
+    real_find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name, *args: object() if name == "aiohttp" else real_find_spec(name, *args))
+    monkeypatch.setattr(aio, "SecretClient", AsyncSecretClient)
+    monkeypatch.setattr(azure.identity.aio, "ClientSecretCredential", _no_new_credential)
+    first = AzureKeyVault(f"test-vault-{next(__vaults)}")
+    second = AzureKeyVault(f"test-vault-{next(__vaults)}")
+    assert first.PrefetchSecrets(["db"]) == {"db": "value of db"}
+    assert second.PrefetchSecrets(["api"]) == {"api": "value of api"}
+    assert all(isinstance(credential, key_vault_module.SharedAsyncCredential) for credential in credentials)
+    assert credentials[0].credential is credentials[1].credential
@@ -0,0 +1,89 @@
+import logging
+import os
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler
+import pytest
+from MainFramework.Common.logger import Logger, RotatingBatchFileHandler, SegmentCompressor
+
+def record(message: str) -> logging.LogRecord:
+    return logging.LogRecord("test", logging.INFO, __file__, 0, message, None, None)
+
+@pytest.fixture
+def log_file(tmp_path, monkeypatch):
+    """
+        Log file of a Logger writing under tmp_path, batches large enough that only a flush writes them
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("AUTOMATION_LOGS", "logs")
+    monkeypatch.setenv("PROCESS_NAME", "bot")
+    monkeypatch.setenv("LOG_BATCH_SIZE", "1000")
+    monkeypatch.setenv("LOG_FLUSH_INTERVAL", "60")
+    monkeypatch.setenv("LOG_COMPRESS", "false")
+    (tmp_path / "logs").mkdir()
+    Logger.shutdown()
+    logger = Logger(format_type="%(levelname)s - %(message)s")
+    yield logger.file_path
+    Logger.shutdown()
+
+def read(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+def test_flush_writes_queued_records_and_keeps_logging(log_file):
+    Logger.info("first")
+    Logger.error("second")
+    Logger.flush()
+    assert read(log_file) == "INFO - first\nERROR - second\n"
+    Logger.warning("after flush")
+    Logger.flush()
+    assert read(log_file).endswith("WARNING - after flush\n")
+
+def test_shutdown_writes_pending_records(log_file):
+    Logger.info("pending")
+    Logger.shutdown()
+    assert read(log_file) == "INFO - pending\n"
+    # Flushing a stopped Logger is a no-op
+    Logger.flush()
+
+def test_setting_up_again_adds_no_handler(log_file):
+    Logger()
+    Logger.info("once")
+    Logger.flush()
+    handlers = logging.getLogger("MainFramework.Common.logger").handlers
+    assert len([handler for handler in handlers if isinstance(handler, QueueHandler)]) == 1
+    assert read(log_file) == "INFO - once\n"
+
+def test_rollover_to_a_new_date_opens_a_file_under_the_new_name(tmp_path):
+    pattern = str(tmp_path / "%H%M%S-bot.log")
+    first_path = datetime.now().strftime(pattern)
+    handler = RotatingBatchFileHandler(first_path, batch_size=1, when="S", compress=False, filename_pattern=pattern,
+                                       segment_patterns=[str(tmp_path / "*-bot.log")])
+    handler.emit(record("before"))
+    time.sleep(1.1)
+    handler.emit(record("after"))
+    handler.close()
+    assert handler.baseFilename != os.path.abspath(first_path)
+    with open(first_path, encoding="utf-8") as f:
+        assert f.read() == "before\n"
+    with open(handler.baseFilename, encoding="utf-8") as f:
+        assert f.read() == "after\n"
+
+def test_close_does_not_wait_for_compression(tmp_path, monkeypatch):
+    def _wait():
+        raise AssertionError("close waited for the compressor")
+
+    monkeypatch.setattr(SegmentCompressor, "wait", _wait)
+    handler = RotatingBatchFileHandler(str(tmp_path / "bot.log"), batch_size=1, max_bytes=1)
+    handler.emit(record("first"))
+    handler.emit(record("second"))
+    handler.close()
+
+def test_uncompressed_segment_is_compressed_on_next_start(tmp_path):
+    segment = tmp_path / "bot.20240101-000000.log"
+    segment.write_text("left by the previous run\n", encoding="utf-8")
+    handler = RotatingBatchFileHandler(str(tmp_path / "bot.log"), retention_days=0)
+    SegmentCompressor.wait()
+    handler.close()
+    assert not segment.exists()
+    assert (tmp_path / "bot.20240101-000000.log.gz").exists()
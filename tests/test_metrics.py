@@ -0,0 +1,90 @@
+import re
+import pytest
+from MainFramework.Common.metrics import Histogram, Metrics
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{([a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*",?)*\})? (\S+)$')
+
+@pytest.fixture(autouse=True)
+def registry():
+    Metrics.reset()
+    yield
+    Metrics.reset()
+
+def family(name: str, types: dict) -> str:
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix) and types.get(name[:-len(suffix)]) == "histogram":
+            return name[:-len(suffix)]
+    return name
+
+def test_counters_aggregate_per_label_set():
+    Metrics.increment("items_processed_total", status="succeeded")
+    Metrics.increment("items_processed_total", 2, status="succeeded")
+    Metrics.increment("items_processed_total", status="failed")
+    Metrics.increment("retries_total", stage="business", integration="sharepoint")
+    Metrics.increment("retries_total", integration="sharepoint", stage="business")
+    counters = {(counter["name"], tuple(sorted(counter["labels"].items()))): counter["value"] for counter in Metrics.snapshot()["counters"]}
+    assert counters[("items_processed_total", (("status", "succeeded"),))] == 3
+    assert counters[("items_processed_total", (("status", "failed"),))] == 1
+    assert counters[("retries_total", (("integration", "sharepoint"), ("stage", "business")))] == 2
+
+def test_timer_records_duration_and_counts_errors():
+    with Metrics.timer("stage_duration_seconds", stage="business"):
+        pass
+    with pytest.raises(KeyError):
+        with Metrics.timer("stage_duration_seconds", stage="business"):
+            raise KeyError("missing")
+    histogram = Metrics.snapshot()["histograms"][0]
+    assert histogram["name"] == "stage_duration_seconds" and histogram["count"] == 2
+    errors = Metrics.snapshot()["counters"][0]
+    assert errors["name"] == "stage_errors_total" and errors["labels"] == {"exception": "KeyError", "stage": "business"}
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1, 10))
+    for value in (0.05, 0.5, 0.7, 5, 50):
+        histogram.observe(value)
+    assert histogram.cumulative() == [(0.1, 1), (1, 3), (10, 4)]
+    assert histogram.count == 5 and histogram.min == 0.05 and histogram.max == 50
+
+def test_prometheus_exposition_format():
+    Metrics.increment("items_processed_total", status="succeeded")
+    Metrics.increment("retries_total", stage="business")
+    Metrics.increment("items_processed_total", status='bad "quote" \\ slash')
+    Metrics.set_gauge("circuit_breaker_open", 1, integration="sharepoint")
+    Metrics.observe("stage_duration_seconds", 0.3, stage="business")
+    text = Metrics.to_prometheus()
+    assert text.endswith("\n")
+    types = {}
+    finished = set()
+    current = None
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            assert name not in types
+            types[name] = kind
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name = family(match.group(1), types)
+        assert name in types, f"{name} has no TYPE line before its samples"
+        # Every sample of a metric family is in one group
+        if name != current:
+            assert name not in finished, f"{name} is split into several groups"
+            if current:
+                finished.add(current)
+            current = name
+        float(match.group(5))
+    assert types["automation_items_processed_total"] == "counter"
+    assert types["automation_stage_duration_seconds"] == "histogram"
+    assert 'status="bad \\"quote\\" \\\\ slash"' in text
+    assert 'automation_stage_duration_seconds_bucket{stage="business",le="0.5"} 1' in text
+    assert 'automation_stage_duration_seconds_bucket{stage="business",le="+Inf"} 1' in text
+    assert 'automation_stage_duration_seconds_count{stage="business"} 1' in text
+
+def test_export_writes_the_whole_file(tmp_path):
+    Metrics.increment("items_processed_total", status="succeeded")
+    path = tmp_path / "automation.prom"
+    Metrics.export(str(path))
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert lines[:2] == ["# TYPE automation_items_processed_total counter", 'automation_items_processed_total{status="succeeded"} 1']
+    assert lines[-1].startswith("automation_items_per_minute ")
+    assert list(tmp_path.iterdir()) == [path]
@@ -0,0 +1,24 @@
+import threading
+import pytest
+from MainFramework.Transaction.Abstract.abstract_transaction_source import AbsTransactionSource
+from MainFramework.Transaction.prefetch_buffer import PrefetchBuffer
+
+class SlowSource(AbsTransactionSource):
+    def __init__(self, items: list) -> None:
+        self.items = items
+        self.ready = threading.Event()
+
+    def fetch_batch(self, batch_size: int) -> list:
+        self.ready.wait(5)
+        batch, self.items = self.items[:batch_size], self.items[batch_size:]
+        return batch
+
+def test_timeout_is_not_the_end_of_data():
+    source = SlowSource(["a"])
+    buffer = PrefetchBuffer(source, batch_size=1, buffer_size=1)
+    with pytest.raises(TimeoutError):
+        buffer.get(timeout=0.05)
+    source.ready.set()
+    assert buffer.get(timeout=5) == "a"
+    assert buffer.get(timeout=5) is None
+    buffer.stop()
@@ -0,0 +1,189 @@
+import asyncio
+import itertools
+import threading
+import time
+import pytest
+from MainFramework.Common.rate_limiter import RateLimiter, retry_after_from
+from MainFramework.Common.retry import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+__names = itertools.count()
+
+def open_breaker(recovery_timeout: float = 0.05):
+    """
+        Return (name, breaker) of a fresh breaker opened by one failure, its recovery timeout already over
+    """
+    name = f"test_breaker_{next(__names)}"
+    breaker = CircuitBreaker.get(name)
+    breaker.failure_threshold = 1
+    breaker.recovery_timeout = recovery_timeout
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(recovery_timeout * 2)
+    return name, breaker
+
+def guarded(name: str, function):
+    return RetryPolicy.integration(name, retry=False)(function)
+
+class Throttled(Exception):
+    def __init__(self, retry_after: float) -> None:
+        super().__init__("429 Too Many Requests")
+        self.retry_after = retry_after
+
+def test_failed_trial_reopens_circuit():
+    name, breaker = open_breaker()
+
+    def _fail():
+        raise ConnectionError("service down")
+
+    with pytest.raises(ConnectionError):
+        guarded(name, _fail)()
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_fatal_trial_closes_circuit():
+    name, breaker = open_breaker()
+
+    def _missing():
+        raise FileNotFoundError("no such file")
+
+    with pytest.raises(FileNotFoundError):
+        guarded(name, _missing)()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert guarded(name, lambda: "ok")() == "ok"
+
+def test_throttled_trial_reopens_circuit_for_retry_after():
+    name, breaker = open_breaker()
+
+    def _throttled():
+        raise Throttled(0.5)
+
+    with pytest.raises(Throttled):
+        guarded(name, _throttled)()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.retry_after > 0.3
+
+def test_interrupted_trial_is_released():
+    name, breaker = open_breaker()
+
+    def _interrupted():
+        raise KeyboardInterrupt()
+
+    with pytest.raises(KeyboardInterrupt):
+        guarded(name, _interrupted)()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert guarded(name, lambda: "ok")() == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_successful_trial_closes_circuit():
+    name, breaker = open_breaker()
+    assert guarded(name, lambda: "ok")() == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_wrapped_errors_are_classified_through_the_chain():
+    policy = RetryPolicy()
+    try:
+        try:
+            raise FileNotFoundError("404 Not Found")
+        except FileNotFoundError as e:
+            raise Exception("Couldn't download file") from e
+    except Exception as e:
+        assert not policy.is_retryable(e)
+
+def test_exception_group_is_retryable_when_one_failure_is():
+    policy = RetryPolicy()
+    assert not policy.is_retryable(ExceptionGroup("secrets", [FileNotFoundError("a"), PermissionError("b")]))
+    assert policy.is_retryable(ExceptionGroup("secrets", [FileNotFoundError("a"), ConnectionError("b")]))
+
+def test_exception_group_waits_for_longest_retry_after():
+    assert retry_after_from(ExceptionGroup("secrets", [Throttled(2), ConnectionError("b"), Throttled(5)])) == 5
+    assert retry_after_from(ExceptionGroup("secrets", [ConnectionError("b")])) is None
+
+def test_chain_is_classified_without_exception_groups(monkeypatch):
+    # Python < 3.11 has no BaseExceptionGroup
+    from MainFramework.Common import retry
+    monkeypatch.setattr(retry, "BASE_EXCEPTION_GROUP", ())
+    policy = RetryPolicy()
+    assert policy.is_retryable(ConnectionError("reset"))
+    assert not policy.is_retryable(FileNotFoundError("a"))
+
+class HttpError(Exception):
+    def __init__(self, status_code: int) -> None:
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+def test_client_errors_are_not_retried():
+    policy = RetryPolicy()
+    assert not policy.is_retryable(HttpError(404))
+    assert policy.is_retryable(HttpError(500))
+
+def test_async_acquire_waits_without_threads():
+    limiter = RateLimiter(f"test_limiter_{next(__names)}", rate=20, capacity=1)
+
+    async def run():
+        started = time.monotonic()
+        await asyncio.gather(*[limiter.acquire_async() for _ in range(5)])
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+    # One token is there at once, the four others come in at 20 per second
+    assert 0.15 <= elapsed < 1.0
+    assert limiter.current_wait() > 0
+
+def test_async_acquire_honours_penalty():
+    limiter = RateLimiter(f"test_limiter_{next(__names)}")
+    limiter.penalize(0.2)
+    waited = asyncio.run(limiter.acquire_async())
+    assert waited >= 0.15
+
+def test_open_circuit_is_not_a_throttling_response():
+    assert retry_after_from(CircuitOpenError("inner", 30)) is None
+    try:
+        try:
+            raise CircuitOpenError("inner", 30)
+        except CircuitOpenError as e:
+            raise Exception("Couldn't prefetch secrets") from e
+    except Exception as e:
+        assert retry_after_from(e) is None
+
+def test_nested_open_circuit_does_not_penalize_the_outer_integration():
+    inner_name = f"test_breaker_{next(__names)}"
+    inner = CircuitBreaker.get(inner_name)
+    inner.failure_threshold = 1
+    inner.recovery_timeout = 60
+    inner.record_failure()
+    outer_name = f"test_breaker_{next(__names)}"
+    outer = CircuitBreaker.get(outer_name)
+    outer.failure_threshold = 1
+
+    def _outer():
+        try:
+            guarded(inner_name, lambda: "never called")()
+        except CircuitOpenError as e:
+            raise Exception("Couldn't prefetch secrets") from e
+
+    with pytest.raises(Exception):
+        guarded(outer_name, _outer)()
+    assert outer.state == CircuitBreaker.CLOSED
+    assert RateLimiter.get(outer_name).current_wait() == 0
+
+def test_reconfigured_limiter_keeps_its_penalty():
+    name = f"test_limiter_{next(__names)}"
+    RateLimiter.configure(name, rate=10)
+    RateLimiter.get(name).penalize(5)
+    RateLimiter.configure_from({f"rate_limit_{name}": "20/s"})
+    limiter = RateLimiter.get(name)
+    assert limiter.rate == 20
+    assert limiter.current_wait() > 4
+
+def test_shared_async_acquire_reads_the_bucket_off_the_event_loop(tmp_path, monkeypatch):
+    limiter = RateLimiter(f"test_limiter_{next(__names)}", rate=100, state_path=str(tmp_path / "limiter.json"))
+    threads = []
+
+    def _update(update):
+        threads.append(threading.current_thread())
+        return update({"tokens": 1.0, "updated_at": time.time(), "blocked_until": 0.0})
+
+    monkeypatch.setattr(limiter, "_RateLimiter__update_shared", _update)
+    asyncio.run(limiter.acquire_async())
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,166 @@
+import sys
+import pytest
+
+pytest.importorskip("azure.servicebus")
+
+from Data.constant import SettleType
+from MainFramework.Common.Azure.deferred_index import DeferredMessageIndex
+from MainFramework.Common.idempotency_store import IdempotencyStore
+from MainFramework.Common.integrations import Integrations
+
+AzureServiceBus = Integrations.get("service_bus")
+service_bus = sys.modules[AzureServiceBus.__module__]
+
+class FakeMessage:
+    def __init__(self, number: int, state=None) -> None:
+        self.message_id = str(number)
+        self.sequence_number = number
+        self.state = state
+
+class FakeReceiver:
+    def __init__(self, messages: list) -> None:
+        self.messages = messages
+        self.settled = []
+        self.lost = set()
+        self.expired = set()
+        self.requests = []
+
+    def receive_messages(self, max_message_count: int, max_wait_time: float):
+        messages = self.messages[:max_message_count]
+        del self.messages[:max_message_count]
+        return messages
+
+    def __check_lock(self, message):
+        if message.message_id in self.lost:
+            raise RuntimeError(f"lock lost for {message.message_id}")
+
+    def complete_message(self, message):
+        self.__check_lock(message)
+        self.settled.append((message.message_id, "complete"))
+
+    def abandon_message(self, message):
+        self.__check_lock(message)
+        self.settled.append((message.message_id, "abandon"))
+
+    def dead_letter_message(self, message, reason=None, error_description=None):
+        self.__check_lock(message)
+        self.settled.append((message.message_id, "dead letter", reason, error_description))
+
+    def defer_message(self, message):
+        self.__check_lock(message)
+        self.settled.append((message.message_id, "defer"))
+
+    def receive_deferred_messages(self, sequence_numbers: list):
+        if any(sequence_number in self.expired for sequence_number in sequence_numbers):
+            raise service_bus.MessageNotFoundError("message not found")
+        self.requests.append(list(sequence_numbers))
+        return [FakeMessage(sequence_number, state="DEFERRED") for sequence_number in sequence_numbers]
+
+class FakePool:
+    def __init__(self, receiver: FakeReceiver) -> None:
+        self.receiver = receiver
+
+    def get_receiver(self, queue_name: str, receive_mode=None):
+        return self.receiver
+
+    def touch(self, link):
+        pass
+
+    def invalidate_receiver(self, receiver):
+        pass
+
+class FakeLockRenewer:
+    def register(self, receiver, message, max_lock_renewal_duration=None):
+        pass
+
+class CountingStore(IdempotencyStore):
+    def __init__(self, db_path: str) -> None:
+        super().__init__(db_path)
+        self.writes = []
+
+    def mark_processed(self, message_id: str) -> None:
+        self.writes.append(message_id)
+        super().mark_processed(message_id)
+
+@pytest.fixture
+def bus(monkeypatch, tmp_path):
+    def _bus(messages: list, **kwargs):
+        receiver = FakeReceiver(messages)
+        monkeypatch.setattr(service_bus.ServiceBusClientPool, "get_pool", lambda connection_string: FakePool(receiver))
+        monkeypatch.setattr(service_bus, "AutoLockRenewer", FakeLockRenewer)
+        return AzureServiceBus("Endpoint=sb://fake/", **kwargs), receiver
+    return _bus
+
+def test_processed_message_is_marked_once(bus, tmp_path):
+    store = CountingStore(str(tmp_path / "processed.db"))
+    service_bus, receiver = bus([FakeMessage(1), FakeMessage(2)], idempotency_store=store)
+    summary = service_bus.ProcessQueueMessages("queue", lambda message: None, timeout=0)
+    assert summary["complete"] == 2
+    assert store.writes == ["1", "2"]
+
+def test_deferral_without_queue_name_is_refused_before_settling(bus):
+    service_bus, receiver = bus([])
+    results = service_bus.SettleQueueMessages(receiver, [(FakeMessage(1), SettleType.DEFER.value)])
+    assert not results[0]["success"] and "queue_name is required" in results[0]["error"]
+    assert receiver.settled == []
+
+def test_bulk_settlement_applies_each_mode(bus):
+    service_bus, receiver = bus([])
+    results = service_bus.SettleQueueMessages(receiver, [
+        (FakeMessage(1), SettleType.COMPLETE.value),
+        (FakeMessage(2), SettleType.ABANDON.value),
+        (FakeMessage(3), SettleType.DEAD_LETTER.value, "InvalidData", "missing invoice number")])
+    assert all(result["success"] for result in results)
+    assert receiver.settled == [("1", "complete"), ("2", "abandon"), ("3", "dead letter", "InvalidData", "missing invoice number")]
+
+def test_failed_settlement_does_not_stop_the_batch(bus):
+    service_bus, receiver = bus([])
+    receiver.lost.add("2")
+    results = service_bus.SettleQueueMessages(receiver, [
+        (FakeMessage(1), SettleType.COMPLETE.value),
+        (FakeMessage(2), SettleType.COMPLETE.value),
+        (FakeMessage(3), "unknown"),
+        (FakeMessage(4), SettleType.COMPLETE.value)])
+    assert [result["success"] for result in results] == [True, False, False, True]
+    assert "lock lost" in results[1]["error"] and "Unknown settle mode" in results[2]["error"]
+    assert receiver.settled == [("1", "complete"), ("4", "complete")]
+
+def test_handler_result_settles_and_exception_abandons(bus):
+    def handler(message):
+        if message.message_id == "2":
+            raise ValueError("bad message")
+        return SettleType.DEAD_LETTER.value if message.message_id == "3" else None
+
+    service_bus, receiver = bus([FakeMessage(1), FakeMessage(2), FakeMessage(3)])
+    summary = service_bus.ProcessQueueMessages("queue", handler, timeout=0)
+    assert summary["received"] == 3
+    assert summary["complete"] == 1 and summary["abandon"] == 1 and summary[SettleType.DEAD_LETTER.value] == 1
+    assert [settlement[:2] for settlement in receiver.settled] == [("1", "complete"), ("2", "abandon"), ("3", "dead letter")]
+
+def test_deferred_message_is_indexed_and_received_back(bus, tmp_path):
+    index = DeferredMessageIndex(str(tmp_path / "deferred.db"))
+    service_bus, receiver = bus([], deferred_index=index)
+    results = service_bus.SettleQueueMessages(receiver, [
+        (FakeMessage(1), SettleType.DEFER.value, "waiting for approval", 0),
+        (FakeMessage(2), SettleType.DEFER.value, "waiting for approval", 0),
+        (FakeMessage(3), SettleType.ABANDON.value)], queue_name="queue")
+    assert all(result["success"] for result in results)
+    assert index.get("queue", 1)["reason"] == "waiting for approval" and index.count("queue") == 2
+
+    messages, _ = service_bus.ReceiveDeferredMessages("queue")
+    assert [message.sequence_number for message in messages] == [1, 2]
+    service_bus.SettleQueueMessages(receiver, [(messages[0], SettleType.COMPLETE.value)], queue_name="queue")
+    assert index.due("queue") == [2]
+    index.close()
+
+def test_missing_deferred_message_is_dropped_from_the_index(bus, tmp_path):
+    index = DeferredMessageIndex(str(tmp_path / "deferred.db"))
+    for sequence_number in (1, 2, 3):
+        index.add("queue", sequence_number, due_at=0)
+    service_bus, receiver = bus([], deferred_index=index)
+    receiver.expired.add(2)
+    messages, _ = service_bus.ReceiveDeferredMessages("queue", batch_size=3)
+    assert [message.sequence_number for message in messages] == [1, 3]
+    assert receiver.requests == [[1], [3]]
+    assert index.due("queue") == [1, 3]
+    index.close()
@@ -0,0 +1,67 @@
+import threading
+import time
+import pytest
+
+pytest.importorskip("azure.servicebus")
+
+from MainFramework.Common.Azure import service_bus_pool
+from MainFramework.Common.Azure.service_bus_pool import ServiceBusClientPool
+
+class FakeLink:
+    def __init__(self) -> None:
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+class FakeClient:
+    def get_queue_sender(self, queue_name: str):
+        return FakeLink()
+
+    def get_queue_receiver(self, queue_name: str, receive_mode=None, sub_queue=None):
+        return FakeLink()
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(service_bus_pool.ServiceBusClient, "from_connection_string", lambda conn_str: FakeClient(), raising=False)
+    pool = ServiceBusClientPool("Endpoint=sb://fake/", max_idle_seconds=0)
+    yield pool
+    pool.close()
+
+def test_sender_in_use_is_not_closed_when_idle(pool):
+    borrowed = []
+
+    def _second_borrower():
+        with pool.sender("queue") as sender:
+            borrowed.append(sender)
+
+    with pool.sender("queue") as sender:
+        # max_idle_seconds=0: the sender looks idle to a second borrower while the first one still streams
+        thread = threading.Thread(target=_second_borrower)
+        thread.start()
+        time.sleep(0.1)
+        assert pool.health_check()["dropped"] == 0
+        assert not sender.closed
+    thread.join(5)
+    assert borrowed == [sender]
+    assert not sender.closed
+
+def test_failed_sender_is_closed_when_returned(pool):
+    with pytest.raises(RuntimeError):
+        with pool.sender("queue") as sender:
+            raise RuntimeError("link detached")
+    with pool.sender("queue") as fresh:
+        assert fresh is not sender
+    assert sender.closed
+
+def test_receiver_idle_time_counts_from_last_settlement(pool):
+    pool.max_idle_seconds = 60
+    receiver = pool.get_receiver("queue")
+    assert pool.get_receiver("queue") is receiver
+    pool.max_idle_seconds = 0
+    pool.touch(receiver)
+    assert pool.get_receiver("queue") is not receiver
+    assert receiver.closed
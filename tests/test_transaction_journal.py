@@ -0,0 +1,56 @@
+from unittest import mock
+from Data.constant import ItemState
+from MainFramework.Dispatcher.dispatcher import Dispatcher
+from MainFramework.Transaction.transaction_journal import TransactionJournal
+
+def source(rows: list):
+    iterator = iter(rows)
+    return lambda in_config: next(iterator, None)
+
+def test_identical_items_get_their_own_reference(tmp_path):
+    journal = TransactionJournal(str(tmp_path / "journal.db"))
+    references = [journal.next_reference({"name": "same"}) for _ in range(3)]
+    assert len(set(references)) == 3
+    assert journal.next_reference({"id": 7, "name": "same"}) == "7"
+    journal.close()
+
+def test_identical_rows_are_all_processed(tmp_path):
+    journal = TransactionJournal(str(tmp_path / "journal.db"))
+    rows = [{"name": "a"}, {"name": "a"}, {"name": "b"}, {"name": "a"}, {"name": "b"}]
+    with mock.patch("MainFramework.Dispatcher.dispatcher.Business.program") as business:
+        summary = Dispatcher({}, max_workers=2, get_item=source(rows), journal=journal).program()
+    assert business.call_count == 5
+    assert summary["succeeded"] == 5 and summary["skipped"] == 0
+    journal.close()
+
+def test_resume_skips_only_items_finished_before_the_restart(tmp_path):
+    path = str(tmp_path / "journal.db")
+    rows = [{"name": "a"}, {"name": "a"}, {"name": "b"}]
+    journal = TransactionJournal(path)
+    first, second, third = (journal.next_reference(row) for row in rows)
+    journal.record(first, ItemState.SUCCEEDED)
+    journal.record(second, ItemState.IN_PROGRESS)
+    journal.flush()
+    # The process dies here, complete_run() is never called
+
+    resumed = TransactionJournal(path)
+    assert resumed.resumed
+    with mock.patch("MainFramework.Dispatcher.dispatcher.Business.program") as business:
+        summary = Dispatcher({}, max_workers=1, get_item=source(rows), journal=resumed).program()
+    assert business.call_count == 2
+    assert summary["skipped"] == 1
+    resumed.close()
+    journal.close()
+
+def test_resume_processes_failed_items_again(tmp_path):
+    path = str(tmp_path / "journal.db")
+    journal = TransactionJournal(path)
+    journal.record("1", ItemState.SUCCEEDED)
+    journal.record("2", ItemState.FAILED, detail="application down")
+    journal.flush()
+
+    resumed = TransactionJournal(path)
+    assert resumed.is_done("1")
+    assert not resumed.is_done("2")
+    resumed.close()
+    journal.close()